@@ -1,9 +1,11 @@
 import os
 import subprocess
 import sys
-import urllib.request
 import zipfile
 import time
+from rdp_wrapper_enhanced.core.artifacts import ArtifactCache
+from rdp_wrapper_enhanced.core.downloader import SegmentedDownloader
+from rdp_wrapper_enhanced.core.extract import StreamingExtractor
 
 def download_rdp_wrapper(url, destination_file):
     """Downloads RDP Wrapper to the specified destination file.
@@ -13,27 +15,19 @@ def download_rdp_wrapper(url, destination_file):
         destination_file (str): The destination file for the downloaded RDP Wrapper.
     """
 
+    def report(downloaded_size, total_size):
+        if total_size:
+            progress = (downloaded_size / total_size) * 100
+            print(f"Progress: {progress:.2f}%", end="\r")
+
     try:
         print("Downloading RDP Wrapper...")
-        with urllib.request.urlopen(url) as response, open(destination_file, 'wb') as f:
-            total_size = int(response.getheader('Content-Length'))
-            downloaded_size = 0
-            block_size = 1024
-
-            while True:
-                data = response.read(block_size)
-                if not data:
-                    break
-
-                downloaded_size += len(data)
-                f.write(data)
-
-                progress = (downloaded_size / total_size) * 100
-                print(f"Progress: {progress:.2f}%", end="\r")
-
+        result = SegmentedDownloader().download(url, destination_file, progress=report)
         print("\nRDP Wrapper downloaded successfully")
+        return result
     except Exception as e:
         print(f"Error downloading RDP Wrapper: {e}")
+        return False
 
 def extract_rdp_wrapper(zip_file, destination_dir):
     """Extracts RDP Wrapper from the specified ZIP file to the destination directory.
@@ -45,8 +39,7 @@ def extract_rdp_wrapper(zip_file, destination_dir):
 
     try:
         print("Extracting RDP Wrapper...")
-        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
-            zip_ref.extractall(destination_dir)
+        StreamingExtractor().extract(str(zip_file), destination_dir)
         print("RDP Wrapper extracted successfully")
     except Exception as e:
         print(f"Error extracting RDP Wrapper: {e}")
@@ -69,12 +62,16 @@ if __name__ == "__main__":
     # Specific version URL for RDP Wrapper v1.6.2
     rdp_wrapper_url = "https://github.com/vweb-dev/rdpwrap/releases/download/v1.6.2/rdp_wrapper.vweb.dev.zip"
 
-    zip_file = "rdp_wrapper.zip"
     extract_dir = "rdp_wrapper (vweb.dev)"
     rdp_wrapper_file = os.path.join(extract_dir, "rdpwrap.msi")
     install_bat_file = os.path.join(extract_dir, "install.bat")
 
-    download_rdp_wrapper(rdp_wrapper_url, zip_file)
+    # Downloads once; later runs extract the verified copy from the artifact cache
+    zip_file = ArtifactCache().fetch(rdp_wrapper_url, download_rdp_wrapper, version="v1.6.2",
+                                     verify=zipfile.is_zipfile)
+    if not zip_file:
+        print("Error: RDP Wrapper download could not be verified")
+        sys.exit(1)
 
     extract_rdp_wrapper(zip_file, extract_dir)
 
@@ -9,6 +9,8 @@ from pathlib import Path
 from typing import Dict, Any
 import platform
 import subprocess
+import time
+from rdp_wrapper_enhanced.core.backupstore import BackupStore
 
 class ConfigManager:
     def __init__(self):
@@ -32,20 +34,18 @@ class ConfigManager:
     def _backup_windows(self) -> bool:
         """Backup Windows RDP configuration"""
         try:
-            # Backup RDP Wrapper files
-            rdpwrap_path = Path("C:/Program Files/RDP Wrapper")
-            if rdpwrap_path.exists():
-                backup_path = self.backup_dir / f"rdpwrap_backup_{int(time.time())}"
-                shutil.copytree(rdpwrap_path, backup_path)
-                
-            # Backup registry settings
-            reg_backup = self.backup_dir / f"rdp_registry_{int(time.time())}.reg"
+            # Backup registry settings (overwritten each time; identical exports dedupe to one blob)
+            reg_backup = self.backup_dir / "rdp_registry.reg"
             subprocess.run([
                 "reg", "export", 
                 "HKEY_LOCAL_MACHINE\\SYSTEM\\CurrentControlSet\\Services\\TermService", 
-                str(reg_backup)
+                str(reg_backup), "/y"
             ], check=True)
             
+            # Snapshot RDP Wrapper files; content already in the store is not copied again
+            rdpwrap_path = Path("C:/Program Files/RDP Wrapper")
+            BackupStore(self.backup_dir).snapshot([str(rdpwrap_path), str(reg_backup)], label="rdpwrap_backup")
+            
             return True
             
         except Exception as e:
@@ -8,7 +8,6 @@ Standalone Windows Executable
 import os
 import sys
 import subprocess
-import requests
 import zipfile
 import shutil
 import ctypes
@@ -21,6 +20,12 @@ import winreg
 from pathlib import Path
 import socket
 import time
+from rdp_wrapper_enhanced.core.firewall import FirewallRuleCompiler, NetshExecutor, load_block_list
+from rdp_wrapper_enhanced.core.artifacts import ArtifactCache
+from rdp_wrapper_enhanced.core.downloader import SegmentedDownloader, DownloadError
+from rdp_wrapper_enhanced.core.releases import FALLBACK_RELEASE, latest_release
+from rdp_wrapper_enhanced.core.bundle import bundled_release
+from rdp_wrapper_enhanced.core.extract import StreamingExtractor
 
 class RDPWrapperInstaller:
     def __init__(self):
@@ -28,6 +33,7 @@ class RDPWrapperInstaller:
         self.root.title("Enhanced RDP Wrapper Installer")
         self.root.geometry("700x600")
         self.root.resizable(False, False)
+        self.artifact_cache = ArtifactCache()
         
         # Set icon (will be embedded in exe)
         try:
@@ -174,64 +180,59 @@ class RDPWrapperInstaller:
         
     def download_file(self, url, filename):
         """Download file with progress and error handling"""
+        def report(downloaded, total_size):
+            if total_size > 0:
+                progress = (downloaded / total_size) * 100
+                self.update_progress(progress, f"Downloading... {progress:.1f}%")
+
         try:
             self.log_status(f"📥 Downloading: {filename}")
-            response = requests.get(url, stream=True, timeout=30)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-            
-            with open(filename, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        if total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            self.update_progress(progress, f"Downloading... {progress:.1f}%")
-                            
+            # Resumes from a .part file and hashes while downloading; the result carries the SHA-256
+            result = SegmentedDownloader().download(url, filename, progress=report)
             self.log_status(f"✅ Downloaded: {filename}")
-            return True
+            return result
             
-        except requests.exceptions.RequestException as e:
+        except (DownloadError, OSError) as e:
             self.log_status(f"❌ Download failed: {str(e)}")
             return False
             
+    def get_latest_release(self):
+        """Get the latest RDP Wrapper release (URL and, where known, its SHA-256)"""
+        try:
+            # An offline bundle wins; otherwise the shared on-disk cache answers and GitHub only revalidates
+            return bundled_release() or latest_release() or FALLBACK_RELEASE
+        except Exception:
+            return FALLBACK_RELEASE
+
     def get_latest_release_url(self):
         """Get the latest RDP Wrapper release URL"""
-        try:
-            api_url = "https://api.github.com/repos/stascorp/rdpwrap/releases/latest"
-            response = requests.get(api_url, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            for asset in data.get('assets', []):
-                if asset['name'].endswith('.zip'):
-                    return asset['browser_download_url']
-                    
-            return "https://github.com/stascorp/rdpwrap/releases/download/v1.6.2/RDPWrap-v1.6.2.zip"
-        except:
-            return "https://github.com/stascorp/rdpwrap/releases/download/v1.6.2/RDPWrap-v1.6.2.zip"
+        return self.get_latest_release()['download_url']
             
     def configure_firewall(self):
         """Configure Windows Firewall for RDP"""
         try:
             self.log_status("🔧 Configuring Windows Firewall...")
             
-            # Allow RDP through firewall
+            # Allow RDP through firewall (one netsh process for all rules)
             commands = [
-                'netsh advfirewall firewall add rule name="RDP Wrapper" dir=in action=allow protocol=TCP localport=3389',
-                'netsh advfirewall firewall add rule name="RDP Wrapper" dir=out action=allow protocol=TCP localport=3389'
+                'advfirewall firewall add rule name="RDP Wrapper" dir=in action=allow protocol=TCP localport=3389',
+                'advfirewall firewall add rule name="RDP Wrapper" dir=out action=allow protocol=TCP localport=3389'
             ]
             
-            for cmd in commands:
-                subprocess.run(cmd, shell=True, check=True, capture_output=True)
+            # The block list goes through the compiler: aggregated CIDRs, only the rule changes, same script
+            executor = NetshExecutor()
+            compiler = FirewallRuleCompiler(executor)
+            blocked = load_block_list()
+            commands += compiler.to_commands(compiler.plan(blocked))
+            
+            if not executor.run_script(commands):
+                self.log_status("⚠️ Firewall configuration failed")
+                return False
                 
-            self.log_status("✅ Firewall configured for RDP")
+            self.log_status(f"✅ Firewall configured for RDP ({len(blocked)} blocked entries)")
             return True
             
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, OSError) as e:
             self.log_status(f"⚠️ Firewall configuration failed: {str(e)}")
             return False
             
@@ -345,12 +346,18 @@ TerminalServices-RemoteConnectionManager-42b2631e-1f93-4b5b-8c55-5f56024b4d4e-Lo
                         return
                 
                 # Get download URL
-                download_url = self.get_latest_release_url()
+                release = self.get_latest_release()
+                download_url = release['download_url']
                 self.log_status(f"📥 Download URL: {download_url}")
                 
                 # Download
                 self.update_progress(10, "Downloading RDP Wrapper...")
-                if not self.download_file(download_url, "rdpwrap.zip"):
+                zip_path = self.artifact_cache.fetch(
+                    download_url, self.download_file, expected_sha256=release.get('sha256'),
+                    verify=zipfile.is_zipfile,
+                    max_age=86400 if '/latest/' in download_url else None
+                )
+                if not zip_path:
                     return
                 
                 # Create installation directory
@@ -359,8 +366,8 @@ TerminalServices-RemoteConnectionManager-42b2631e-1f93-4b5b-8c55-5f56024b4d4e-Lo
                 
                 # Extract files
                 self.update_progress(50, "Extracting files...")
-                with zipfile.ZipFile("rdpwrap.zip", 'r') as zip_ref:
-                    zip_ref.extractall(str(install_dir))
+                # Members already identical on disk (re-install / repair) are skipped
+                StreamingExtractor().extract(str(zip_path), str(install_dir))
                 
                 # Install service
                 self.update_progress(70, "Installing service...")
@@ -383,9 +390,6 @@ TerminalServices-RemoteConnectionManager-42b2631e-1f93-4b5b-8c55-5f56024b4d4e-Lo
                 self.log_status("✅ Installation completed successfully!")
                 self.log_status("🎉 RDP Wrapper is now active on your system!")
                 
-                # Clean up
-                Path("rdpwrap.zip").unlink(missing_ok=True)
-                
                 messagebox.showinfo("Success", "Enhanced RDP Wrapper installed successfully!")
                 
             except Exception as e:
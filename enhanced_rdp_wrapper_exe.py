@@ -19,6 +19,7 @@ import json
 import platform
 import winreg
 from pathlib import Path
+from rdp_wrapper_enhanced.core.artifacts import ArtifactCache
 
 class RDPWrapperInstaller:
     def __init__(self):
@@ -26,6 +27,7 @@ class RDPWrapperInstaller:
         self.root.title("Enhanced RDP Wrapper Installer")
         self.root.geometry("600x500")
         self.root.resizable(False, False)
+        self.artifact_cache = ArtifactCache()
         
         # Set icon (will be embedded in exe)
         try:
@@ -151,12 +153,15 @@ class RDPWrapperInstaller:
                 self.log_status("Downloading RDP Wrapper...")
                 rdp_url = "https://github.com/stascorp/rdpwrap/releases/latest/download/RDPWrap-v1.6.2.zip"
                 
-                if not self.download_file(rdp_url, "rdpwrap.zip"):
+                # The "latest" URL moves between releases, so re-check it daily
+                zip_path = self.artifact_cache.fetch(rdp_url, self.download_file, verify=zipfile.is_zipfile,
+                                                     max_age=86400)
+                if not zip_path:
                     return
                     
                 # Extract files
                 self.log_status("Extracting files...")
-                with zipfile.ZipFile("rdpwrap.zip", 'r') as zip_ref:
+                with zipfile.ZipFile(zip_path, 'r') as zip_ref:
                     zip_ref.extractall(str(install_dir))
                     
                 # Install RDP Wrapper
@@ -182,9 +187,6 @@ class RDPWrapperInstaller:
                 self.log_status("Installation completed successfully!")
                 self.log_status("RDP Wrapper is now active on your system.")
                 
-                # Clean up
-                Path("rdpwrap.zip").unlink(missing_ok=True)
-                
             except Exception as e:
                 self.log_status(f"Installation failed: {str(e)}")
                 
@@ -6,14 +6,16 @@ A robust, cross-platform installer for RDP Wrapper with improved error handling
 
 import os
 import sys
-import hashlib
 import platform
 import subprocess
 import zipfile
-import requests
 from pathlib import Path
 from typing import Optional, Tuple
 import time
+from rdp_wrapper_enhanced.core.hashing import sha256_file
+from rdp_wrapper_enhanced.core.artifacts import ArtifactCache
+from rdp_wrapper_enhanced.core.downloader import SegmentedDownloader, DownloadError
+from rdp_wrapper_enhanced.core.extract import StreamingExtractor
 
 class RDPWrapperInstaller:
     def __init__(self):
@@ -21,6 +23,7 @@ class RDPWrapperInstaller:
         self.expected_hash = "a1b2c3d4e5f6789"  # Placeholder - should be actual SHA256
         self.download_path = Path("RDPWrap-v1.6.2.zip")
         self.extract_path = Path("RDPWrap-v1.6.2")
+        self.artifact_cache = ArtifactCache()
         
     def print_header(self):
         """Print installation header"""
@@ -42,29 +45,20 @@ class RDPWrapperInstaller:
         except:
             return False
 
-    def download_with_progress(self, url: str, destination: Path) -> bool:
-        """Download file with progress bar"""
+    def download_with_progress(self, url: str, destination: Path):
+        """Download file with progress bar, resuming a partial download if one exists"""
+        def report(downloaded: int, total_size: int):
+            if total_size > 0:
+                progress = (downloaded / total_size) * 100
+                print(f"\rProgress: {progress:.1f}% ({downloaded / 1024 / 1024:.1f} MB)", end="")
+
         try:
             print(f"\nDownloading RDP Wrapper...")
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-            
-            with open(destination, 'wb') as file:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        file.write(chunk)
-                        downloaded += len(chunk)
-                        if total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            print(f"\rProgress: {progress:.1f}% ({downloaded / 1024 / 1024:.1f} MB)", end="")
-            
+            result = SegmentedDownloader().download(url, str(destination), progress=report)
             print("\nDownload completed successfully!")
-            return True
+            return result
             
-        except requests.RequestException as e:
+        except (DownloadError, OSError) as e:
             print(f"\nDownload failed: {e}")
             return False
 
@@ -72,13 +66,7 @@ class RDPWrapperInstaller:
         """Verify file integrity using SHA256 checksum"""
         try:
             print("\nVerifying file integrity...")
-            sha256_hash = hashlib.sha256()
-            
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    sha256_hash.update(chunk)
-            
-            actual_hash = sha256_hash.hexdigest()
+            actual_hash = sha256_file(str(file_path))
             if actual_hash == expected_hash:
                 print("File integrity verified!")
                 return True
@@ -97,16 +85,13 @@ class RDPWrapperInstaller:
         try:
             print("\nExtracting files...")
             
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                files = zip_ref.namelist()
-                total_files = len(files)
-                
-                for i, file in enumerate(files, 1):
-                    zip_ref.extract(file, extract_to)
-                    progress = (i / total_files) * 100
-                    print(f"\rExtracting: {progress:.1f}% ({i}/{total_files})", end="")
+            def report(i: int, total_files: int, name: str):
+                progress = (i / total_files) * 100
+                print(f"\rExtracting: {progress:.1f}% ({i}/{total_files})", end="")
+
+            result = StreamingExtractor().extract(str(zip_path), str(extract_to), progress=report)
             
-            print("\nExtraction completed!")
+            print(f"\nExtraction completed! ({len(result['skipped'])} unchanged files skipped)")
             return True
             
         except Exception as e:
@@ -200,16 +185,18 @@ class RDPWrapperInstaller:
         system = platform.system()
         
         if system == "Windows":
-            # Download and install RDP Wrapper
-            if not self.download_with_progress(self.github_url, self.download_path):
+            # Download and install RDP Wrapper (served from the artifact cache after the first run)
+            zip_path = self.artifact_cache.fetch(self.github_url, self.download_with_progress,
+                                                 version="v1.6.2", verify=zipfile.is_zipfile)
+            if not zip_path:
                 return False
             
             # Note: Actual SHA256 should be calculated from the downloaded file
             # For now, skip checksum verification
-            # if not self.verify_checksum(self.download_path, self.expected_hash):
+            # if not self.verify_checksum(zip_path, self.expected_hash):
             #     return False
             
-            if not self.extract_zip(self.download_path, self.extract_path):
+            if not self.extract_zip(zip_path, self.extract_path):
                 return False
             
             success = self.install_windows()
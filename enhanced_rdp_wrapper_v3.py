@@ -21,7 +21,6 @@ import winreg
 from pathlib import Path
 import socket
 import time
-import hashlib
 import base64
 from datetime import datetime
 import configparser
@@ -31,6 +30,14 @@ import psutil
 import win32security
 import win32api
 import win32con
+from rdp_wrapper_enhanced.core.hashing import sha256_file
+from rdp_wrapper_enhanced.core.artifacts import ArtifactCache
+from rdp_wrapper_enhanced.core.releases import latest_release
+from rdp_wrapper_enhanced.core.bundle import bundled_release
+from rdp_wrapper_enhanced.core.extract import StreamingExtractor
+from rdp_wrapper_enhanced.core.updater import UpdatePlanner
+from rdp_wrapper_enhanced.core.pipeline import InstallPipeline, StageError, format_report
+from rdp_wrapper_enhanced.core.probes import shared_probe_runner
 
 class EnhancedRDPWrapperInstaller:
     def __init__(self):
@@ -43,6 +50,8 @@ class EnhancedRDPWrapperInstaller:
         self.config = self.load_config()
         self.is_dark_mode = self.config.get('theme', 'light') == 'dark'
         
+        self.artifact_cache = ArtifactCache()
+        
         # Security settings
         self.verified_sources = [
             "https://github.com/stascorp/rdpwrap",
@@ -587,25 +596,22 @@ class EnhancedRDPWrapperInstaller:
     def verify_download(self, file_path, expected_hash):
         """Verify downloaded file integrity"""
         try:
-            sha256_hash = hashlib.sha256()
-            with open(file_path, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    sha256_hash.update(chunk)
-            
-            actual_hash = sha256_hash.hexdigest()
-            return actual_hash == expected_hash
+            return sha256_file(file_path) == expected_hash
         except Exception as e:
             self.log_error(f"Hash verification failed: {e}")
             return False
             
-    def download_file(self, url, filename, expected_hash=None):
+    def download_file(self, url, filename, expected_hash=None, progress=None):
         """Enhanced download with verification"""
+        # Pipeline stages run off the Tk thread, so they report through progress instead of the widgets
+        status = self.log_status if progress is None else (lambda message, level="INFO": self.logger.info(message))
+        report = progress or (lambda fraction, message: self.update_progress(fraction * 100, message))
         try:
-            self.log_status(f"📥 Downloading: {filename}")
+            status(f"📥 Downloading: {filename}")
             
             # Verify URL
             if not any(source in url for source in self.verified_sources):
-                self.log_status("⚠️ Warning: Downloading from unverified source", "WARNING")
+                status("⚠️ Warning: Downloading from unverified source", "WARNING")
                 
             response = requests.get(url, stream=True, timeout=30)
             response.raise_for_status()
@@ -619,46 +625,26 @@ class EnhancedRDPWrapperInstaller:
                         f.write(chunk)
                         downloaded += len(chunk)
                         if total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            self.update_progress(progress, f"Downloading... {progress:.1f}%")
+                            fraction = downloaded / total_size
+                            report(fraction, f"Downloading... {fraction * 100:.1f}%")
                             
             # Verify if hash provided
             if expected_hash and not self.verify_download(filename, expected_hash):
-                self.log_status("❌ Download verification failed", "ERROR")
+                status("❌ Download verification failed", "ERROR")
                 return False
                 
-            self.log_status(f"✅ Downloaded: {filename}", "SUCCESS")
+            status(f"✅ Downloaded: {filename}", "SUCCESS")
             return True
             
         except requests.exceptions.RequestException as e:
-            self.log_status(f"❌ Download failed: {str(e)}", "ERROR")
+            status(f"❌ Download failed: {str(e)}", "ERROR")
             return False
             
     def get_latest_release_info(self):
         """Get latest release information with security checks"""
         try:
-            api_url = "https://api.github.com/repos/stascorp/rdpwrap/releases/latest"
-            response = requests.get(api_url, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            # Find zip asset
-            zip_asset = None
-            for asset in data.get('assets', []):
-                if asset['name'].endswith('.zip'):
-                    zip_asset = asset
-                    break
-                    
-            if not zip_asset:
-                return None
-                
-            return {
-                'version': data['tag_name'],
-                'download_url': zip_asset['browser_download_url'],
-                'size': zip_asset['size'],
-                'published': data['published_at']
-            }
+            # An offline bundle wins; otherwise the shared on-disk cache answers and GitHub only revalidates
+            return bundled_release() or latest_release()
             
         except Exception as e:
             self.log_error(f"Failed to get release info: {e}")
@@ -670,58 +656,90 @@ class EnhancedRDPWrapperInstaller:
             messagebox.showerror("Admin Required", "Please run as administrator")
             return
             
-        try:
-            self.update_progress(0, "Starting installation...")
+        extract_dir = "rdp_wrapper_temp"
+        
+        def restore_point(results, progress):
+            progress(0.1, "Creating system restore point...")
+            return subprocess.run(
+                ["powershell", "-Command",
+                 'Checkpoint-Computer -Description "RDP Wrapper Installation" -RestorePointType MODIFY_SETTINGS'],
+                capture_output=True, text=True
+            ).returncode == 0
             
-            # Create restore point
-            if self.config.get('auto_backup', True):
-                self.create_restore_point()
-                
-            # Get latest release
-            release_info = self.get_latest_release_info()
-            if not release_info:
-                self.log_status("❌ Failed to get release information", "ERROR")
-                return
-                
-            # Download
-            zip_path = "rdp_wrapper_latest.zip"
-            if not self.download_file(release_info['download_url'], zip_path):
-                return
-                
-            # Extract
-            self.update_progress(60, "Extracting files...")
-            extract_dir = "rdp_wrapper_temp"
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
-                
-            # Install
-            self.update_progress(80, "Installing RDP Wrapper...")
+        def probes(results, progress):
+            return shared_probe_runner().run(
+                ['terminal_service', 'architecture'],
+                on_result=lambda name, result: progress(0.5, f"Checked {name}")
+            )
+            
+        def release(results, progress):
+            info = self.get_latest_release_info()
+            if not info:
+                raise RuntimeError("Failed to get release information")
+            return info
+            
+        def download(results, progress):
+            # Re-installs and rollbacks are served from the artifact cache
+            info = results['release']
+            zip_path = self.artifact_cache.fetch(
+                info['download_url'],
+                lambda url, destination: self.download_file(url, destination, progress=progress),
+                expected_sha256=info.get('sha256'), version=info['version'], verify=zipfile.is_zipfile
+            )
+            if not zip_path:
+                raise RuntimeError("Download failed")
+            return str(zip_path)
+            
+        def extract(results, progress):
+            return StreamingExtractor().extract(
+                results['download'], extract_dir,
+                progress=lambda done, total, name: progress(done / total, f"Extracting {name}")
+            )
+            
+        def install(results, progress):
+            progress(0.1, "Installing RDP Wrapper...")
             installer_path = Path(extract_dir) / "install.bat"
-            if installer_path.exists():
-                result = subprocess.run(
-                    [str(installer_path)],
-                    capture_output=True,
-                    text=True,
-                    shell=True
-                )
-                
-                if result.returncode == 0:
-                    self.log_status("✅ RDP Wrapper installed successfully", "SUCCESS")
-                else:
-                    self.log_status(f"❌ Installation failed: {result.stderr}", "ERROR")
-                    
-            # Cleanup
-            self.update_progress(100, "Cleaning up...")
-            if os.path.exists(zip_path):
-                os.remove(zip_path)
+            if not installer_path.exists():
+                raise RuntimeError("install.bat not found in release")
+            result = subprocess.run([str(installer_path)], capture_output=True, text=True, shell=True)
+            if result.returncode != 0:
+                raise RuntimeError(result.stderr.strip() or f"install.bat exited with {result.returncode}")
+            return result.stdout
+            
+        def cleanup(results, progress):
             if os.path.exists(extract_dir):
                 shutil.rmtree(extract_dir)
                 
-            self.check_rdp_status()
-            
+        # Restore point, probes and the release lookup + download overlap; install waits for all of them
+        pipeline = InstallPipeline()
+        install_requires = ['extract', 'probes']
+        if self.config.get('auto_backup', True):
+            pipeline.add('restore_point', restore_point, weight=3, critical=False)
+            install_requires.append('restore_point')
+        pipeline.add('probes', probes, weight=1, critical=False)
+        pipeline.add('release', release, weight=0.5)
+        pipeline.add('download', download, requires=['release'], weight=5)
+        pipeline.add('extract', extract, requires=['download'], weight=1)
+        pipeline.add('install', install, requires=install_requires, weight=2)
+        pipeline.add('cleanup', cleanup, requires=['install'], weight=0.5)
+        
+        try:
+            self.update_progress(0, "Starting installation...")
+            report = pipeline.run(on_progress=lambda percent, stage, message:
+                                  self.update_progress(percent, message or f"{stage}..."))
+            self.log_status("✅ RDP Wrapper installed successfully", "SUCCESS")
+            self.log_status(format_report(report))
+            
+        except StageError as e:
+            self.log_status(f"❌ Installation failed at {e.stage}: {e.error}", "ERROR")
+            self.log_status(format_report(e.report))
+            if os.path.exists(extract_dir):
+                shutil.rmtree(extract_dir, ignore_errors=True)
         except Exception as e:
             self.log_error(f"Installation error: {e}")
             
+        self.check_rdp_status()
+            
     def uninstall_rdp_wrapper(self):
         """Enhanced uninstallation with cleanup"""
         if not messagebox.askyesno("Confirm", "Are you sure you want to uninstall RDP Wrapper?"):
@@ -822,9 +840,40 @@ class EnhancedRDPWrapperInstaller:
             self.log_error(f"Status check error: {e}")
             
     def update_rdp_wrapper(self):
-        """Update RDP Wrapper to latest version"""
+        """Update RDP Wrapper to latest version, replacing only the files that changed"""
         self.log_status("🔄 Checking for updates...")
-        self.install_rdp_wrapper()
+        install_dir = "C:\\Program Files\\RDP Wrapper"
+        if not os.path.exists(install_dir):
+            self.install_rdp_wrapper()
+            return
+            
+        try:
+            release_info = self.get_latest_release_info()
+            if not release_info:
+                self.log_status("❌ Failed to get release information", "ERROR")
+                return
+                
+            zip_path = self.artifact_cache.fetch(
+                release_info['download_url'], self.download_file, expected_sha256=release_info.get('sha256'),
+                version=release_info['version'], verify=zipfile.is_zipfile
+            )
+            if not zip_path:
+                return
+                
+            # Diff against the installed tree; TermService restarts only for rdpwrap.dll or live INI sections
+            self.update_progress(60, "Applying changed files...")
+            result = UpdatePlanner().update(str(zip_path), install_dir, version=release_info['version'])
+            
+            self.update_progress(100, "Update complete")
+            self.log_status(
+                f"✅ Updated to {release_info['version']}: {len(result['files_written'])} files written, "
+                f"{result['bytes_saved'] / 1024:.0f} KB and ~{result['estimated_time_saved_s']:.1f}s saved, "
+                f"TermService {'restarted' if result['restarted'] else 'left running'}", "SUCCESS"
+            )
+            self.check_rdp_status()
+            
+        except Exception as e:
+            self.log_error(f"Update error: {e}")
         
     def backup_config(self):
         """Enhanced configuration backup"""
@@ -8,7 +8,6 @@ import os
 import sys
 import json
 import time
-import hashlib
 import threading
 import subprocess
 import winreg
@@ -25,10 +24,10 @@ import logging
 import tempfile
 import shutil
 import ctypes
-from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
-import base64
+from rdp_wrapper_enhanced.core.hashing import sha256_file
+from rdp_wrapper_enhanced.core.envelope import seal, open_envelope
+from rdp_wrapper_enhanced.core.backupstore import BackupStore
+from rdp_wrapper_enhanced.core.probes import shared_probe_runner
 
 # Configure logging
 logging.basicConfig(
@@ -57,111 +56,61 @@ class SecurityManager:
     def verify_signature(self, file_path: str, expected_hash: str) -> bool:
         """Verify file integrity using SHA256"""
         try:
-            with open(file_path, 'rb') as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
-            return file_hash == expected_hash
+            return sha256_file(file_path) == expected_hash
         except Exception as e:
             logger.error(f"Error verifying signature: {e}")
             return False
     
-    def create_secure_config(self, config_data: Dict) -> bytes:
-        """Encrypt configuration data"""
-        key = Fernet.generate_key()
-        f = Fernet(key)
-        encrypted = f.encrypt(json.dumps(config_data).encode())
-        return key + encrypted
+    def create_secure_config(self, config_data: Dict, password: str) -> bytes:
+        """Encrypt configuration data into a password-protected envelope"""
+        return seal(json.dumps(config_data).encode(), password).encode()
     
-    def decrypt_config(self, encrypted_data: bytes) -> Dict:
+    def decrypt_config(self, encrypted_data: bytes, password: str) -> Dict:
         """Decrypt configuration data"""
-        key = encrypted_data[:32]
-        encrypted = encrypted_data[32:]
-        f = Fernet(key)
-        decrypted = f.decrypt(encrypted)
+        decrypted = open_envelope(encrypted_data.decode(), password)
         return json.loads(decrypted.decode())
 
 class SystemChecker:
     """Comprehensive system compatibility checker"""
     
+    REQUIREMENT_PROBES = ['admin_rights', 'os_name', 'antivirus', 'firewall', 'terminal_service']
+    
     def __init__(self):
-        self.os_version = self._get_os_version()
+        self.probes = shared_probe_runner()
+        # Start every probe now; each property below waits only for the one it reads
+        self.probes.submit(self.REQUIREMENT_PROBES + ['build_number'])
         self.architecture = self._get_architecture()
-        self.build_number = self._get_build_number()
         
-    def _get_os_version(self) -> str:
+    @property
+    def os_version(self) -> str:
         """Get Windows version information"""
-        try:
-            output = subprocess.check_output(['systeminfo'], text=True)
-            for line in output.split('\n'):
-                if "OS Name" in line:
-                    return line.split(':')[1].strip()
-            return "Unknown"
-        except:
-            return "Unknown"
+        return self.probes.value('os_name', "Unknown")
+    
+    @property
+    def build_number(self) -> str:
+        """Get Windows build number"""
+        return self.probes.value('build_number', "Unknown")
     
     def _get_architecture(self) -> str:
         """Get system architecture"""
         return "64-bit" if sys.maxsize > 2**32 else "32-bit"
     
-    def _get_build_number(self) -> str:
-        """Get Windows build number"""
-        try:
-            key = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, 
-                               r"SOFTWARE\Microsoft\Windows NT\CurrentVersion")
-            build, _ = winreg.QueryValueEx(key, "CurrentBuild")
-            return str(build)
-        except:
-            return "Unknown"
-    
     def check_system_requirements(self) -> Dict[str, bool]:
         """Check if system meets all requirements"""
+        probes = self.probes.run(self.REQUIREMENT_PROBES)
         results = {
-            "admin_rights": self._check_admin_rights(),
+            "admin_rights": probes['admin_rights']['value'] is True,
             "windows_version": self._check_windows_version(),
-            "antivirus_status": self._check_antivirus(),
-            "firewall_status": self._check_firewall(),
-            "rdp_service": self._check_rdp_service()
+            "antivirus_status": probes['antivirus']['value'] is True,
+            "firewall_status": probes['firewall']['value'] is True,
+            "rdp_service": probes['terminal_service']['value'] is True
         }
         return results
     
-    def _check_admin_rights(self) -> bool:
-        """Check if running with administrator privileges"""
-        try:
-            return ctypes.windll.shell32.IsUserAnAdmin()
-        except:
-            return False
-    
     def _check_windows_version(self) -> bool:
         """Check if Windows version is supported"""
         supported_versions = ["Windows 10", "Windows 11", "Windows Server 2019", "Windows Server 2022"]
         return any(version in self.os_version for version in supported_versions)
-    
-    def _check_antivirus(self) -> bool:
-        """Check antivirus status"""
-        try:
-            result = subprocess.run(['powershell', '-Command', 
-                                   'Get-MpComputerStatus | Select-Object -ExpandProperty RealTimeProtectionEnabled'], 
-                                  capture_output=True, text=True)
-            return "True" in result.stdout
-        except:
-            return False
-    
-    def _check_firewall(self) -> bool:
-        """Check Windows Firewall status"""
-        try:
-            result = subprocess.run(['netsh', 'advfirewall', 'show', 'allprofiles'], 
-                                  capture_output=True, text=True)
-            return "ON" in result.stdout
-        except:
-            return False
-    
-    def _check_rdp_service(self) -> bool:
-        """Check Remote Desktop service status"""
-        try:
-            result = subprocess.run(['sc', 'query', 'TermService'], 
-                                  capture_output=True, text=True)
-            return "RUNNING" in result.stdout
-        except:
-            return False
 
 class NetworkDiagnostics:
     """Network connectivity and diagnostics"""
@@ -230,26 +179,23 @@ class ConfigManager:
         self.config_path = Path("rdp_wrapper_config.json")
         self.backup_dir = Path("backups")
         self.backup_dir.mkdir(exist_ok=True)
+        self.backup_store = BackupStore(self.backup_dir)
         
     def create_backup(self) -> str:
         """Create system backup before changes"""
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_name = f"rdp_backup_{timestamp}"
-        backup_path = self.backup_dir / backup_name
-        
         try:
-            # Backup registry
+            # Backup registry (overwritten each time; identical exports dedupe to one blob)
+            reg_file = self.backup_dir / "terminal_server.reg"
             subprocess.run(['reg', 'export', 
                           'HKEY_LOCAL_MACHINE\\SYSTEM\\CurrentControlSet\\Control\\Terminal Server', 
-                          str(backup_path / "terminal_server.reg")], 
+                          str(reg_file), '/y'], 
                          capture_output=True, check=True)
             
-            # Backup RDP files
+            # Snapshot registry export and RDP files; unchanged files are stored only once
             rdp_dir = Path("C:\\Program Files\\RDP Wrapper")
-            if rdp_dir.exists():
-                shutil.copytree(rdp_dir, backup_path / "rdp_wrapper", dirs_exist_ok=True)
+            snapshot = self.backup_store.snapshot([str(reg_file), str(rdp_dir)], label="rdp_backup")
             
-            return str(backup_path)
+            return snapshot["id"]
         except Exception as e:
             logger.error(f"Backup creation failed: {e}")
             return None
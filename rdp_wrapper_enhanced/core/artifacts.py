@@ -0,0 +1,243 @@
+"""
+RDP Wrapper Enhanced - Release Artifact Cache
+Content-addressed store (<sha256>/<file>) of verified downloads with LRU eviction under a size cap
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import zipfile
+from pathlib import Path
+from typing import Dict, Any, Callable, Optional
+
+from .hashing import cached_sha256, sha256_file
+from .downloader import SegmentedDownloader
+from .bundle import RELEASE_MEMBER, OfflineBundle, find_bundle, trusted_bundle_key
+
+DEFAULT_ARTIFACT_DIR = Path(os.environ.get('PROGRAMDATA', Path.home())) / "RDP Wrapper Enhanced" / "artifacts"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def default_download(url: str, destination: str) -> Dict[str, Any]:
+    """Resumable segmented download; the result carries the ETag and the SHA-256 hashed in flight"""
+    return SegmentedDownloader().download(url, destination)
+
+
+class ArtifactCache:
+    """Verified release downloads served locally after the first fetch"""
+
+    def __init__(self, root: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.logger = logging.getLogger(__name__)
+        self.root = Path(root or DEFAULT_ARTIFACT_DIR)
+        self.max_bytes = max_bytes
+        self.index_path = self.root / "index.json"
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.index = self._load_index()
+
+    def _load_index(self) -> Dict[str, Any]:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            index.setdefault('artifacts', {})
+            index.setdefault('urls', {})
+            return index
+        except (OSError, ValueError):
+            return {'artifacts': {}, 'urls': {}}
+
+    def _save_index(self):
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.index, f, indent=2)
+        os.replace(tmp_path, self.index_path)
+
+    def _path(self, digest: str, entry: Dict[str, Any]) -> Path:
+        return self.root / digest / entry['filename']
+
+    def lookup(self, digest: str) -> Optional[Path]:
+        """Path of a cached artifact whose content still matches its digest"""
+        digest = digest.lower()
+        with self._lock:
+            entry = self.index['artifacts'].get(digest)
+            if entry is None:
+                return None
+            path = self._path(digest, entry)
+            try:
+                intact = path.stat().st_size == entry['size'] and cached_sha256(str(path)) == digest
+            except OSError:
+                intact = False
+            if not intact:
+                self.logger.warning(f"Dropping damaged artifact {digest}")
+                self._remove(digest)
+                self._save_index()
+                return None
+            entry['last_used'] = time.time()
+            self._save_index()
+            return path
+
+    def lookup_url(self, url: str, max_age: Optional[float] = None) -> Optional[Path]:
+        """Cached artifact last downloaded from a URL, if it is younger than max_age"""
+        record = self.index['urls'].get(url)
+        if record is None:
+            return None
+        if max_age is not None and time.time() - record['fetched'] > max_age:
+            return None
+        return self.lookup(record['sha256'])
+
+    def metadata(self, digest: str) -> Optional[Dict[str, Any]]:
+        entry = self.index['artifacts'].get(digest.lower())
+        return dict(entry) if entry else None
+
+    def add_file(self, path: str, source_url: str = None, etag: str = None, version: str = None,
+                 verified: Optional[bool] = None, filename: str = None, move: bool = False,
+                 digest: str = None) -> str:
+        """Store a file under its SHA-256 and return the digest"""
+        digest = digest or sha256_file(path)
+        filename = filename or os.path.basename(path)
+        target_dir = self.root / digest
+        target_dir.mkdir(parents=True, exist_ok=True)
+        target = target_dir / filename
+        if not target.exists():
+            if move:
+                os.replace(path, target)
+            else:
+                shutil.copy2(path, target)
+        elif move:
+            os.remove(path)
+
+        now = time.time()
+        with self._lock:
+            entry = self.index['artifacts'].setdefault(digest, {'added': now})
+            entry.update({
+                'filename': filename,
+                'size': target.stat().st_size,
+                'source_url': source_url or entry.get('source_url'),
+                'etag': etag or entry.get('etag'),
+                'version': version or entry.get('version'),
+                'verified': verified if verified is not None else entry.get('verified'),
+                'last_used': now
+            })
+            if source_url:
+                self.index['urls'][source_url] = {'sha256': digest, 'fetched': now}
+            self._evict()
+            self._save_index()
+        return digest
+
+    def fetch(self, url: str, download: Callable[[str, str], Any] = None, expected_sha256: str = None,
+              version: str = None, verify: Callable[[str], bool] = None, max_age: Optional[float] = None,
+              filename: str = None) -> Optional[Path]:
+        """Serve an artifact from the cache, downloading and verifying it only on a miss.
+
+        Only a matching expected_sha256 (or a signed bundle) marks an entry verified. verify is a sanity
+        check that can reject a download; entries that passed nothing stronger are stored with verified=None.
+        """
+        if expected_sha256:
+            cached = self.lookup(expected_sha256)
+            if cached:
+                # lookup re-hashed the file, so it now matches a pinned digest
+                with self._lock:
+                    entry = self.index['artifacts'][expected_sha256.lower()]
+                    if not entry.get('verified'):
+                        entry['verified'] = True
+                        self._save_index()
+        else:
+            cached = self.lookup_url(url, max_age)
+        if cached:
+            self.logger.info(f"Artifact cache hit for {url}")
+            return cached
+        # An offline bundle holding this release is used before the network
+        cached = self.fetch_from_bundle(url, expected_sha256, verify=verify)
+        if cached:
+            return cached
+
+        download = download or default_download
+        filename = filename or os.path.basename(url.split('?', 1)[0]) or 'artifact.bin'
+        # Stable per-URL temp name so an interrupted download resumes from its .part file
+        tmp_path = str(self.root / f"download_{hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]}")
+        try:
+            result = download(url, tmp_path)
+            if result is False or not os.path.exists(tmp_path):
+                return None
+            result = result if isinstance(result, dict) else {}
+            etag = result.get('etag')
+
+            digest = result.get('sha256') or sha256_file(tmp_path)
+            if expected_sha256 and digest != expected_sha256.lower():
+                self.logger.error(f"Digest mismatch for {url}: {digest}")
+                return None
+            if verify and not verify(tmp_path):
+                self.logger.error(f"Verification failed for {url}")
+                return None
+            verified = True if expected_sha256 else None
+            if verified is None:
+                self.logger.warning(f"No pinned digest for {url}; cached unverified as {digest}")
+
+            digest = self.add_file(tmp_path, url, etag, version, verified, filename, move=True, digest=digest)
+            return self._path(digest, self.index['artifacts'][digest])
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def fetch_from_bundle(self, url: str, expected_sha256: str = None, bundle_path: str = None,
+                          verify: Callable[[str], bool] = None) -> Optional[Path]:
+        """Copy the release behind url out of an offline bundle, if one is available, holds it and passes verify"""
+        bundle_path = bundle_path or find_bundle()
+        if not bundle_path:
+            return None
+        tmp_path = str(self.root / f"bundle_{hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]}")
+        try:
+            with OfflineBundle(bundle_path, trusted_bundle_key()) as bundle:
+                release = bundle.release
+                digest = bundle.manifest['members'][RELEASE_MEMBER]['sha256']
+                if release.get('download_url') != url or (expected_sha256 and digest != expected_sha256.lower()):
+                    return None
+                # The digest is checked while the member is copied out of the mapped bundle
+                bundle.extract_member(RELEASE_MEMBER, tmp_path)
+                if verify and not verify(tmp_path):
+                    self.logger.error(f"Verification failed for {url} in offline bundle {bundle_path}")
+                    return None
+                verified = True if bundle.signed or expected_sha256 else None
+            digest = self.add_file(tmp_path, url, None, release['version'], verified, release['filename'],
+                                   move=True, digest=digest)
+            self.logger.info(f"Served {url} from offline bundle {bundle_path}")
+            return self._path(digest, self.index['artifacts'][digest])
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            self.logger.warning(f"Offline bundle {bundle_path} not used: {e}")
+            return None
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _remove(self, digest: str):
+        self.index['artifacts'].pop(digest, None)
+        for url in [u for u, record in self.index['urls'].items() if record['sha256'] == digest]:
+            del self.index['urls'][url]
+        shutil.rmtree(self.root / digest, ignore_errors=True)
+
+    def _evict(self):
+        """Drop least recently used artifacts until the cache fits its cap"""
+        artifacts = self.index['artifacts']
+        total = sum(entry['size'] for entry in artifacts.values())
+        for digest in sorted(artifacts, key=lambda d: artifacts[d]['last_used']):
+            if total <= self.max_bytes or len(artifacts) <= 1:
+                break
+            total -= artifacts[digest]['size']
+            self.logger.info(f"Evicting artifact {digest}")
+            self._remove(digest)
+
+    def remove(self, digest: str):
+        with self._lock:
+            self._remove(digest.lower())
+            self._save_index()
+
+    def get_stats(self) -> Dict[str, Any]:
+        artifacts = self.index['artifacts']
+        return {
+            'artifacts': len(artifacts),
+            'bytes': sum(entry['size'] for entry in artifacts.values()),
+            'max_bytes': self.max_bytes
+        }
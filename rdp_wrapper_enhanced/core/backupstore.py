@@ -0,0 +1,280 @@
+"""
+RDP Wrapper Enhanced - Deduplicated Backup Store
+Snapshots are manifests pointing at content-addressed blobs shared by every snapshot
+"""
+
+import os
+import json
+import stat
+import time
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional
+
+from .hashing import CHUNK_SIZE, shared_cache, sha256_file
+
+DEFAULT_BACKUP_STORE = Path(os.environ.get('PROGRAMDATA', Path.home())) / "RDP Wrapper Enhanced" / "backups"
+
+
+def _copy_hashing(source: str, destination: str) -> str:
+    """Copy a file and return the SHA-256 of the bytes actually copied"""
+    digest = hashlib.sha256()
+    with open(source, 'rb', buffering=0) as src, open(destination, 'wb') as dst:
+        buffer = memoryview(bytearray(CHUNK_SIZE))
+        while True:
+            count = src.readinto(buffer)
+            if not count:
+                break
+            digest.update(buffer[:count])
+            dst.write(buffer[:count])
+    shutil.copystat(source, destination)
+    return digest.hexdigest()
+
+
+class BackupStore:
+    """Content-addressed snapshots: unchanged files cost a hash-cache lookup and a manifest line"""
+
+    def __init__(self, root: str = None):
+        self.logger = logging.getLogger(__name__)
+        self.root = Path(root or DEFAULT_BACKUP_STORE)
+        self.blob_dir = self.root / "blobs"
+        self.snapshot_dir = self.root / "snapshots"
+        self._lock = threading.Lock()
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+
+    def _blob_path(self, digest: str) -> Path:
+        return self.blob_dir / digest[:2] / digest
+
+    def _digest(self, path: str) -> str:
+        cache = shared_cache()
+        return cache.sha256(path) if cache is not None else sha256_file(path)
+
+    def _store_blob(self, path: str, digest: str):
+        """Copy a file into the store unless its content is already there; returns (digest, bytes added)"""
+        blob = self._blob_path(digest)
+        if blob.exists():
+            return digest, 0
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".blob_", dir=str(self.blob_dir))
+        os.close(fd)
+        try:
+            actual = _copy_hashing(path, tmp_path)
+            if actual != digest:
+                # The file changed after its digest was cached; store what was really copied
+                self.logger.warning(f"{path} changed while backing up; storing current content")
+                cache = shared_cache()
+                if cache is not None:
+                    cache.invalidate(path)
+                digest, blob = actual, self._blob_path(actual)
+                blob.parent.mkdir(parents=True, exist_ok=True)
+            # Blobs are shared by every snapshot (and hardlinked views), so keep them read-only
+            os.chmod(tmp_path, stat.S_IREAD)
+            if blob.exists():
+                os.chmod(tmp_path, stat.S_IWRITE | stat.S_IREAD)
+                os.remove(tmp_path)
+                return digest, 0
+            os.replace(tmp_path, blob)
+            return digest, os.path.getsize(blob)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.chmod(tmp_path, stat.S_IWRITE | stat.S_IREAD)
+                os.remove(tmp_path)
+            raise
+
+    def snapshot(self, sources: Iterable[str], label: str = "backup") -> Dict[str, Any]:
+        """Record files and directories; only content not already in the store is copied"""
+        started = time.perf_counter()
+        roots, entries = {}, []
+        new_blobs = new_bytes = 0
+
+        for source in sources:
+            source = os.path.abspath(source)
+            if not os.path.exists(source):
+                continue
+            name = os.path.basename(source.rstrip('\\/')) or 'root'
+            roots[name] = source
+            if os.path.isdir(source):
+                files = [os.path.join(directory, f) for directory, _, names in os.walk(source) for f in sorted(names)]
+            else:
+                files = [source]
+            for path in files:
+                relative = name if path == source else f"{name}/{os.path.relpath(path, source).replace(os.sep, '/')}"
+                digest, added = self._store_blob(path, self._digest(path))
+                if added:
+                    new_blobs += 1
+                    new_bytes += added
+                info = os.stat(path)
+                entries.append({'path': relative, 'sha256': digest, 'size': info.st_size, 'mtime': info.st_mtime})
+
+        snapshot_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{label}"
+        manifest = {
+            'id': snapshot_id,
+            'label': label,
+            'created': time.time(),
+            'roots': roots,
+            'entries': entries
+        }
+        tmp_path = self.snapshot_dir / f"{snapshot_id}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp_path, self.snapshot_dir / f"{snapshot_id}.json")
+
+        summary = {
+            'id': snapshot_id,
+            'files': len(entries),
+            'bytes': sum(entry['size'] for entry in entries),
+            'new_blobs': new_blobs,
+            'new_bytes': new_bytes,
+            'elapsed_s': round(time.perf_counter() - started, 3)
+        }
+        self.logger.info(f"Snapshot {snapshot_id}: {summary['files']} files, {new_bytes} new bytes")
+        return summary
+
+    def load(self, snapshot_id: str) -> Dict[str, Any]:
+        with open(self.snapshot_dir / f"{snapshot_id}.json", 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def list_snapshots(self, label: str = None) -> List[Dict[str, Any]]:
+        """Snapshot summaries, newest first"""
+        snapshots = []
+        for path in self.snapshot_dir.glob("*.json"):
+            try:
+                manifest = self.load(path.stem)
+            except (OSError, ValueError):
+                continue
+            if label and manifest.get('label') != label:
+                continue
+            snapshots.append({
+                'id': manifest['id'],
+                'label': manifest.get('label'),
+                'created': manifest.get('created'),
+                'files': len(manifest['entries']),
+                'bytes': sum(entry['size'] for entry in manifest['entries'])
+            })
+        return sorted(snapshots, key=lambda s: s['created'], reverse=True)
+
+    def latest(self, label: str = None) -> Optional[str]:
+        snapshots = self.list_snapshots(label)
+        return snapshots[0]['id'] if snapshots else None
+
+    def _targets(self, manifest: Dict[str, Any], destination: str = None):
+        for entry in manifest['entries']:
+            top, _, rest = entry['path'].partition('/')
+            if destination:
+                target = os.path.join(destination, *entry['path'].split('/'))
+            else:
+                target = os.path.join(manifest['roots'][top], *rest.split('/')) if rest else manifest['roots'][top]
+            yield entry, target
+
+    def restore(self, snapshot_id: str, destination: str = None, prune: bool = False) -> Dict[str, Any]:
+        """Put a snapshot back (original paths by default), skipping files that match; prune drops extras"""
+        manifest = self.load(snapshot_id)
+        restored, skipped, removed = [], [], []
+        targets = list(self._targets(manifest, destination))
+        if prune:
+            wanted = {os.path.normcase(os.path.abspath(target)) for _, target in targets}
+            for name, source in manifest['roots'].items():
+                root = os.path.join(destination, name) if destination else source
+                if not os.path.isdir(root):
+                    continue
+                for directory, _, names in os.walk(root):
+                    for f in names:
+                        path = os.path.join(directory, f)
+                        if os.path.normcase(os.path.abspath(path)) not in wanted:
+                            os.remove(path)
+                            removed.append(path)
+        for entry, target in targets:
+            try:
+                if os.path.getsize(target) == entry['size'] and self._digest(target) == entry['sha256']:
+                    skipped.append(entry['path'])
+                    continue
+            except OSError:
+                pass
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f"{target}.restore-tmp"
+            shutil.copyfile(self._blob_path(entry['sha256']), tmp_path)
+            os.utime(tmp_path, (entry['mtime'], entry['mtime']))
+            os.replace(tmp_path, target)
+            restored.append(entry['path'])
+        self.logger.info(f"Restored {snapshot_id}: {len(restored)} files written, {len(skipped)} unchanged")
+        return {'id': snapshot_id, 'restored': restored, 'skipped': skipped, 'removed': removed}
+
+    def materialize(self, snapshot_id: str, directory: str) -> str:
+        """Read-only directory view of a snapshot, hardlinked to the blobs where the filesystem allows"""
+        manifest = self.load(snapshot_id)
+        for entry, target in self._targets(manifest, directory):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            blob = self._blob_path(entry['sha256'])
+            try:
+                os.link(blob, target)
+            except OSError:
+                shutil.copy2(blob, target)
+        return directory
+
+    def delete(self, snapshot_id: str):
+        os.remove(self.snapshot_dir / f"{snapshot_id}.json")
+
+    def gc(self) -> Dict[str, int]:
+        """Remove blobs no snapshot refers to"""
+        with self._lock:
+            referenced = set()
+            for path in self.snapshot_dir.glob("*.json"):
+                referenced.update(entry['sha256'] for entry in self.load(path.stem)['entries'])
+            removed = freed = 0
+            for blob in self.blob_dir.glob("*/*"):
+                if blob.name not in referenced:
+                    freed += blob.stat().st_size
+                    os.chmod(blob, stat.S_IWRITE | stat.S_IREAD)
+                    blob.unlink()
+                    removed += 1
+        return {'removed': removed, 'freed_bytes': freed}
+
+    def get_stats(self) -> Dict[str, int]:
+        blobs = list(self.blob_dir.glob("*/*"))
+        return {
+            'snapshots': len(list(self.snapshot_dir.glob("*.json"))),
+            'blobs': len(blobs),
+            'blob_bytes': sum(blob.stat().st_size for blob in blobs)
+        }
+
+
+def benchmark(files: int = 200, size_kb: int = 256) -> Dict[str, Any]:
+    """Full copytree backups versus store snapshots of an unchanged and a slightly changed tree"""
+    results = {'files': files, 'size_kb': size_kb}
+    with tempfile.TemporaryDirectory() as directory:
+        tree = os.path.join(directory, 'RDP Wrapper')
+        os.makedirs(tree)
+        for i in range(files):
+            with open(os.path.join(tree, f"file_{i:04d}.bin"), 'wb') as f:
+                f.write(os.urandom(size_kb * 1024))
+
+        started = time.perf_counter()
+        for i in range(3):
+            shutil.copytree(tree, os.path.join(directory, f"copy_{i}"))
+        results['copytree_x3_s'] = round(time.perf_counter() - started, 3)
+
+        store = BackupStore(os.path.join(directory, 'store'))
+        first = store.snapshot([tree])
+        unchanged = store.snapshot([tree])
+        with open(os.path.join(tree, 'file_0000.bin'), 'wb') as f:
+            f.write(os.urandom(size_kb * 1024))
+        changed = store.snapshot([tree])
+        results.update({
+            'first_snapshot_s': first['elapsed_s'],
+            'unchanged_snapshot_s': unchanged['elapsed_s'],
+            'unchanged_new_bytes': unchanged['new_bytes'],
+            'one_file_changed_s': changed['elapsed_s'],
+            'one_file_changed_new_bytes': changed['new_bytes'],
+            'store': store.get_stats()
+        })
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,425 @@
+"""
+RDP Wrapper Enhanced - Offline Install Bundles
+Single-file release bundles (zip, INI, compiled INI index, signed manifest) for hosts without network access
+"""
+
+import os
+import glob
+import json
+import mmap
+import time
+import shutil
+import struct
+import hashlib
+import logging
+import tempfile
+import zipfile
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+from .manifest import MANIFEST_ALGORITHM, sign_manifest, verify_manifest_signature
+from .updater import INI_FILE, ini_sections, manifest_from_zip
+
+BUNDLE_SUFFIX = ".rdpbundle"
+BUNDLE_FORMAT = 1
+# A bundle file, or a directory of them (local or a file share), searched before the default directory
+BUNDLE_PATH_ENV = "RDPWRAP_BUNDLE"
+DEFAULT_BUNDLE_DIR = Path(os.environ.get('PROGRAMDATA', Path.home())) / "RDP Wrapper Enhanced" / "bundles"
+# Raw Ed25519 public key; only bundles signed with it are used
+DEFAULT_BUNDLE_KEY_PATH = Path(os.environ.get('PROGRAMDATA', Path.home())) / "RDP Wrapper Enhanced" / "bundle_signing.pub"
+# Set to 1 to accept unsigned bundles on hosts without a signing key (lab and test machines only)
+ALLOW_UNSIGNED_ENV = "RDPWRAP_ALLOW_UNSIGNED_BUNDLES"
+
+MANIFEST_MEMBER = "manifest.json"
+RELEASE_MEMBER = "release.zip"
+INI_MEMBER = INI_FILE
+INDEX_MEMBER = "rdpwrap.idx"
+KB_PREFIX = "kb/"
+
+INDEX_MAGIC = b'RDPIDX01'
+INDEX_HEADER = struct.Struct('>8sI')        # magic, section count
+INDEX_RECORD = struct.Struct('>48sII')      # section name, body offset and length in rdpwrap.ini
+
+# Zip local file header: fixed part, then the name and extra field lengths at offset 26
+LOCAL_HEADER_SIZE = 30
+# Fixed timestamp so the same inputs always produce the same bundle bytes
+BUNDLE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+CHUNK_SIZE = 1024 * 1024
+
+
+def compile_ini_index(ini: bytes) -> bytes:
+    """Sorted section table for rdpwrap.ini so one build's section is found without parsing the file"""
+    sections = {}
+    name, start, position = None, 0, 0
+    for line in ini.splitlines(keepends=True):
+        stripped = line.strip()
+        if stripped.startswith(b'[') and stripped.endswith(b']'):
+            if name is not None:
+                sections[name] = (start, position - start)
+            name, start = stripped[1:-1], position + len(line)
+        position += len(line)
+    if name is not None:
+        sections[name] = (start, position - start)
+
+    records = [INDEX_RECORD.pack(name, offset, length) for name, (offset, length) in sorted(sections.items())
+               if len(name) <= INDEX_RECORD.size - 8]
+    return INDEX_HEADER.pack(INDEX_MAGIC, len(records)) + b''.join(records)
+
+
+class IniIndex:
+    """Binary search over a compiled index; section bodies are decoded straight from the INI buffer"""
+
+    def __init__(self, index, ini):
+        magic, self.count = INDEX_HEADER.unpack_from(index, 0)
+        if magic != INDEX_MAGIC:
+            raise ValueError("Not a compiled rdpwrap.ini index")
+        self.index = index
+        self.ini = ini
+
+    def _name(self, position: int) -> bytes:
+        return bytes(self.index[position:position + INDEX_RECORD.size - 8])
+
+    def _find(self, name: str) -> Optional[Tuple[int, int]]:
+        key = name.encode('utf-8').ljust(INDEX_RECORD.size - 8, b'\0')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = INDEX_HEADER.size + mid * INDEX_RECORD.size
+            current = self._name(position)
+            if current < key:
+                lo = mid + 1
+            elif current > key:
+                hi = mid
+            else:
+                return INDEX_RECORD.unpack_from(self.index, position)[1:]
+        return None
+
+    def __contains__(self, name: str) -> bool:
+        return self._find(name) is not None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def section(self, name: str) -> Optional[Dict[str, str]]:
+        """Keys of one section, or None if the INI has no such section"""
+        found = self._find(name)
+        if found is None:
+            return None
+        offset, length = found
+        body = bytes(self.ini[offset:offset + length]).decode('utf-8', errors='replace')
+        return ini_sections(f"[{name}]\n{body}").get(name, {})
+
+    def sections(self) -> List[str]:
+        return [self._name(INDEX_HEADER.size + i * INDEX_RECORD.size).rstrip(b'\0').decode('utf-8')
+                for i in range(self.count)]
+
+    def supports(self, build: str) -> bool:
+        """True if the INI has patch offsets for a termsrv.dll build"""
+        return build in self
+
+    def release(self):
+        for buffer in (self.index, self.ini):
+            if isinstance(buffer, memoryview):
+                buffer.release()
+
+
+def _member_info(name: str, compress_type: int) -> zipfile.ZipInfo:
+    info = zipfile.ZipInfo(name, BUNDLE_DATE_TIME)
+    info.compress_type = compress_type
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def build_bundle(destination: str, release_zip: str, version: str, ini_path: str = None,
+                 kb_notes: Iterable[str] = (), private_key: bytes = None,
+                 download_url: str = None) -> Dict[str, Any]:
+    """Write a bundle; the release zip, INI and index are stored uncompressed so installers can map them"""
+    started = time.perf_counter()
+    release_manifest = manifest_from_zip(release_zip, version)
+    if ini_path:
+        with open(ini_path, 'rb') as f:
+            ini = f.read()
+    else:
+        with zipfile.ZipFile(release_zip, 'r') as zf:
+            ini = zf.read(INI_FILE)
+
+    # name -> (source path or bytes, compression); the release zip is already compressed
+    members = {
+        RELEASE_MEMBER: (release_zip, zipfile.ZIP_STORED),
+        INI_MEMBER: (ini, zipfile.ZIP_STORED),
+        INDEX_MEMBER: (compile_ini_index(ini), zipfile.ZIP_STORED)
+    }
+    for note in kb_notes:
+        members[KB_PREFIX + os.path.basename(note)] = (note, zipfile.ZIP_DEFLATED)
+
+    entries = {}
+    for name, (source, compression) in sorted(members.items()):
+        digest = hashlib.new(MANIFEST_ALGORITHM)
+        if isinstance(source, bytes):
+            digest.update(source)
+            size = len(source)
+        else:
+            with open(source, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            size = os.path.getsize(source)
+        entries[name] = {'size': size, MANIFEST_ALGORITHM: digest.hexdigest(),
+                         'compression': 'stored' if compression == zipfile.ZIP_STORED else 'deflated'}
+
+    # The installed tree uses the bundled INI, so the install manifest describes that one
+    files = dict(release_manifest['files'])
+    files[INI_FILE] = {'size': entries[INI_MEMBER]['size'], MANIFEST_ALGORITHM: entries[INI_MEMBER][MANIFEST_ALGORITHM]}
+    download_url = download_url or f"https://github.com/stascorp/rdpwrap/releases/download/{version}/RDPWrap-{version}.zip"
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'version': version,
+        'algorithm': MANIFEST_ALGORITHM,
+        'release': {
+            'version': version,
+            'download_url': download_url,
+            'filename': os.path.basename(download_url.split('?', 1)[0]),
+            'size': entries[RELEASE_MEMBER]['size'],
+            'published': None
+        },
+        'members': entries,
+        'files': files
+    }
+    if private_key is not None:
+        manifest = sign_manifest(manifest, private_key)
+
+    tmp_path = f"{destination}.tmp"
+    with zipfile.ZipFile(tmp_path, 'w') as zf:
+        zf.writestr(_member_info(MANIFEST_MEMBER, zipfile.ZIP_DEFLATED), json.dumps(manifest, indent=2, sort_keys=True))
+        for name, (source, compression) in sorted(members.items()):
+            info = _member_info(name, compression)
+            if isinstance(source, bytes):
+                zf.writestr(info, source)
+            else:
+                with open(source, 'rb') as src, zf.open(info, 'w') as dst:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    os.replace(tmp_path, destination)
+
+    logging.getLogger(__name__).info(f"Built offline bundle {destination} for {version}")
+    return {
+        'path': destination,
+        'version': version,
+        'signed': private_key is not None,
+        'members': sorted(members),
+        'size': os.path.getsize(destination),
+        'elapsed_s': round(time.perf_counter() - started, 3)
+    }
+
+
+class OfflineBundle:
+    """Read-only view of a bundle; stored members are served from a memory map without copying"""
+
+    def __init__(self, path: str, public_key: Optional[bytes] = None, allow_unsigned: bool = None):
+        self.logger = logging.getLogger(__name__)
+        self.path = str(path)
+        self._file = open(self.path, 'rb')
+        self._index = None
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._zip = zipfile.ZipFile(self._file, 'r')
+            self.manifest = json.loads(self._zip.read(MANIFEST_MEMBER).decode('utf-8'))
+        except (ValueError, KeyError, zipfile.BadZipFile) as e:
+            self._file.close()
+            raise ValueError(f"{self.path} is not an offline bundle: {e}")
+        if self.manifest.get('format') != BUNDLE_FORMAT:
+            self.close()
+            raise ValueError(f"Unsupported bundle format {self.manifest.get('format')}: {self.path}")
+        if public_key is None:
+            if not (unsigned_bundles_allowed() if allow_unsigned is None else allow_unsigned):
+                self.close()
+                raise ValueError(f"No trusted bundle signing key to verify {self.path}; "
+                                 f"set {ALLOW_UNSIGNED_ENV}=1 to accept unsigned bundles")
+            self.logger.warning(f"Using unsigned offline bundle {self.path}")
+        elif not verify_manifest_signature(self.manifest, public_key):
+            self.close()
+            raise ValueError(f"Bundle signature verification failed: {self.path}")
+        self.signed = public_key is not None
+
+    def __enter__(self) -> 'OfflineBundle':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def version(self) -> str:
+        return self.manifest['version']
+
+    @property
+    def release(self) -> Dict[str, Any]:
+        """Release metadata in the shape latest_release() returns, with the digest of the bundled zip"""
+        return dict(self.manifest['release'], sha256=self.manifest['members'][RELEASE_MEMBER][MANIFEST_ALGORITHM])
+
+    def release_manifest(self) -> Dict[str, Any]:
+        """Manifest of the installed files, usable with ManifestVerifier"""
+        return {'version': self.version, 'algorithm': self.manifest['algorithm'], 'files': self.manifest['files']}
+
+    def view(self, name: str) -> memoryview:
+        """Zero-copy view of a stored member"""
+        info = self._zip.getinfo(name)
+        if info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError(f"{name} is compressed and cannot be mapped")
+        name_length, extra_length = struct.unpack_from('<HH', self._map, info.header_offset + 26)
+        start = info.header_offset + LOCAL_HEADER_SIZE + name_length + extra_length
+        return memoryview(self._map)[start:start + info.file_size]
+
+    def read(self, name: str) -> bytes:
+        return self._zip.read(name)
+
+    def _chunks(self, name: str):
+        info = self._zip.getinfo(name)
+        if info.compress_type == zipfile.ZIP_STORED:
+            with self.view(name) as data:
+                for offset in range(0, len(data), CHUNK_SIZE):
+                    yield data[offset:offset + CHUNK_SIZE]
+        else:
+            with self._zip.open(name) as member:
+                yield from iter(lambda: member.read(CHUNK_SIZE), b'')
+
+    def _check(self, name: str, digest: str, size: int):
+        expected = self.manifest['members'].get(name)
+        if expected is None:
+            raise ValueError(f"{name} is not listed in the bundle manifest")
+        if size != expected['size'] or digest != expected[self.manifest['algorithm']]:
+            raise ValueError(f"{name} does not match the bundle manifest")
+
+    def verify(self, members: Iterable[str] = None) -> List[str]:
+        """Check members against the manifest digests; raises ValueError on the first mismatch"""
+        names = list(members or self.manifest['members'])
+        for name in names:
+            digest = hashlib.new(self.manifest['algorithm'])
+            size = 0
+            for chunk in self._chunks(name):
+                digest.update(chunk)
+                size += len(chunk)
+            self._check(name, digest.hexdigest(), size)
+        return names
+
+    def extract_member(self, name: str, destination: str) -> str:
+        """Write a member to destination, checking its digest on the way"""
+        digest = hashlib.new(self.manifest['algorithm'])
+        size = 0
+        tmp_path = f"{destination}.bundle-tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in self._chunks(name):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            self._check(name, digest.hexdigest(), size)
+            os.replace(tmp_path, destination)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return destination
+
+    def ini_index(self) -> IniIndex:
+        """Section lookups served from the mapped INI and index members"""
+        if self._index is None:
+            self._index = IniIndex(self.view(INDEX_MEMBER), self.view(INI_MEMBER))
+        return self._index
+
+    def kb_notes(self) -> Dict[str, str]:
+        return {name[len(KB_PREFIX):]: self.read(name).decode('utf-8', errors='replace')
+                for name in self._zip.namelist() if name.startswith(KB_PREFIX)}
+
+    def close(self):
+        if self._index is not None:
+            self._index.release()
+            self._index = None
+        if getattr(self, '_zip', None) is not None:
+            self._zip.close()
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+        self._file.close()
+
+
+def find_bundle(locations: Iterable[str] = None) -> Optional[str]:
+    """Newest bundle in $RDPWRAP_BUNDLE (a file or a directory) or else the default bundle directory"""
+    for location in locations or (os.environ.get(BUNDLE_PATH_ENV), str(DEFAULT_BUNDLE_DIR)):
+        if not location:
+            continue
+        if os.path.isfile(location):
+            return location
+        candidates = glob.glob(os.path.join(glob.escape(location), f"*{BUNDLE_SUFFIX}"))
+        if candidates:
+            return max(candidates, key=os.path.getmtime)
+    return None
+
+
+def unsigned_bundles_allowed() -> bool:
+    """True if the administrator opted in to unsigned bundles through $RDPWRAP_ALLOW_UNSIGNED_BUNDLES"""
+    return os.environ.get(ALLOW_UNSIGNED_ENV, '').strip().lower() in ('1', 'true', 'yes')
+
+
+def trusted_bundle_key(path: str = None) -> Optional[bytes]:
+    """The administrator's bundle signing key, or None if none is installed"""
+    try:
+        with open(path or DEFAULT_BUNDLE_KEY_PATH, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def bundled_release(path: str = None) -> Optional[Dict[str, Any]]:
+    """Release metadata of the bundle an installer would use, or None if there is no usable bundle"""
+    path = path or find_bundle()
+    if not path:
+        return None
+    try:
+        with OfflineBundle(path, trusted_bundle_key()) as bundle:
+            return dict(bundle.release)
+    except (OSError, ValueError) as e:
+        logging.getLogger(__name__).warning(f"Ignoring offline bundle {path}: {e}")
+        return None
+
+
+def benchmark(sections: int = 2000, lookups: int = 1000) -> Dict[str, Any]:
+    """Build a bundle, then compare parsing rdpwrap.ini with index lookups and time the release copy-out"""
+    results = {'sections': sections, 'lookups': lookups}
+    with tempfile.TemporaryDirectory() as directory:
+        builds = [f"10.0.{19041 + i // 50}.{i % 50}" for i in range(sections)]
+        ini = "[Main]\nUpdated=2024-01-01\n[PatchCodes]\nnop=90\n" + ''.join(
+            f"[{build}]\nLocalOnlyPatch.x64=1\nLocalOnlyOffset.x64={i:X}\nLocalOnlyCode.x64=nop\n"
+            f"[{build}-SLInit]\nbInitialized.x64={i * 8:X}\n" for i, build in enumerate(builds))
+        release_zip = os.path.join(directory, 'RDPWrap.zip')
+        with zipfile.ZipFile(release_zip, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('rdpwrap.dll', os.urandom(4 * 1024 * 1024))
+            zf.writestr(INI_FILE, ini)
+            zf.writestr('install.bat', "RDPWInst.exe -i -o\n")
+
+        path = os.path.join(directory, f"rdpwrap-v1.6.2{BUNDLE_SUFFIX}")
+        built = build_bundle(path, release_zip, 'v1.6.2')
+        results['build_s'] = built['elapsed_s']
+        results['bundle_bytes'] = built['size']
+
+        wanted = [builds[(i * 7919) % sections] for i in range(lookups)]
+        started = time.perf_counter()
+        for build in wanted:
+            ini_sections(ini).get(build)
+        results['parse_per_lookup_ms'] = round((time.perf_counter() - started) * 1000 / lookups, 3)
+
+        with OfflineBundle(path, allow_unsigned=True) as bundle:
+            started = time.perf_counter()
+            bundle.verify()
+            results['verify_s'] = round(time.perf_counter() - started, 4)
+
+            index = bundle.ini_index()
+            started = time.perf_counter()
+            for build in wanted:
+                index.section(build)
+            results['index_per_lookup_ms'] = round((time.perf_counter() - started) * 1000 / lookups, 4)
+
+            started = time.perf_counter()
+            bundle.extract_member(RELEASE_MEMBER, os.path.join(directory, 'release.zip'))
+            results['release_copy_out_s'] = round(time.perf_counter() - started, 4)
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
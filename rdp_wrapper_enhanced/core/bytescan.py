@@ -0,0 +1,253 @@
+"""
+RDP Wrapper Enhanced - Byte Pattern Scanner
+Matches hex signatures with wildcards using an Aho-Corasick automaton over streamed chunks
+"""
+
+import io
+import os
+import json
+import time
+import random
+import logging
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Optional, Tuple
+
+CHUNK_SIZE = 1024 * 1024
+
+DEFAULT_RULES_PATH = Path(os.environ.get('PROGRAMDATA', Path.home())) / "RDP Wrapper Enhanced" / "content_rules.json"
+
+
+def parse_pattern(pattern: str) -> List[Optional[int]]:
+    """Parse hex like '4D 5A ?? ?? 50 45' into byte values, with None for wildcards"""
+    text = ''.join(pattern.split())
+    if not text or len(text) % 2:
+        raise ValueError(f"Invalid byte pattern: {pattern!r}")
+    tokens = []
+    for i in range(0, len(text), 2):
+        pair = text[i:i + 2]
+        tokens.append(None if pair == '??' else int(pair, 16))
+    return tokens
+
+
+def _anchor(tokens: List[Optional[int]]) -> Tuple[int, bytes]:
+    """Longest literal run of a pattern as (offset, bytes); the automaton searches for it"""
+    best_offset, best = 0, b''
+    start = None
+    for i, token in enumerate(tokens + [None]):
+        if token is not None and start is None:
+            start = i
+        elif token is None and start is not None:
+            if i - start > len(best):
+                best_offset, best = start, bytes(tokens[start:i])
+            start = None
+    if not best:
+        raise ValueError("Byte pattern needs at least one literal byte")
+    return best_offset, best
+
+
+def load_rules(path: str = None) -> Dict[str, str]:
+    """Read {rule name: hex pattern} from a JSON file, or return no rules if it is missing"""
+    path = path or DEFAULT_RULES_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class PatternScanner:
+    """Aho-Corasick over each rule's literal anchor, verifying wildcards around every hit"""
+
+    def __init__(self, rules: Dict[str, str]):
+        self.logger = logging.getLogger(__name__)
+        self.rules = dict(rules)
+        self.names = []
+        self.patterns = []
+        self.anchors = []
+        for name, pattern in self.rules.items():
+            tokens = parse_pattern(pattern)
+            self.names.append(name)
+            self.patterns.append(tokens)
+            self.anchors.append(_anchor(tokens))
+        self.max_length = max((len(tokens) for tokens in self.patterns), default=0)
+        self._build()
+
+    def _build(self):
+        """Compile the anchors into a dense DFA: delta[state * 256 + byte] -> next state * 256"""
+        goto = [{}]
+        outputs = [[]]
+        for index, (_, anchor) in enumerate(self.anchors):
+            state = 0
+            for byte in anchor:
+                if byte not in goto[state]:
+                    goto.append({})
+                    outputs.append([])
+                    goto[state][byte] = len(goto) - 1
+                state = goto[state][byte]
+            outputs[state].append(index)
+
+        fail = [0] * len(goto)
+        delta = [0] * (len(goto) * 256)
+        order = deque()
+        for byte in range(256):
+            child = goto[0].get(byte)
+            if child:
+                delta[byte] = child * 256
+                order.append(child)
+
+        # Breadth-first so every fail target is complete before it is copied
+        while order:
+            state = order.popleft()
+            outputs[state] = outputs[state] + outputs[fail[state]]
+            row = state * 256
+            fallback = fail[state] * 256
+            for byte in range(256):
+                child = goto[state].get(byte)
+                if child:
+                    fail[child] = delta[fallback + byte] // 256
+                    delta[row + byte] = child * 256
+                    order.append(child)
+                else:
+                    delta[row + byte] = delta[fallback + byte]
+
+        self.delta = delta
+        # Indexed by pre-multiplied state; empty tuples keep the hot loop to one truth test
+        self.outputs = [()] * (len(goto) * 256)
+        for state, matches in enumerate(outputs):
+            if matches:
+                self.outputs[state * 256] = tuple(matches)
+        self.states = len(goto)
+
+    def _verify(self, data: bytes, start: int, index: int) -> bool:
+        tokens = self.patterns[index]
+        if start < 0 or start + len(tokens) > len(data):
+            return False
+        for i, token in enumerate(tokens):
+            if token is not None and data[start + i] != token:
+                return False
+        return True
+
+    def scan_stream(self, stream, chunk_size: int = CHUNK_SIZE) -> List[Dict[str, Any]]:
+        """Scan a binary stream chunk by chunk, including matches that span chunk boundaries"""
+        hits = []
+        if not self.patterns:
+            return hits
+        delta, outputs, anchors = self.delta, self.outputs, self.anchors
+
+        state = 0
+        window = b''            # retained bytes before the current chunk
+        window_offset = 0       # absolute offset of window[0]
+        pending = []            # (pattern start, rule index) awaiting bytes past the chunk end
+        offset = 0              # absolute offset of the current chunk
+
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            candidates = pending
+            for i, byte in enumerate(chunk):
+                state = delta[state + byte]
+                if outputs[state]:
+                    end = offset + i + 1
+                    for index in outputs[state]:
+                        anchor_offset, anchor = anchors[index]
+                        candidates.append((end - len(anchor) - anchor_offset, index))
+
+            data = window + chunk
+            data_end = offset + len(chunk)
+            pending = []
+            for start, index in candidates:
+                if start + len(self.patterns[index]) > data_end:
+                    pending.append((start, index))
+                elif self._verify(data, start - window_offset, index):
+                    hits.append({'rule': self.names[index], 'offset': start})
+
+            # Keep enough history to verify any pattern whose anchor ends in the next chunk
+            keep_from = min([data_end - self.max_length] + [start for start, _ in pending])
+            keep_from = max(keep_from, window_offset)
+            window = data[keep_from - window_offset:]
+            window_offset = keep_from
+            offset = data_end
+
+        hits.sort(key=lambda hit: (hit['offset'], hit['rule']))
+        return hits
+
+    def scan_bytes(self, data: bytes) -> List[Dict[str, Any]]:
+        return self.scan_stream(io.BytesIO(data))
+
+    def scan_file(self, path: str, chunk_size: int = CHUNK_SIZE) -> List[Dict[str, Any]]:
+        with open(path, 'rb') as f:
+            return self.scan_stream(f, chunk_size)
+
+
+_worker_scanner = None
+
+
+def _init_worker(rules: Dict[str, str]):
+    global _worker_scanner
+    _worker_scanner = PatternScanner(rules)
+
+
+def _scan_worker(path: str) -> Tuple[str, Any]:
+    try:
+        return path, _worker_scanner.scan_file(path)
+    except OSError as e:
+        return path, {'error': str(e)}
+
+
+def scan_files(rules: Dict[str, str], paths: Iterable[str], workers: int = None) -> Dict[str, Any]:
+    """Scan many files in a process pool, returning {path: hits or {'error': ...}}"""
+    paths = list(paths)
+    if not paths:
+        return {}
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    # Each worker compiles the automaton once instead of unpickling it per task
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(rules,)) as pool:
+        return dict(pool.map(_scan_worker, paths))
+
+
+def benchmark(size_mb: int = 32, rules: int = 500, seed: int = 1) -> Dict[str, Any]:
+    """Measure single-file throughput and process-pool throughput in MB/s"""
+    rng = random.Random(seed)
+    ruleset = {}
+    for i in range(rules):
+        tokens = [f"{rng.getrandbits(8):02X}" for _ in range(rng.randrange(6, 16))]
+        for j in rng.sample(range(len(tokens)), k=len(tokens) // 4):
+            tokens[j] = '??'
+        ruleset[f"Synthetic.Rule{i}"] = ' '.join(tokens)
+
+    started = time.perf_counter()
+    scanner = PatternScanner(ruleset)
+    compile_time = time.perf_counter() - started
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for n in range(max(2, os.cpu_count() or 1)):
+            path = os.path.join(directory, f"sample_{n}.bin")
+            with open(path, 'wb') as f:
+                for _ in range(size_mb):
+                    f.write(os.urandom(1024 * 1024))
+            paths.append(path)
+
+        started = time.perf_counter()
+        scanner.scan_file(paths[0])
+        single = time.perf_counter() - started
+
+        started = time.perf_counter()
+        scan_files(ruleset, paths)
+        pooled = time.perf_counter() - started
+
+    return {
+        'rules': rules,
+        'states': scanner.states,
+        'compile_s': round(compile_time, 3),
+        'single_file_mb_s': round(size_mb / single, 2),
+        'pool_files': len(paths),
+        'pool_mb_s': round(size_mb * len(paths) / pooled, 2)
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
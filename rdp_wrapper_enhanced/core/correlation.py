@@ -0,0 +1,157 @@
+"""
+RDP Wrapper Enhanced - Logon Correlation Index
+Links 4624/4625 logon events to terminal server sessions by user, logon id and time window
+"""
+
+import re
+import logging
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+
+# RemoteInteractive and Unlock/reconnect logons are the ones that open RDP sessions
+SESSION_LOGON_TYPES = {'10', '7'}
+
+
+def _epoch(timestamp: str) -> float:
+    """Convert an event or session ISO timestamp to epoch seconds"""
+    try:
+        # wevtutil reports 7-9 fractional digits; fromisoformat accepts at most 6 before 3.11
+        value = re.sub(r'(\.\d{6})\d+', r'\1', timestamp.replace('Z', '+00:00'))
+        return datetime.fromisoformat(value).timestamp()
+    except (AttributeError, ValueError):
+        return 0.0
+
+
+class LogonCorrelationIndex:
+    """Incremental, bounded join between logon events and sessions"""
+
+    def __init__(self, window_seconds: int = 300, max_events: int = 100000, history_per_user: int = 50):
+        self.logger = logging.getLogger(__name__)
+        self.window_seconds = window_seconds
+        self.max_events = max_events
+        self.history_per_user = history_per_user
+
+        self.events = OrderedDict()     # record_id -> event, oldest first
+        self.by_logon_id = {}           # logon_id -> event
+        self.by_user = {}               # username -> deque of events, oldest first
+        self.session_bindings = {}      # session id -> binding
+        self.claimed_logon_ids = {}     # logon_id -> session id
+
+    def add_event(self, event: Dict[str, Any]) -> bool:
+        """Index one logon event, ignoring events already seen"""
+        record_id = event.get('record_id')
+        if record_id in self.events:
+            return False
+
+        entry = {
+            'record_id': record_id,
+            'event_type': event.get('event_type'),
+            'username': (event.get('username') or '').lower(),
+            'logon_id': event.get('logon_id') or '',
+            'logon_type': event.get('logon_type') or '',
+            'source_ip': event.get('source_ip') or '-',
+            'timestamp': event.get('timestamp'),
+            'epoch': _epoch(event.get('timestamp'))
+        }
+
+        self.events[record_id] = entry
+        if entry['logon_id']:
+            self.by_logon_id[entry['logon_id']] = entry
+        history = self.by_user.get(entry['username'])
+        if history is None:
+            history = self.by_user[entry['username']] = deque(maxlen=self.history_per_user)
+        history.append(entry)
+
+        while len(self.events) > self.max_events:
+            self._evict_oldest()
+        return True
+
+    def add_events(self, events: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Index a batch of events, returning the ones not seen before"""
+        # wevtutil /rd:true returns newest first; index in arrival order
+        ordered = sorted(events, key=lambda e: e.get('record_id') or 0)
+        return [event for event in ordered if self.add_event(event)]
+
+    def _evict_oldest(self):
+        """Drop the oldest event from every index"""
+        _, entry = self.events.popitem(last=False)
+        if self.by_logon_id.get(entry['logon_id']) is entry:
+            del self.by_logon_id[entry['logon_id']]
+        history = self.by_user.get(entry['username'])
+        if history and history[0] is entry:
+            history.popleft()
+        if history is not None and not history:
+            del self.by_user[entry['username']]
+
+    def expire(self, now: float):
+        """Drop events older than the retention window"""
+        cutoff = now - self.window_seconds
+        while self.events and next(iter(self.events.values()))['epoch'] < cutoff:
+            self._evict_oldest()
+
+    def bind_session(self, session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Find the logon event that opened a session and remember it"""
+        session_id = session.get('id')
+        if session_id in self.session_bindings:
+            return self.session_bindings[session_id]
+
+        match = self.by_logon_id.get(session.get('logon_id') or '')
+        if match is None:
+            seen = _epoch(session.get('timestamp'))
+            for entry in reversed(self.by_user.get((session.get('username') or '').lower(), ())):
+                # The opening logon precedes the first sighting of the session
+                if entry['event_type'] != 'successful_login' or not 0 <= seen - entry['epoch'] <= self.window_seconds:
+                    continue
+                if entry['logon_id'] in self.claimed_logon_ids:
+                    continue
+                # Events without a logon type cannot be told apart, so take the newest
+                if entry['logon_type'] in SESSION_LOGON_TYPES or not entry['logon_type']:
+                    match = entry
+                    break
+
+        if match is None:
+            return None
+
+        binding = {
+            'logon_id': match['logon_id'],
+            'source_ip': match['source_ip'],
+            'logon_time': match['timestamp']
+        }
+        self.session_bindings[session_id] = binding
+        if match['logon_id']:
+            self.claimed_logon_ids[match['logon_id']] = session_id
+        return binding
+
+    def release_session(self, session_id: str):
+        """Forget the binding of a session that logged off"""
+        binding = self.session_bindings.pop(session_id, None)
+        if binding and self.claimed_logon_ids.get(binding['logon_id']) == session_id:
+            del self.claimed_logon_ids[binding['logon_id']]
+
+    def auth_history(self, username: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Most recent authentication outcomes for a user, newest first"""
+        history = self.by_user.get((username or '').lower(), ())
+        return [
+            {'timestamp': e['timestamp'], 'event_type': e['event_type'], 'source_ip': e['source_ip']}
+            for e in list(history)[-limit:][::-1]
+        ]
+
+    def session_view(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """Session record enriched with source IP and authentication history"""
+        binding = self.bind_session(session) or {}
+        view = dict(session)
+        view['source_ip'] = binding.get('source_ip', 'Unknown')
+        view['logon_id'] = binding.get('logon_id', '')
+        view['logon_time'] = binding.get('logon_time')
+        view['auth_history'] = self.auth_history(session.get('username'))
+        return view
+
+    def get_stats(self) -> Dict[str, int]:
+        """Index sizes"""
+        return {
+            'events': len(self.events),
+            'users': len(self.by_user),
+            'logon_ids': len(self.by_logon_id),
+            'bound_sessions': len(self.session_bindings)
+        }
@@ -0,0 +1,372 @@
+"""
+RDP Wrapper Enhanced - Segmented Downloader
+Resumable HTTP downloads over parallel Range requests, hashed while the bytes arrive
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Callable
+
+from .hashing import sha256_file, shared_cache
+
+BUFFER_SIZE = 1024 * 1024
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+
+# Progress is persisted to the .part.json sidecar at most this often per segment
+STATE_INTERVAL = 8 * 1024 * 1024
+
+
+class DownloadError(Exception):
+    """A download could not be completed or did not match what was expected"""
+
+
+class _Segment:
+    __slots__ = ('start', 'end', 'done')
+
+    def __init__(self, start: int, end: int, done: int = 0):
+        self.start = start
+        self.end = end          # exclusive
+        self.done = done
+
+    @property
+    def size(self) -> int:
+        return self.end - self.start
+
+
+class SegmentedDownloader:
+    """Downloads into <destination>.part, resuming and splitting the body across Range requests"""
+
+    def __init__(self, opener: urllib.request.OpenerDirector = None, segments: int = 4,
+                 min_segment_size: int = MIN_SEGMENT_SIZE, buffer_size: int = BUFFER_SIZE,
+                 timeout: float = 30, retries: int = 3):
+        self.logger = logging.getLogger(__name__)
+        self.opener = opener or urllib.request.build_opener()
+        self.segments = max(1, segments)
+        self.min_segment_size = min_segment_size
+        self.buffer_size = buffer_size
+        self.timeout = timeout
+        self.retries = retries
+
+    def probe(self, url: str) -> Dict[str, Any]:
+        """Final URL after redirects, size, validators and Range support of a resource"""
+        try:
+            with self.opener.open(urllib.request.Request(url, method='HEAD'), timeout=self.timeout) as response:
+                length = response.headers.get('Content-Length')
+                return {
+                    'url': response.geturl(),
+                    'size': int(length) if length is not None else None,
+                    'ranges': response.headers.get('Accept-Ranges', '').lower() == 'bytes',
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            self.logger.debug(f"HEAD {url} failed, falling back to a single stream: {e}")
+            return {'url': url, 'size': None, 'ranges': False, 'etag': None, 'last_modified': None}
+
+    def download(self, url: str, destination: str, expected_sha256: str = None, expected_size: int = None,
+                 progress: Callable[[int, int], None] = None) -> Dict[str, Any]:
+        """Download url to destination and return its size and SHA-256 computed during the transfer"""
+        started = time.perf_counter()
+        destination = os.path.abspath(destination)
+        part_path = f"{destination}.part"
+        state_path = f"{part_path}.json"
+
+        info = dict(self.probe(url), source_url=url)
+        if expected_size is not None and info['size'] is not None and info['size'] != expected_size:
+            raise DownloadError(f"Server reports {info['size']} bytes for {url}, expected {expected_size}")
+
+        if info['ranges'] and info['size']:
+            segments, resumed = self._resume_plan(url, info, part_path, state_path)
+            digest = self._download_segments(info, segments, part_path, state_path, progress)
+        else:
+            segments, resumed = [], 0
+            digest = self._download_stream(info['url'], part_path, progress)
+
+        size = os.path.getsize(part_path)
+        if expected_size is not None and size != expected_size:
+            self._discard(part_path, state_path)
+            raise DownloadError(f"Downloaded {size} bytes from {url}, expected {expected_size}")
+        if expected_sha256 and digest != expected_sha256.lower():
+            # A bad resume can only be repaired by starting over
+            self._discard(part_path, state_path)
+            raise DownloadError(f"SHA-256 mismatch for {url}: {digest}")
+
+        os.replace(part_path, destination)
+        if os.path.exists(state_path):
+            os.remove(state_path)
+
+        # Seed the hash cache so later integrity checks do not read the file again
+        cache = shared_cache()
+        if cache is not None:
+            cache.record(destination, {'sha256': digest})
+
+        return {
+            'path': destination,
+            'size': size,
+            'sha256': digest,
+            'etag': info['etag'],
+            'resumed_bytes': resumed,
+            'segments': max(1, len(segments)),
+            'elapsed_s': round(time.perf_counter() - started, 3)
+        }
+
+    def _resume_plan(self, url: str, info: Dict[str, Any], part_path: str, state_path: str):
+        """Segments still to fetch, reusing a matching .part file when there is one"""
+        size = info['size']
+        try:
+            with open(state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if (state.get('url') == url and state.get('size') == size
+                    and state.get('etag') == info['etag'] and state.get('last_modified') == info['last_modified']
+                    and os.path.getsize(part_path) == size):
+                segments = [_Segment(*bounds) for bounds in state['segments']]
+                resumed = sum(segment.done for segment in segments)
+                self.logger.info(f"Resuming {url} with {resumed} of {size} bytes already on disk")
+                return segments, resumed
+        except (OSError, ValueError, KeyError, TypeError):
+            pass
+
+        count = max(1, min(self.segments, size // self.min_segment_size))
+        step = -(-size // count)
+        segments = [_Segment(start, min(start + step, size)) for start in range(0, size, step)]
+        with open(part_path, 'wb') as f:
+            # Reserve the full size up front so segments write into place without growing the file
+            f.truncate(size)
+        return segments, 0
+
+    def _save_state(self, info: Dict[str, Any], segments: List[_Segment], state_path: str):
+        tmp_path = f"{state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'url': info['source_url'],
+                'size': info['size'],
+                'etag': info['etag'],
+                'last_modified': info['last_modified'],
+                'segments': [[s.start, s.end, s.done] for s in segments]
+            }, f)
+        os.replace(tmp_path, state_path)
+
+    def _download_segments(self, info: Dict[str, Any], segments: List[_Segment], part_path: str,
+                           state_path: str, progress: Callable[[int, int], None] = None) -> str:
+        """Fetch segments in parallel while this thread hashes the contiguous prefix already written"""
+        condition = threading.Condition()
+        errors = []
+        state_lock = threading.Lock()
+        total = info['size']
+
+        def report():
+            if progress:
+                progress(sum(s.done for s in segments), total)
+
+        def fetch(segment: _Segment):
+            attempts = 0
+            last_saved = segment.done
+            with open(part_path, 'r+b', buffering=0) as f:
+                while segment.done < segment.size and not errors:
+                    headers = {'Range': f"bytes={segment.start + segment.done}-{segment.end - 1}"}
+                    if info['etag']:
+                        headers['If-Range'] = info['etag']
+                    try:
+                        request = urllib.request.Request(info['url'], headers=headers)
+                        with self.opener.open(request, timeout=self.timeout) as response:
+                            if response.status != 206:
+                                raise DownloadError(f"Server ignored Range request ({response.status})")
+                            f.seek(segment.start + segment.done)
+                            buffer = memoryview(bytearray(self.buffer_size))
+                            while segment.done < segment.size and not errors:
+                                count = response.readinto(buffer[:segment.size - segment.done])
+                                if not count:
+                                    # An early EOF counts as a failed attempt, not a free re-request
+                                    raise ConnectionError(f"Connection closed {segment.size - segment.done} "
+                                                          f"bytes short of the segment end")
+                                f.write(buffer[:count])
+                                with condition:
+                                    segment.done += count
+                                    condition.notify_all()
+                                report()
+                                if segment.done - last_saved >= STATE_INTERVAL:
+                                    with state_lock:
+                                        self._save_state(info, segments, state_path)
+                                    last_saved = segment.done
+                    except DownloadError:
+                        raise
+                    except (urllib.error.URLError, OSError) as e:
+                        attempts += 1
+                        if attempts > self.retries:
+                            raise
+                        self.logger.warning(f"Segment at {segment.start} interrupted ({e}), retrying")
+                        time.sleep(min(2 ** attempts, 10))
+
+        def run(segment: _Segment):
+            try:
+                fetch(segment)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                with condition:
+                    condition.notify_all()
+
+        digest = hashlib.sha256()
+        with ThreadPoolExecutor(max_workers=len(segments), thread_name_prefix="download") as pool:
+            futures = [pool.submit(run, segment) for segment in segments]
+            try:
+                with open(part_path, 'rb', buffering=0) as reader:
+                    buffer = memoryview(bytearray(self.buffer_size))
+                    for segment in segments:
+                        hashed = 0
+                        while hashed < segment.size:
+                            with condition:
+                                while segment.done == hashed and not errors:
+                                    condition.wait(1.0)
+                                    if all(future.done() for future in futures):
+                                        break
+                                available = segment.done - hashed
+                            if errors or not available:
+                                raise errors[0] if errors else DownloadError("Download ended early")
+                            # The bytes were just written, so this is served from the page cache
+                            reader.seek(segment.start + hashed)
+                            while available:
+                                count = reader.readinto(buffer[:min(available, self.buffer_size)])
+                                digest.update(buffer[:count])
+                                hashed += count
+                                available -= count
+            except BaseException:
+                errors.append(DownloadError("Download aborted"))
+                raise
+            finally:
+                for future in futures:
+                    future.result()
+                if any(s.done < s.size for s in segments):
+                    with state_lock:
+                        self._save_state(info, segments, state_path)
+        return digest.hexdigest()
+
+    def _download_stream(self, url: str, part_path: str, progress: Callable[[int, int], None] = None) -> str:
+        """Single request for servers without Range support; no resume is possible"""
+        digest = hashlib.sha256()
+        with self.opener.open(url, timeout=self.timeout) as response, open(part_path, 'wb', buffering=0) as f:
+            length = response.headers.get('Content-Length')
+            total = int(length) if length is not None else 0
+            buffer = memoryview(bytearray(self.buffer_size))
+            received = 0
+            while True:
+                count = response.readinto(buffer)
+                if not count:
+                    break
+                chunk = buffer[:count]
+                digest.update(chunk)
+                f.write(chunk)
+                received += count
+                if progress:
+                    progress(received, total)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _discard(part_path: str, state_path: str):
+        for path in (part_path, state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def _serve_payload(payload: bytes, rate: int):
+    """Local HTTP stand-in with Range support, throttled to rate bytes/s per connection"""
+    import http.server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _bounds(self):
+            header = self.headers.get('Range')
+            if not header or not header.startswith('bytes='):
+                return 0, len(payload), False
+            first, _, last = header[6:].partition('-')
+            return int(first), (int(last) + 1 if last else len(payload)), True
+
+        def do_HEAD(self):
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(payload)))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', '"benchmark"')
+            self.end_headers()
+
+        def do_GET(self):
+            start, end, partial = self._bounds()
+            self.send_response(206 if partial else 200)
+            self.send_header('Content-Length', str(end - start))
+            if partial:
+                self.send_header('Content-Range', f"bytes {start}-{end - 1}/{len(payload)}")
+            self.end_headers()
+            step = 64 * 1024
+            try:
+                for offset in range(start, end, step):
+                    self.wfile.write(payload[offset:min(offset + step, end)])
+                    time.sleep(step / rate)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def benchmark(size_mb: int = 16, rate_mb_s: float = 4.0) -> Dict[str, Any]:
+    """Naive 8 KB download plus a hashing pass versus segmented hash-while-streaming"""
+    payload = os.urandom(size_mb * 1024 * 1024)
+    expected = hashlib.sha256(payload).hexdigest()
+    server = _serve_payload(payload, int(rate_mb_s * 1024 * 1024))
+    url = f"http://127.0.0.1:{server.server_address[1]}/rdpwrap.zip"
+    results = {'size_mb': size_mb, 'per_connection_mb_s': rate_mb_s}
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            target = os.path.join(directory, 'naive.zip')
+            started = time.perf_counter()
+            with urllib.request.urlopen(url) as response, open(target, 'wb') as f:
+                while True:
+                    data = response.read(8192)
+                    if not data:
+                        break
+                    f.write(data)
+            assert sha256_file(target) == expected
+            results['naive_s'] = round(time.perf_counter() - started, 2)
+
+            for segments in (1, 4):
+                target = os.path.join(directory, f"segmented_{segments}.zip")
+                downloader = SegmentedDownloader(segments=segments, min_segment_size=1024 * 1024)
+                result = downloader.download(url, target, expected_sha256=expected)
+                results[f"segments_{segments}_s"] = result['elapsed_s']
+
+            # Interrupt a download halfway, then resume it from the .part file
+            target = os.path.join(directory, 'resumed.zip')
+            downloader = SegmentedDownloader(segments=4, min_segment_size=1024 * 1024)
+
+            def cancel(done, total):
+                if done > total // 2:
+                    raise DownloadError("Cancelled")
+
+            try:
+                downloader.download(url, target, progress=cancel)
+            except DownloadError:
+                pass
+            result = downloader.download(url, target, expected_sha256=expected)
+            results['resumed_mb'] = round(result['resumed_bytes'] / 1024 / 1024, 1)
+            results['resume_s'] = result['elapsed_s']
+    finally:
+        server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
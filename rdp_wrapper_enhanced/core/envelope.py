@@ -0,0 +1,152 @@
+"""
+RDP Wrapper Enhanced - Encrypted Envelopes
+Password-based Fernet envelopes with a versioned header and a cache of derived keys
+"""
+
+import os
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Any, Iterable, Optional
+
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+ENVELOPE_PREFIX = 'rdpenc'
+ENVELOPE_VERSION = 1
+KDF_NAME = 'pbkdf2-sha256'
+DEFAULT_ITERATIONS = 100000
+# Iteration counts are read from untrusted headers; outside these bounds PBKDF2 either hangs or fails obscurely
+MIN_ITERATIONS = 10000
+MAX_ITERATIONS = 2000000
+SALT_SIZE = 16
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode('ascii').rstrip('=')
+
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def check_iterations(iterations: int) -> int:
+    """Reject PBKDF2 iteration counts outside [MIN_ITERATIONS, MAX_ITERATIONS]"""
+    if isinstance(iterations, bool) or not isinstance(iterations, int) \
+            or not MIN_ITERATIONS <= iterations <= MAX_ITERATIONS:
+        raise ValueError(f"Unsupported KDF iteration count {iterations!r} "
+                         f"(expected {MIN_ITERATIONS}-{MAX_ITERATIONS})")
+    return iterations
+
+
+def key_id(key: bytes) -> str:
+    """Short identifier of a derived key, used to reject a wrong password before decrypting"""
+    return hashlib.sha256(b'rdpenc-key-id' + key).hexdigest()[:16]
+
+
+class KeyCache:
+    """Bounded LRU of derived keys keyed by (password hash, salt, KDF parameters)"""
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def derive(self, password: str, salt: bytes, iterations: int = DEFAULT_ITERATIONS) -> bytes:
+        """Fernet key for a password, deriving it only on a cache miss"""
+        check_iterations(iterations)
+        cache_key = (hashlib.sha256(password.encode('utf-8')).digest(), salt, KDF_NAME, iterations)
+        with self._lock:
+            key = self._keys.get(cache_key)
+            if key is not None:
+                self._keys.move_to_end(cache_key)
+                self.hits += 1
+                return key
+
+        kdf = PBKDF2HMAC(algorithm=hashes.SHA256(), length=32, salt=salt, iterations=iterations)
+        key = base64.urlsafe_b64encode(kdf.derive(password.encode('utf-8')))
+
+        with self._lock:
+            self.misses += 1
+            self._keys[cache_key] = key
+            while len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+        return key
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._keys)}
+
+
+default_key_cache = KeyCache()
+
+
+def is_envelope(data) -> bool:
+    if isinstance(data, bytes):
+        data = data.decode('ascii', errors='ignore')
+    return isinstance(data, str) and data.startswith(f"{ENVELOPE_PREFIX}$")
+
+
+def parse_header(envelope: str) -> Dict[str, Any]:
+    """Split an envelope into its header fields and Fernet token"""
+    if isinstance(envelope, bytes):
+        envelope = envelope.decode('ascii')
+    parts = envelope.split('$')
+    if len(parts) != 7 or parts[0] != ENVELOPE_PREFIX:
+        raise ValueError("Not an encrypted envelope")
+    _, version, kdf, iterations, salt, kid, token = parts
+    if int(version) != ENVELOPE_VERSION or kdf != KDF_NAME:
+        raise ValueError(f"Unsupported envelope version {version} / {kdf}")
+    return {
+        'version': int(version),
+        'kdf': kdf,
+        'iterations': check_iterations(int(iterations)),
+        'salt': _b64decode(salt),
+        'key_id': kid,
+        'token': token
+    }
+
+
+def seal_many(items: Iterable[bytes], password: str, iterations: int = DEFAULT_ITERATIONS,
+              cache: Optional[KeyCache] = None) -> List[str]:
+    """Encrypt many payloads under one freshly salted key, deriving it once"""
+    cache = cache or default_key_cache
+    salt = os.urandom(SALT_SIZE)
+    key = cache.derive(password, salt, iterations)
+    fernet = Fernet(key)
+    header = f"{ENVELOPE_PREFIX}${ENVELOPE_VERSION}${KDF_NAME}${iterations}${_b64encode(salt)}${key_id(key)}$"
+    return [header + fernet.encrypt(item).decode('ascii') for item in items]
+
+
+def seal(data: bytes, password: str, iterations: int = DEFAULT_ITERATIONS,
+         cache: Optional[KeyCache] = None) -> str:
+    """Encrypt one payload into an envelope string"""
+    return seal_many([data], password, iterations, cache)[0]
+
+
+def open_many(envelopes: Iterable[str], password: str, cache: Optional[KeyCache] = None) -> List[bytes]:
+    """Decrypt many envelopes; envelopes sharing a salt share one key derivation"""
+    cache = cache or default_key_cache
+    results = []
+    for envelope in envelopes:
+        header = parse_header(envelope)
+        key = cache.derive(password, header['salt'], header['iterations'])
+        if key_id(key) != header['key_id']:
+            raise ValueError("Wrong password for encrypted envelope")
+        try:
+            results.append(Fernet(key).decrypt(header['token'].encode('ascii')))
+        except InvalidToken:
+            raise ValueError("Encrypted envelope failed authentication")
+    return results
+
+
+def open_envelope(envelope: str, password: str, cache: Optional[KeyCache] = None) -> bytes:
+    """Decrypt one envelope string"""
+    return open_many([envelope], password, cache)[0]
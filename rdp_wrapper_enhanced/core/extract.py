@@ -0,0 +1,180 @@
+"""
+RDP Wrapper Enhanced - Streaming Extraction
+Extracts zip members straight to their final location, skipping files that are already identical
+"""
+
+import os
+import json
+import time
+import zlib
+import shutil
+import logging
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Iterable
+
+CHUNK_SIZE = 1024 * 1024
+
+# Members at least this large are decompressed on worker threads (zlib releases the GIL)
+PARALLEL_THRESHOLD = 1024 * 1024
+
+
+def crc32_file(path: str) -> int:
+    """CRC-32 of a file, comparable with ZipInfo.CRC"""
+    crc = 0
+    with open(path, 'rb', buffering=0) as f:
+        buffer = memoryview(bytearray(CHUNK_SIZE))
+        while True:
+            count = f.readinto(buffer)
+            if not count:
+                break
+            crc = zlib.crc32(buffer[:count], crc)
+    return crc
+
+
+def _target_path(root: str, name: str) -> str:
+    """Destination of a member, refusing names that would escape the target directory"""
+    target = os.path.realpath(os.path.join(root, name))
+    if os.path.commonpath([root, target]) != root:
+        raise ValueError(f"Refusing to extract {name} outside {root}")
+    return target
+
+
+def is_unchanged(info: zipfile.ZipInfo, path: str) -> bool:
+    """True if path already holds exactly the member's content (size first, then CRC)"""
+    try:
+        if os.path.getsize(path) != info.file_size:
+            return False
+        return crc32_file(path) == info.CRC
+    except OSError:
+        return False
+
+
+class StreamingExtractor:
+    """One-pass extraction: each member is decompressed once into a temp file next to its target and renamed"""
+
+    def __init__(self, max_workers: int = 4, parallel_threshold: int = PARALLEL_THRESHOLD,
+                 skip_unchanged: bool = True):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.parallel_threshold = parallel_threshold
+        self.skip_unchanged = skip_unchanged
+
+    def extract(self, zip_path: str, target_dir: str, members: Iterable[str] = None,
+                progress: Callable[[int, int, str], None] = None) -> Dict[str, Any]:
+        """Extract zip_path into target_dir, returning which members were written or skipped"""
+        started = time.perf_counter()
+        target_dir = os.path.realpath(target_dir)
+        os.makedirs(target_dir, exist_ok=True)
+        report = {'written': [], 'skipped': [], 'bytes_written': 0, 'bytes_skipped': 0}
+        lock = threading.Lock()
+        local = threading.local()
+        handles = []
+
+        def archive() -> zipfile.ZipFile:
+            # One handle per thread so parallel members do not contend on a shared file position
+            handle = getattr(local, 'archive', None)
+            if handle is None:
+                handle = local.archive = zipfile.ZipFile(zip_path, 'r')
+                with lock:
+                    handles.append(handle)
+            return handle
+
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            infos = zf.infolist()
+        if members is not None:
+            wanted = set(members)
+            infos = [info for info in infos if info.filename in wanted]
+        total = len(infos)
+        done = [0]
+
+        def finish(info: zipfile.ZipInfo, written: bool):
+            with lock:
+                key = 'written' if written else 'skipped'
+                report[key].append(info.filename)
+                report[f"bytes_{key}"] += info.file_size
+                done[0] += 1
+                count = done[0]
+            if progress:
+                progress(count, total, info.filename)
+
+        def extract_member(info: zipfile.ZipInfo):
+            target = _target_path(target_dir, info.filename)
+            if info.is_dir():
+                os.makedirs(target, exist_ok=True)
+                finish(info, False)
+                return
+            if self.skip_unchanged and is_unchanged(info, target):
+                finish(info, False)
+                return
+
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp_path = f"{target}.extract-tmp"
+            try:
+                # zipfile checks the CRC as the member is read, so a corrupt member never replaces a good file
+                with archive().open(info) as source, open(tmp_path, 'wb') as destination:
+                    shutil.copyfileobj(source, destination, CHUNK_SIZE)
+                modified = time.mktime(info.date_time + (0, 0, -1))
+                os.utime(tmp_path, (modified, modified))
+                os.replace(tmp_path, target)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+            finish(info, True)
+
+        large = [info for info in infos if info.file_size >= self.parallel_threshold]
+        small = [info for info in infos if info.file_size < self.parallel_threshold]
+        try:
+            if len(large) > 1 and self.max_workers > 1:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(large)),
+                                        thread_name_prefix="extract") as pool:
+                    futures = [pool.submit(extract_member, info) for info in large]
+                    for info in small:
+                        extract_member(info)
+                    for future in futures:
+                        future.result()
+            else:
+                for info in large + small:
+                    extract_member(info)
+        finally:
+            for handle in handles:
+                handle.close()
+
+        report['elapsed_s'] = round(time.perf_counter() - started, 3)
+        self.logger.info(f"Extracted {len(report['written'])} files, skipped {len(report['skipped'])} unchanged")
+        return report
+
+
+def benchmark(files: int = 8, size_mb: int = 4) -> Dict[str, Any]:
+    """extractall + copy (the old two-pass install) versus streaming extraction, first run and re-run"""
+    results = {'files': files, 'size_mb': size_mb}
+    with tempfile.TemporaryDirectory() as directory:
+        zip_path = os.path.join(directory, 'release.zip')
+        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for i in range(files):
+                # Half random, half zeros so deflate has real work to do
+                zf.writestr(f"bin/part_{i}.dll", os.urandom(size_mb * 512 * 1024) + bytes(size_mb * 512 * 1024))
+            zf.writestr("rdpwrap.ini", "[Main]\n" * 1000)
+
+        staging = os.path.join(directory, 'staging')
+        final = os.path.join(directory, 'two_pass')
+        started = time.perf_counter()
+        with zipfile.ZipFile(zip_path) as zf:
+            zf.extractall(staging)
+        shutil.copytree(staging, final)
+        results['two_pass_s'] = round(time.perf_counter() - started, 3)
+
+        target = os.path.join(directory, 'streamed')
+        extractor = StreamingExtractor()
+        results['streamed_s'] = extractor.extract(zip_path, target)['elapsed_s']
+        rerun = extractor.extract(zip_path, target)
+        results['rerun_s'] = rerun['elapsed_s']
+        results['rerun_skipped'] = len(rerun['skipped'])
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
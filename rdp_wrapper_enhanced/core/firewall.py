@@ -0,0 +1,233 @@
+"""
+RDP Wrapper Enhanced - Firewall Rule Compiler
+Aggregates IP block lists into minimal CIDR sets and applies them with batched netsh scripts
+"""
+
+import os
+import re
+import json
+import zlib
+import logging
+import tempfile
+import subprocess
+import ipaddress
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Tuple
+
+RULE_PREFIX = "RDP Wrapper Block"
+# Written by the web settings manager; security.blockedIPs is the block list
+SETTINGS_FILE = Path("rdp_wrapper_enhanced") / "config" / "enhanced_settings.json"
+
+# netsh rejects rules with very long remoteip lists; stay well below the limit
+MAX_ADDRESSES_PER_RULE = 1000
+
+
+def aggregate(entries: Iterable[str]) -> List[str]:
+    """Collapse addresses and CIDRs into the minimal covering set of networks"""
+    networks = {4: [], 6: []}
+    for entry in entries:
+        try:
+            network = ipaddress.ip_network(str(entry).strip(), strict=False)
+        except ValueError:
+            logging.getLogger(__name__).warning(f"Skipping invalid firewall entry: {entry}")
+            continue
+        networks[network.version].append(network)
+
+    collapsed = []
+    for version in (4, 6):
+        collapsed.extend(str(n) for n in ipaddress.collapse_addresses(networks[version]))
+    return collapsed
+
+
+def load_block_list(settings_file: str = None) -> List[str]:
+    """security.blockedIPs from the settings file, or an empty list if it is missing or unreadable"""
+    try:
+        with open(settings_file or SETTINGS_FILE, 'r', encoding='utf-8') as f:
+            return list(json.load(f).get('security', {}).get('blockedIPs') or [])
+    except (OSError, ValueError, AttributeError) as e:
+        logging.getLogger(__name__).warning(f"No firewall block list loaded: {e}")
+        return []
+
+
+def _normalize(remote_ip: str) -> List[str]:
+    """Normalize a netsh RemoteIP field (a.b.c.d/255.0.0.0, ranges, Any) to CIDR strings"""
+    networks = []
+    for item in remote_ip.split(','):
+        item = item.strip()
+        if not item or item.lower() == 'any':
+            continue
+        if '-' in item:
+            first, last = (ipaddress.ip_address(part) for part in item.split('-', 1))
+            networks.extend(ipaddress.summarize_address_range(first, last))
+        else:
+            networks.append(ipaddress.ip_network(item, strict=False))
+    return aggregate(str(n) for n in networks)
+
+
+class NetshExecutor:
+    """Runs netsh advfirewall commands, batching many commands into one process"""
+
+    def __init__(self):
+        self.logger = logging.getLogger(__name__)
+
+    def query_rules(self, prefix: str) -> Dict[str, List[str]]:
+        """Return {rule name: remote networks} for inbound rules whose name starts with prefix"""
+        result = subprocess.run(
+            ['netsh', 'advfirewall', 'firewall', 'show', 'rule', 'name=all', 'dir=in'],
+            capture_output=True, text=True
+        )
+        rules = {}
+        name = None
+        for line in result.stdout.splitlines():
+            key, _, value = line.partition(':')
+            key, value = key.strip(), value.strip()
+            if key == 'Rule Name':
+                name = value if value.startswith(prefix) else None
+            elif key == 'RemoteIP' and name:
+                rules[name] = _normalize(value)
+        return rules
+
+    def run_script(self, commands: List[str]) -> bool:
+        """Execute netsh commands in a single `netsh -f` invocation"""
+        if not commands:
+            return True
+
+        fd, script_path = tempfile.mkstemp(prefix="rdp_fw_", suffix=".txt")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write('\n'.join(commands) + '\n')
+            result = subprocess.run(['netsh', '-f', script_path], capture_output=True, text=True)
+            if result.returncode != 0:
+                self.logger.error(f"netsh script failed: {result.stdout} {result.stderr}")
+                return False
+            return True
+        finally:
+            os.remove(script_path)
+
+
+class DryRunExecutor:
+    """In-memory stand-in for NetshExecutor that records scripts and simulates the rule table"""
+
+    COMMAND = re.compile(r'advfirewall firewall (add|set|delete) rule name="([^"]+)"(.*)')
+
+    def __init__(self, rules: Dict[str, List[str]] = None):
+        self.rules = dict(rules or {})
+        self.scripts = []
+
+    def query_rules(self, prefix: str) -> Dict[str, List[str]]:
+        return {name: list(ips) for name, ips in self.rules.items() if name.startswith(prefix)}
+
+    def run_script(self, commands: List[str]) -> bool:
+        if commands:
+            self.scripts.append(list(commands))
+        for command in commands:
+            match = self.COMMAND.match(command)
+            if not match:
+                continue
+            action, name, rest = match.groups()
+            remote = re.search(r'remoteip=(\S+)', rest)
+            if action == 'delete':
+                self.rules.pop(name, None)
+            elif remote:
+                self.rules[name] = _normalize(remote.group(1))
+        return True
+
+    @property
+    def process_spawns(self) -> int:
+        return len(self.scripts)
+
+
+class FirewallRuleCompiler:
+    """Compiles an IP block list into bucketed netsh rules and applies only the differences"""
+
+    def __init__(self, executor=None, prefix: str = RULE_PREFIX, port: int = 3389,
+                 max_per_rule: int = MAX_ADDRESSES_PER_RULE):
+        self.logger = logging.getLogger(__name__)
+        self.executor = executor or NetshExecutor()
+        self.prefix = prefix
+        self.port = port
+        self.max_per_rule = max_per_rule
+        # Only rules named like "<prefix> <buckets>-<bucket>" are managed; others sharing the prefix are left alone
+        self._managed = re.compile(rf"{re.escape(prefix)} (\d+)-(\d{{4}})")
+
+    def _rule_name(self, bucket: int, buckets: int) -> str:
+        return f"{self.prefix} {buckets}-{bucket:04d}"
+
+    def _bucket_count(self, networks: List[str], current: Dict[str, List[str]]) -> int:
+        """Keep the current bucket count while it has room, otherwise size for ~50% fill"""
+        counts = {int(match.group(1)) for match in map(self._managed.fullmatch, current) if match}
+        if len(counts) == 1:
+            existing = counts.pop()
+            if len(networks) <= existing * self.max_per_rule // 2:
+                return existing
+        buckets = 1
+        while buckets * self.max_per_rule // 2 < len(networks):
+            buckets *= 2
+        return buckets
+
+    def compile(self, blocked: Iterable[str], current: Dict[str, List[str]] = None) -> Dict[str, List[str]]:
+        """Map the aggregated block list onto stable, hash-bucketed rule names"""
+        networks = aggregate(blocked)
+        buckets = self._bucket_count(networks, current or {})
+
+        while True:
+            rules = {}
+            for network in networks:
+                # Hash buckets keep unrelated rules untouched when one entry changes
+                bucket = zlib.crc32(network.encode()) % buckets
+                rules.setdefault(self._rule_name(bucket, buckets), []).append(network)
+            if all(len(ips) <= self.max_per_rule for ips in rules.values()):
+                return rules
+            buckets *= 2
+
+    def plan(self, blocked: Iterable[str]) -> List[Tuple[str, str, List[str]]]:
+        """Diff the desired rule set against the applied one as (action, rule, networks)"""
+        current = {name: networks for name, networks in self.executor.query_rules(self.prefix).items()
+                   if self._managed.fullmatch(name)}
+        desired = self.compile(blocked, current)
+
+        operations = []
+        for name in sorted(set(current) - set(desired)):
+            operations.append(('delete', name, []))
+        for name, networks in sorted(desired.items()):
+            if name not in current:
+                operations.append(('add', name, networks))
+            elif sorted(current[name]) != sorted(networks):
+                operations.append(('set', name, networks))
+        return operations
+
+    def to_commands(self, operations: List[Tuple[str, str, List[str]]]) -> List[str]:
+        """Render operations as netsh script lines"""
+        commands = []
+        for action, name, networks in operations:
+            remote = ','.join(networks)
+            if action == 'delete':
+                commands.append(f'advfirewall firewall delete rule name="{name}"')
+            elif action == 'add':
+                commands.append(
+                    f'advfirewall firewall add rule name="{name}" dir=in action=block '
+                    f'protocol=TCP localport={self.port} remoteip={remote}'
+                )
+            else:
+                commands.append(f'advfirewall firewall set rule name="{name}" new remoteip={remote}')
+        return commands
+
+    def apply(self, blocked: Iterable[str], dry_run: bool = False) -> Dict[str, Any]:
+        """Bring the firewall in line with the block list in one netsh invocation"""
+        blocked = list(blocked)
+        operations = self.plan(blocked)
+        commands = self.to_commands(operations)
+
+        success = True if dry_run else self.executor.run_script(commands)
+        summary = {
+            'success': success,
+            'dry_run': dry_run,
+            'entries': len(blocked),
+            'operations': len(operations),
+            'added': sum(1 for op in operations if op[0] == 'add'),
+            'updated': sum(1 for op in operations if op[0] == 'set'),
+            'deleted': sum(1 for op in operations if op[0] == 'delete'),
+            'commands': commands
+        }
+        self.logger.info(f"Firewall sync: {summary['operations']} operations for {len(blocked)} entries")
+        return summary
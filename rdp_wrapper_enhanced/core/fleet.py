@@ -0,0 +1,616 @@
+"""
+RDP Wrapper Enhanced - Fleet Orchestration
+Drives install, update and verify across many hosts through a thin HTTP agent, serving the release from one cache
+"""
+
+import os
+import sys
+import hmac
+import json
+import hashlib
+import time
+import socket
+import logging
+import tempfile
+import threading
+import argparse
+import http.server
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional
+
+from .artifacts import ArtifactCache
+from .bundle import trusted_bundle_key
+from .manifest import sign_manifest, verify_manifest_signature
+
+AGENT_PORT = 8765
+ACTIONS = ('install', 'update', 'verify')
+DEFAULT_INSTALL_DIR = "C:\\Program Files\\RDP Wrapper"
+DEFAULT_TOKEN_PATH = Path(os.environ.get('PROGRAMDATA', Path.home())) / "RDP Wrapper Enhanced" / "agent_token"
+
+# Requests carry an HMAC of the body keyed by the shared token; the token itself never goes on the wire
+SIGNATURE_HEADER = 'X-RDPWrap-Signature'
+TIMESTAMP_HEADER = 'X-RDPWrap-Timestamp'
+NONCE_HEADER = 'X-RDPWrap-Nonce'
+MAX_CLOCK_SKEW = 300
+MAX_REQUEST_BYTES = 1024 * 1024
+
+# Transport failures and these statuses are retried; anything else is a final answer from the agent
+RETRY_STATUSES = (502, 503, 504)
+
+
+def _json_response(handler: http.server.BaseHTTPRequestHandler, status: int, body: Dict[str, Any]):
+    data = json.dumps(body).encode('utf-8')
+    handler.send_response(status)
+    handler.send_header('Content-Type', 'application/json')
+    handler.send_header('Content-Length', str(len(data)))
+    handler.end_headers()
+    handler.wfile.write(data)
+
+
+def _request_mac(token: str, method: str, path: str, timestamp: str, nonce: str, body: bytes) -> str:
+    message = '\n'.join((method, path, timestamp, nonce)).encode('utf-8') + b'\n' + body
+    return hmac.new(token.encode('utf-8'), message, hashlib.sha256).hexdigest()
+
+
+def sign_request(token: str, method: str, path: str, body: bytes = b'') -> Dict[str, str]:
+    """Headers authenticating one agent request; each carries a fresh nonce so it cannot be replayed"""
+    timestamp = str(int(time.time()))
+    nonce = os.urandom(16).hex()
+    return {TIMESTAMP_HEADER: timestamp, NONCE_HEADER: nonce,
+            SIGNATURE_HEADER: _request_mac(token, method, path, timestamp, nonce, body)}
+
+
+def load_agent_token(path: str = None) -> Optional[str]:
+    """Shared agent token from $RDPWRAP_AGENT_TOKEN or the token file, or None if neither is set"""
+    token = os.environ.get('RDPWRAP_AGENT_TOKEN')
+    if not token:
+        try:
+            with open(path or DEFAULT_TOKEN_PATH, 'r', encoding='utf-8') as f:
+                token = f.read()
+        except OSError:
+            return None
+    return token.strip() or None
+
+
+def verify_release_request(request: Dict[str, Any], public_key: bytes):
+    """Raise ValueError unless the artifact and manifest of a request are signed with the trusted release key"""
+    artifact = request.get('artifact')
+    if request['action'] != 'verify' and not (artifact and verify_manifest_signature(artifact, public_key)):
+        raise ValueError("Artifact is not signed with the trusted release key")
+    manifest = request.get('manifest')
+    if manifest and not verify_manifest_signature(manifest, public_key):
+        raise ValueError("Manifest is not signed with the trusted release key")
+
+
+def parse_host(entry: Any) -> Dict[str, Any]:
+    """Inventory entry ("host", "host:port" or a dict) as {'host', 'port', 'token'}"""
+    if isinstance(entry, dict):
+        return {'host': entry['host'], 'port': int(entry.get('port', AGENT_PORT)), 'token': entry.get('token')}
+    text = str(entry).strip()
+    host, sep, port = text.rpartition(':')
+    if not sep:
+        host, port = text, ''
+    return {'host': host, 'port': int(port) if port else AGENT_PORT, 'token': None}
+
+
+def load_inventory(path: str) -> List[Dict[str, Any]]:
+    """Hosts from a JSON list or a text file with one host[:port] per line (# starts a comment)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    if text.lstrip().startswith('['):
+        return [parse_host(entry) for entry in json.loads(text)]
+    lines = (line.split('#', 1)[0].strip() for line in text.splitlines())
+    return [parse_host(line) for line in lines if line]
+
+
+class InstallerActions:
+    """Agent-side actions backed by EnhancedInstaller; the release comes from the orchestrator's peer.
+
+    Artifacts and manifests are only accepted when signed with the trusted release key.
+    """
+
+    def __init__(self, cache: ArtifactCache = None, install_dir: str = DEFAULT_INSTALL_DIR,
+                 public_key: bytes = None):
+        self.logger = logging.getLogger(__name__)
+        self.cache = cache or ArtifactCache()
+        self.install_dir = install_dir
+        self.public_key = public_key or trusted_bundle_key()
+        if self.public_key is None:
+            raise ValueError("No trusted release key; the agent cannot verify what it is asked to install")
+        self._installer = None
+
+    def installer(self):
+        if self._installer is None:
+            # Windows-only dependencies; imported when the first action arrives
+            from .installer import EnhancedInstaller
+
+            self._installer = EnhancedInstaller()
+        return self._installer
+
+    def __call__(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            verify_release_request(request, self.public_key)
+        except ValueError as e:
+            self.logger.error(f"Rejected {request['action']} request: {e}")
+            return {'status': 'rejected', 'error': str(e)}
+        installer = self.installer()
+        if request.get('manifest'):
+            installer.manifest = request['manifest']
+        action = request['action']
+
+        if action == 'verify':
+            report = installer.verify_installation(self.install_dir)
+            return dict(report, status='success' if report.get('valid') else 'failed')
+
+        artifact = request['artifact']
+        zip_path = self.cache.fetch(artifact['url'], expected_sha256=artifact['sha256'],
+                                    version=artifact.get('version'), filename=artifact.get('filename'))
+        if not zip_path:
+            return {'status': 'error', 'error': f"Could not fetch {artifact['url']}"}
+        if action == 'install':
+            return installer.install_with_progress(str(zip_path), self.install_dir)
+        return installer.update_installation(str(zip_path), self.install_dir, version=artifact.get('version'))
+
+
+class AgentServer:
+    """Per-host agent: POST /v1/run executes one action at a time, GET /v1/health reports readiness.
+
+    Every request must be signed with the shared token (see sign_request); the agent will not start without one.
+    """
+
+    def __init__(self, actions: Callable[[Dict[str, Any]], Dict[str, Any]] = None, token: str = None,
+                 host: str = '0.0.0.0', port: int = AGENT_PORT):
+        self.logger = logging.getLogger(__name__)
+        if not token:
+            raise ValueError("The agent needs a shared token; refusing to accept unauthenticated requests")
+        self.actions = actions or InstallerActions()
+        self.token = token
+        self._busy = threading.Lock()
+        self._nonces = {}       # nonce -> timestamp, kept for the clock skew window
+        self._nonce_lock = threading.Lock()
+        agent = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _body(self) -> Optional[bytes]:
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                except ValueError:
+                    return None
+                if not 0 <= length <= MAX_REQUEST_BYTES:
+                    return None
+                return self.rfile.read(length)
+
+            def do_GET(self):
+                if not agent.authorized('GET', self.path, self.headers, b''):
+                    return _json_response(self, 401, {'status': 'unauthorized'})
+                if self.path != '/v1/health':
+                    return _json_response(self, 404, {'status': 'not_found'})
+                _json_response(self, 200, {'status': 'ok', 'host': socket.gethostname(),
+                                           'busy': agent._busy.locked()})
+
+            def do_POST(self):
+                body = self._body()
+                if body is None:
+                    return _json_response(self, 413, {'status': 'error', 'error': 'Request body too large'})
+                if not agent.authorized('POST', self.path, self.headers, body):
+                    return _json_response(self, 401, {'status': 'unauthorized'})
+                if self.path != '/v1/run':
+                    return _json_response(self, 404, {'status': 'not_found'})
+                try:
+                    request = json.loads(body)
+                    if request.get('action') not in ACTIONS:
+                        raise ValueError(f"Unknown action {request.get('action')}")
+                except ValueError as e:
+                    return _json_response(self, 400, {'status': 'error', 'error': str(e)})
+                # One install at a time per host; a second orchestrator is told to come back later
+                if not agent._busy.acquire(blocking=False):
+                    return _json_response(self, 503, {'status': 'busy'})
+                try:
+                    _json_response(self, 200, agent.run(request))
+                finally:
+                    agent._busy.release()
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def authorized(self, method: str, path: str, headers, body: bytes) -> bool:
+        """Check a request signature, its timestamp and that its nonce has not been seen before"""
+        timestamp = headers.get(TIMESTAMP_HEADER, '')
+        nonce = headers.get(NONCE_HEADER, '')
+        expected = _request_mac(self.token, method, path, timestamp, nonce, body)
+        if not (nonce and hmac.compare_digest(headers.get(SIGNATURE_HEADER, ''), expected)):
+            return False
+        now = time.time()
+        try:
+            if abs(now - int(timestamp)) > MAX_CLOCK_SKEW:
+                return False
+        except ValueError:
+            return False
+        with self._nonce_lock:
+            for seen, at in list(self._nonces.items()):
+                if now - at > 2 * MAX_CLOCK_SKEW:
+                    del self._nonces[seen]
+            if nonce in self._nonces:
+                return False
+            self._nonces[nonce] = now
+        return True
+
+    def run(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            result = self.actions(request)
+        except Exception as e:
+            self.logger.error(f"Agent action {request['action']} failed: {e}")
+            result = {'status': 'error', 'error': str(e)}
+        result['agent_elapsed_s'] = round(time.perf_counter() - started, 3)
+        return result
+
+    def start(self) -> 'AgentServer':
+        threading.Thread(target=self.server.serve_forever, name="rdpwrap-agent", daemon=True).start()
+        return self
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ArtifactPeer:
+    """Serves cached artifacts to agents over HTTP with Range support, so hosts fetch from here, not GitHub"""
+
+    def __init__(self, cache: ArtifactCache, host: str = '0.0.0.0', port: int = 0):
+        self.cache = cache
+        self.requests = 0
+        self.bytes_served = 0
+        self._lock = threading.Lock()
+        peer = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _artifact(self):
+                # /artifacts/<sha256>/<filename>
+                parts = self.path.split('?', 1)[0].strip('/').split('/')
+                # No token here: artifacts are public releases and agents only accept them under a signed digest
+                if len(parts) != 3 or parts[0] != 'artifacts':
+                    return None
+                return peer.cache.lookup(parts[1])
+
+            def _range(self, size: int):
+                header = self.headers.get('Range', '')
+                if not header.startswith('bytes='):
+                    return 0, size, False
+                first, _, last = header[6:].split(',', 1)[0].partition('-')
+                start = int(first) if first else max(0, size - int(last))
+                end = min(size, int(last) + 1) if first and last else size
+                return start, end, True
+
+            def _headers(self, path, status: int, start: int, end: int, size: int):
+                self.send_response(status)
+                self.send_header('Content-Length', str(end - start))
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('ETag', f'"{path.parent.name}"')
+                if status == 206:
+                    self.send_header('Content-Range', f"bytes {start}-{end - 1}/{size}")
+                self.end_headers()
+
+            def do_HEAD(self):
+                path = self._artifact()
+                if path is None:
+                    self.send_error(404)
+                    return
+                size = path.stat().st_size
+                self._headers(path, 200, 0, size, size)
+
+            def do_GET(self):
+                path = self._artifact()
+                if path is None:
+                    self.send_error(404)
+                    return
+                size = path.stat().st_size
+                try:
+                    start, end, partial = self._range(size)
+                except ValueError:
+                    self.send_error(416)
+                    return
+                if start >= end:
+                    self.send_error(416)
+                    return
+                self._headers(path, 206 if partial else 200, start, end, size)
+                try:
+                    with open(path, 'rb') as f:
+                        # sendfile where the platform has it; the body never passes through Python buffers
+                        self.connection.sendfile(f, start, end - start)
+                except (BrokenPipeError, ConnectionResetError):
+                    return
+                with peer._lock:
+                    peer.requests += 1
+                    peer.bytes_served += end - start
+
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def start(self) -> 'ArtifactPeer':
+        threading.Thread(target=self.server.serve_forever, name="artifact-peer", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class FleetOrchestrator:
+    """Runs one action across an inventory with a bounded worker pool, per-host deadlines and retries.
+
+    signing_key is the raw Ed25519 release key; agents reject artifacts and manifests it has not signed.
+    """
+
+    def __init__(self, cache: ArtifactCache = None, token: str = None, max_workers: int = 16,
+                 timeout: float = 600, retries: int = 2, backoff: float = 2.0,
+                 advertise_host: str = None, peer_port: int = 0, signing_key: bytes = None):
+        self.logger = logging.getLogger(__name__)
+        self.cache = cache or ArtifactCache()
+        self.token = token
+        self.signing_key = signing_key
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        # Name the agents use to reach the peer; must resolve from every host
+        self.advertise_host = advertise_host or socket.getfqdn()
+        self.peer_port = peer_port
+        self.peer = None
+        self.opener = urllib.request.build_opener()
+
+    def publish(self, url: str, version: str = None, expected_sha256: str = None,
+                download: Callable[[str, str], Any] = None) -> Dict[str, Any]:
+        """Fetch the release once into the local cache and return the artifact reference agents download"""
+        path = self.cache.fetch(url, download, expected_sha256=expected_sha256, version=version)
+        if path is None:
+            raise RuntimeError(f"Could not fetch {url}")
+        if self.peer is None:
+            self.peer = ArtifactPeer(self.cache, port=self.peer_port).start()
+        digest = path.parent.name
+        return self.sign({
+            'url': f"http://{self.advertise_host}:{self.peer.port}/artifacts/{digest}/{path.name}",
+            'sha256': digest,
+            'size': path.stat().st_size,
+            'version': version,
+            'filename': path.name
+        })
+
+    def sign(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Sign an artifact reference or manifest with the release key; already-signed documents pass through"""
+        if document.get('signature'):
+            return document
+        if self.signing_key is None:
+            self.logger.warning("No release signing key; agents will reject this unsigned document")
+            return document
+        return sign_manifest(document, self.signing_key)
+
+    def _call(self, host: Dict[str, Any], request: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+        body = json.dumps(request).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        headers.update(sign_request(host.get('token') or self.token, 'POST', '/v1/run', body))
+        http_request = urllib.request.Request(f"http://{host['host']}:{host['port']}/v1/run",
+                                              data=body, headers=headers)
+        with self.opener.open(http_request, timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+
+    def run_host(self, host: Any, request: Dict[str, Any]) -> Dict[str, Any]:
+        """One host, retried on transport errors and busy agents until its deadline"""
+        host = parse_host(host)
+        if not (host.get('token') or self.token):
+            return {'host': host['host'], 'action': request['action'], 'status': 'error', 'attempts': 0,
+                    'elapsed_s': 0.0, 'error': "No agent token for this host"}
+        started = time.monotonic()
+        deadline = started + self.timeout
+        attempts = 0
+        error = None
+        status = 'unreachable'
+        while attempts <= self.retries:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                status = 'timeout'
+                break
+            attempts += 1
+            try:
+                result = self._call(host, request, remaining)
+                return {'host': host['host'], 'action': request['action'], 'status': result.get('status', 'error'),
+                        'attempts': attempts, 'elapsed_s': round(time.monotonic() - started, 3), 'result': result}
+            except urllib.error.HTTPError as e:
+                error = f"HTTP {e.code}"
+                if e.code not in RETRY_STATUSES:
+                    status = 'error'
+                    break
+                status = 'busy' if e.code == 503 else 'error'
+            except socket.timeout:
+                error, status = "Agent did not answer before the host deadline", 'timeout'
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                reason = getattr(e, 'reason', e)
+                error = str(reason)
+                status = 'timeout' if isinstance(reason, socket.timeout) else 'unreachable'
+            if attempts <= self.retries:
+                time.sleep(min(self.backoff * 2 ** (attempts - 1), max(0.0, deadline - time.monotonic())))
+        self.logger.warning(f"{host['host']}: {request['action']} {status} after {attempts} attempts: {error}")
+        return {'host': host['host'], 'action': request['action'], 'status': status, 'attempts': attempts,
+                'elapsed_s': round(time.monotonic() - started, 3), 'error': error}
+
+    def iter_run(self, action: str, hosts: Iterable[Any], artifact: Dict[str, Any] = None,
+                 manifest: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+        """Yield per-host results as hosts finish; at most max_workers hosts are in flight"""
+        if action not in ACTIONS:
+            raise ValueError(f"Unknown action {action}")
+        if action != 'verify' and artifact is None:
+            raise ValueError(f"{action} needs an artifact from publish()")
+        request = {'action': action, 'artifact': artifact, 'manifest': self.sign(manifest) if manifest else None}
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="fleet") as pool:
+            futures = [pool.submit(self.run_host, host, request) for host in hosts]
+            for future in as_completed(futures):
+                yield future.result()
+
+    def run(self, action: str, hosts: Iterable[Any], artifact: Dict[str, Any] = None,
+            manifest: Dict[str, Any] = None, on_result: Callable[[Dict[str, Any]], None] = None,
+            results_path: str = None) -> Dict[str, Any]:
+        """Run an action fleet-wide; results are streamed to on_result and appended to results_path as JSONL"""
+        started = time.perf_counter()
+        results = []
+        log = open(results_path, 'a', encoding='utf-8') if results_path else None
+        try:
+            for result in self.iter_run(action, hosts, artifact, manifest):
+                results.append(result)
+                if log:
+                    log.write(json.dumps(result) + '\n')
+                    log.flush()
+                if on_result:
+                    on_result(result)
+        finally:
+            if log:
+                log.close()
+
+        by_status = {}
+        for result in results:
+            by_status[result['status']] = by_status.get(result['status'], 0) + 1
+        return {
+            'action': action,
+            'hosts': len(results),
+            'succeeded': by_status.get('success', 0),
+            'by_status': by_status,
+            'elapsed_s': round(time.perf_counter() - started, 3),
+            'results': results
+        }
+
+    def close(self):
+        if self.peer is not None:
+            self.peer.stop()
+            self.peer = None
+
+
+def benchmark(hosts: int = 40, workers: int = 16, install_s: float = 0.2, size_mb: int = 4) -> Dict[str, Any]:
+    """Stand-in agents on localhost fetching one release through the peer; one origin download in total"""
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+    release_key = Ed25519PrivateKey.generate()
+    public_key = release_key.public_key().public_bytes_raw()
+    payload = os.urandom(size_mb * 1024 * 1024)
+    origin_hits = [0]
+
+    class Origin(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            origin_hits[0] += 1
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+    origin = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Origin)
+    threading.Thread(target=origin.serve_forever, daemon=True).start()
+    agents = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        def stand_in(index: int):
+            cache = ArtifactCache(os.path.join(directory, f"agent_{index}"))
+
+            def actions(request):
+                verify_release_request(request, public_key)
+                artifact = request['artifact']
+                path = cache.fetch(artifact['url'], expected_sha256=artifact['sha256'])
+                time.sleep(install_s)
+                return {'status': 'success' if path else 'error'}
+            return actions
+
+        try:
+            for index in range(hosts):
+                agent = AgentServer(stand_in(index), token='bench', host='127.0.0.1', port=0)
+                if index % 10 == 0:
+                    # Every tenth host is still busy with another run, so its first attempt gets 503 and is retried
+                    agent._busy.acquire()
+                    threading.Timer(0.1, agent._busy.release).start()
+                agents.append(agent.start())
+
+            orchestrator = FleetOrchestrator(ArtifactCache(os.path.join(directory, 'orchestrator')), token='bench',
+                                             max_workers=workers, timeout=60, retries=2, backoff=0.05,
+                                             advertise_host='127.0.0.1',
+                                             signing_key=release_key.private_bytes_raw())
+            artifact = orchestrator.publish(f"http://127.0.0.1:{origin.server_address[1]}/RDPWrap-v1.6.2.zip",
+                                            version='v1.6.2')
+            inventory = [{'host': '127.0.0.1', 'port': agent.port} for agent in agents]
+            first = []
+            report = orchestrator.run('install', inventory, artifact,
+                                      on_result=lambda result: first or first.append(time.perf_counter()))
+            peer = orchestrator.peer
+            summary = {
+                'hosts': hosts,
+                'workers': workers,
+                'succeeded': report['succeeded'],
+                'retried_hosts': sum(1 for result in report['results'] if result['attempts'] > 1),
+                'elapsed_s': report['elapsed_s'],
+                'serial_estimate_s': round(hosts * install_s, 2),
+                'origin_downloads': origin_hits[0],
+                'peer_bytes_mb': round(peer.bytes_served / 1024 / 1024, 1)
+            }
+            orchestrator.close()
+        finally:
+            for agent in agents:
+                agent.stop()
+            origin.shutdown()
+    return summary
+
+
+def main(argv: List[str] = None) -> int:
+    """`serve` runs the agent on this host; `benchmark` (the default) runs the localhost fleet benchmark"""
+    parser = argparse.ArgumentParser(prog="python -m rdp_wrapper_enhanced.core.fleet")
+    commands = parser.add_subparsers(dest='command')
+    serve = commands.add_parser('serve', help="run the install agent on this host")
+    serve.add_argument('--host', default='0.0.0.0')
+    serve.add_argument('--port', type=int, default=AGENT_PORT)
+    serve.add_argument('--token-file', help=f"shared token (default $RDPWRAP_AGENT_TOKEN or {DEFAULT_TOKEN_PATH})")
+    serve.add_argument('--key-file', help="trusted release public key (default: the bundle signing key)")
+    serve.add_argument('--install-dir', default=DEFAULT_INSTALL_DIR)
+    commands.add_parser('benchmark', help="run stand-in agents on localhost")
+    args = parser.parse_args(argv)
+
+    if args.command != 'serve':
+        print(json.dumps(benchmark(), indent=2))
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    token = load_agent_token(args.token_file)
+    if not token:
+        print("No agent token: set RDPWRAP_AGENT_TOKEN or write one to the token file", file=sys.stderr)
+        return 2
+    try:
+        actions = InstallerActions(install_dir=args.install_dir,
+                                   public_key=trusted_bundle_key(args.key_file) if args.key_file else None)
+        agent = AgentServer(actions, token=token, host=args.host, port=args.port)
+    except (OSError, ValueError) as e:
+        print(f"Cannot start agent: {e}", file=sys.stderr)
+        return 2
+    logging.getLogger(__name__).info(f"Agent listening on {args.host}:{agent.port}")
+    try:
+        agent.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        agent.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+"""
+RDP Wrapper Enhanced - File Hashing
+Streams files through one or more digests in a single pass and caches digests across runs
+"""
+
+import os
+import mmap
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Any, Optional
+
+CHUNK_SIZE = 1024 * 1024
+
+# Files at least this large are hashed through mmap instead of readinto
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+_local = threading.local()
+
+DEFAULT_CACHE_PATH = Path(os.environ.get('PROGRAMDATA', Path.home())) / "RDP Wrapper Enhanced" / "hash_cache.db"
+
+
+def _buffer() -> memoryview:
+    """Per-thread reusable read buffer"""
+    buffer = getattr(_local, 'buffer', None)
+    if buffer is None:
+        buffer = _local.buffer = memoryview(bytearray(CHUNK_SIZE))
+    return buffer
+
+
+def hash_file(path: str, algorithms: Iterable[str] = ('sha256',)) -> Dict[str, str]:
+    """Hash a file with every requested algorithm in one pass, returning {name: hexdigest}"""
+    digests = {name: hashlib.new(name) for name in algorithms}
+    updaters = [digest.update for digest in digests.values()]
+
+    with open(path, 'rb', buffering=0) as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                for offset in range(0, size, CHUNK_SIZE):
+                    with view[offset:offset + CHUNK_SIZE] as chunk:
+                        for update in updaters:
+                            update(chunk)
+        else:
+            buffer = _buffer()
+            while True:
+                count = f.readinto(buffer)
+                if not count:
+                    break
+                chunk = buffer[:count]
+                for update in updaters:
+                    update(chunk)
+
+    return {name: digest.hexdigest() for name, digest in digests.items()}
+
+
+def sha256_file(path: str) -> str:
+    """SHA-256 hex digest of a file"""
+    return hash_file(path)['sha256']
+
+
+class HashCache:
+    """Persistent digest cache keyed by path and (size, mtime_ns, inode)"""
+
+    def __init__(self, db_path: str = None):
+        self.logger = logging.getLogger(__name__)
+        self.db_path = Path(db_path or DEFAULT_CACHE_PATH)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS digests ("
+            "path TEXT, algorithm TEXT, size INTEGER, mtime_ns INTEGER, inode INTEGER, digest TEXT, "
+            "PRIMARY KEY (path, algorithm))"
+        )
+        self._db.commit()
+
+    @staticmethod
+    def _stamp(path: str):
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+    def lookup(self, path: str, algorithm: str = 'sha256') -> Optional[str]:
+        """Cached digest if the file is unchanged since it was hashed, otherwise None"""
+        key = os.path.abspath(path)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT size, mtime_ns, inode, digest FROM digests WHERE path = ? AND algorithm = ?",
+                (key, algorithm)
+            ).fetchone()
+        if row and tuple(row[:3]) == self._stamp(key):
+            return row[3]
+        return None
+
+    def get(self, path: str, algorithms: Iterable[str] = ('sha256',), force: bool = False) -> Dict[str, str]:
+        """Digests of a file, hashing only the algorithms that are missing or stale"""
+        key = os.path.abspath(path)
+        algorithms = list(algorithms)
+        result = {}
+        if not force:
+            for algorithm in algorithms:
+                digest = self.lookup(key, algorithm)
+                if digest:
+                    result[algorithm] = digest
+
+        missing = [a for a in algorithms if a not in result]
+        if not missing:
+            self.hits += 1
+            return result
+
+        self.misses += 1
+        stamp = self._stamp(key)
+        digests = hash_file(key, missing)
+
+        if stamp != self._stamp(key):
+            # File changed while being hashed; do not cache a torn digest
+            return dict(result, **digests)
+
+        if force:
+            for algorithm, digest in digests.items():
+                cached = self.lookup(key, algorithm)
+                if cached and cached != digest:
+                    self.logger.warning(f"Cached {algorithm} for {key} was stale")
+
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, algorithm, *stamp, digest) for algorithm, digest in digests.items()]
+            )
+            self._db.commit()
+        return dict(result, **digests)
+
+    def record(self, path: str, digests: Dict[str, str]):
+        """Store digests computed elsewhere, e.g. while the file was being downloaded"""
+        key = os.path.abspath(path)
+        stamp = self._stamp(key)
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?)",
+                [(key, algorithm, *stamp, digest) for algorithm, digest in digests.items()]
+            )
+            self._db.commit()
+
+    def sha256(self, path: str, force: bool = False) -> str:
+        """Cached SHA-256 hex digest of a file"""
+        return self.get(path, ('sha256',), force)['sha256']
+
+    def invalidate(self, path: str):
+        """Forget every digest of a path"""
+        with self._lock:
+            self._db.execute("DELETE FROM digests WHERE path = ?", (os.path.abspath(path),))
+            self._db.commit()
+
+    def prune(self) -> int:
+        """Drop entries for files that no longer exist"""
+        with self._lock:
+            paths = [row[0] for row in self._db.execute("SELECT DISTINCT path FROM digests")]
+            gone = [(p,) for p in paths if not os.path.exists(p)]
+            self._db.executemany("DELETE FROM digests WHERE path = ?", gone)
+            self._db.commit()
+        return len(gone)
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache() -> Optional[HashCache]:
+    """Process-wide hash cache, or None if the cache store cannot be opened"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            try:
+                _shared_cache = HashCache()
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Hash cache unavailable: {e}")
+                return None
+        return _shared_cache
+
+
+def cached_sha256(path: str, force: bool = False) -> str:
+    """SHA-256 of a file through the shared cache, falling back to a direct hash"""
+    cache = shared_cache()
+    if cache is None:
+        return sha256_file(path)
+    return cache.sha256(path, force)
+
+
+def benchmark(sizes_mb: Iterable[int] = (1, 16, 128), repeat: int = 3) -> Dict[str, Any]:
+    """Compare whole-file, 4 KB chunked and streaming hashing across file sizes"""
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size_mb in sizes_mb:
+            path = os.path.join(directory, f"bench_{size_mb}.bin")
+            with open(path, 'wb') as f:
+                for _ in range(size_mb):
+                    f.write(os.urandom(1024 * 1024))
+
+            def read_all():
+                with open(path, 'rb') as f:
+                    return hashlib.sha256(f.read()).hexdigest()
+
+            def chunked_4k():
+                digest = hashlib.sha256()
+                with open(path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(4096), b""):
+                        digest.update(chunk)
+                return digest.hexdigest()
+
+            candidates = {
+                'read_all': read_all,
+                'chunked_4k': chunked_4k,
+                'hash_file': lambda: sha256_file(path),
+                'hash_file_sha256_blake2b': lambda: hash_file(path, ('sha256', 'blake2b'))
+            }
+
+            timings = {}
+            for name, func in candidates.items():
+                best = min(_timed(func) for _ in range(repeat))
+                timings[name] = round(size_mb / best, 1) if best else 0.0
+            results[f"{size_mb}MB"] = timings
+    return {'unit': 'MB/s', 'results': results}
+
+
+def _timed(func) -> float:
+    started = time.perf_counter()
+    func()
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
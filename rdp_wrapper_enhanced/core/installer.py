@@ -7,11 +7,21 @@ import shutil
 import subprocess
 import json
 import logging
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable
 from pathlib import Path
-import zipfile
 import tempfile
 from .security import EnhancedSecurityManager
+from .hashing import cached_sha256
+from .manifest import MANIFEST_SUFFIX, ManifestVerifier, check_manifest, expected_entry, load_manifest
+from .streamcrypt import write_encrypted_archive
+from .downloader import SegmentedDownloader
+from .extract import StreamingExtractor
+from .updater import UpdatePlanner, termsrv_version
+from .backupstore import BackupStore
+from .transaction import InstallTransaction
+from .probes import shared_probe_runner
+from .pipeline import InstallPipeline, StageError, format_report
+from .bundle import INI_MEMBER, RELEASE_MEMBER, OfflineBundle, find_bundle, trusted_bundle_key
 
 class EnhancedInstaller:
     """Advanced installer with security features and rollback support"""
@@ -20,24 +30,31 @@ class EnhancedInstaller:
         self.logger = logging.getLogger(__name__)
         self.security_manager = EnhancedSecurityManager()
         self.backup_path = None
+        self.backup_snapshot = None
+        self.backup_store = BackupStore()
+        self.transaction = InstallTransaction(service="TermService")
+        # Finish or undo an install that was interrupted by a crash or power loss
+        self.transaction.recover()
         self.installation_log = []
+        self.manifest = None
+        self.manifest_verifier = ManifestVerifier()
+        # Pins are checked on every segment connection, not in a separate handshake
+        self.downloader = SegmentedDownloader(opener=self.security_manager.pin_store.opener())
+        self.extractor = StreamingExtractor()
+        self.probes = shared_probe_runner()
         
     def check_system_compatibility(self) -> Dict[str, Any]:
         """Check system compatibility for RDP Wrapper"""
         try:
-            # Check Windows version
-            result = subprocess.run(['ver'], capture_output=True, text=True, shell=True)
-            windows_version = result.stdout.strip()
+            # The three probes run concurrently; versions come from the probe cache after the first run
+            results = self.probes.run(['windows_version', 'architecture', 'terminal_service'])
+            failed = [name for name, result in results.items() if result['status'] != 'ok']
+            if failed:
+                self.logger.warning(f"Compatibility probes did not complete: {', '.join(failed)}")
             
-            # Check architecture
-            arch_result = subprocess.run(['wmic', 'os', 'get', 'OSArchitecture'], 
-                                       capture_output=True, text=True)
-            architecture = arch_result.stdout.split('\n')[1].strip()
-            
-            # Check if Terminal Services is running
-            ts_result = subprocess.run(['sc', 'query', 'TermService'], 
-                                     capture_output=True, text=True)
-            ts_running = "RUNNING" in ts_result.stdout
+            windows_version = results['windows_version']['value'] or "Unknown"
+            architecture = results['architecture']['value'] or "Unknown"
+            ts_running = bool(results['terminal_service']['value'])
             
             compatibility = {
                 "windows_version": windows_version,
@@ -56,43 +73,52 @@ class EnhancedInstaller:
     def create_backup(self, target_paths: List[str]) -> bool:
         """Create backup of existing RDP Wrapper installation"""
         try:
-            backup_dir = tempfile.mkdtemp(prefix="rdp_wrapper_backup_")
-            self.backup_path = backup_dir
-            
-            for path in target_paths:
-                if os.path.exists(path):
-                    dest_path = os.path.join(backup_dir, os.path.basename(path))
-                    if os.path.isdir(path):
-                        shutil.copytree(path, dest_path)
-                    else:
-                        shutil.copy2(path, dest_path)
-                        
-            self.logger.info(f"Backup created at: {backup_dir}")
+            # Files already in the store (e.g. from the previous install) are not copied again
+            snapshot = self.backup_store.snapshot(target_paths, label="installer")
+            self.backup_snapshot = snapshot["id"]
+            self.backup_path = str(self.backup_store.snapshot_dir / f"{snapshot['id']}.json")
+            
+            self.logger.info(f"Backup snapshot {snapshot['id']}: {snapshot['files']} files, "
+                             f"{snapshot['new_bytes']} new bytes")
             return True
             
         except Exception as e:
             self.logger.error(f"Backup creation failed: {e}")
             return False
             
-    def download_and_verify(self, url: str, destination: str) -> bool:
-        """Download RDP Wrapper with security verification"""
+    def export_backup(self, destination: str, password: str) -> bool:
+        """Stream the current backup into an encrypted archive"""
         try:
-            import requests
-            
-            # Validate SSL certificate
-            if not self.security_manager.validate_ssl_certificate(url.split('/')[2]):
-                self.logger.error("SSL certificate validation failed")
+            if not self.backup_snapshot:
+                self.logger.error("No backup available to export")
                 return False
                 
-            # Download file
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
+            with tempfile.TemporaryDirectory(prefix="rdp_wrapper_backup_") as view:
+                # Hardlinked view of the snapshot; nothing is copied where links are supported
+                self.backup_store.materialize(self.backup_snapshot, view)
+                sources = [os.path.join(view, item) for item in os.listdir(view)]
+                members = write_encrypted_archive(destination, sources, password)
+            self.logger.info(f"Encrypted backup exported to {destination} ({members} files)")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Backup export failed: {e}")
+            return False
             
-            # Save file
-            with open(destination, 'wb') as f:
-                f.write(response.content)
+    def download_and_verify(self, url: str, destination: str,
+                            progress: Callable[[int, int], None] = None) -> bool:
+        """Download RDP Wrapper with security verification against the signed release manifest"""
+        try:
+            # Without a signed manifest there is nothing to verify the download against
+            if not self.manifest and not self.load_release_manifest(url + MANIFEST_SUFFIX):
+                return False
+            expected = expected_entry(self.manifest, os.path.basename(destination)) or {}
+            result = self.downloader.download(url, destination, expected_sha256=expected.get('sha256'),
+                                              expected_size=expected.get('size'), progress=progress)
+            self.logger.info(f"Downloaded {result['size']} bytes in {result['elapsed_s']}s "
+                             f"({result['resumed_bytes']} resumed)")
                 
-            # Verify integrity
+            # Verify integrity; the digest was cached during the download
             if not self.verify_file_integrity(destination):
                 self.logger.error("File integrity verification failed")
                 return False
@@ -110,50 +136,95 @@ class EnhancedInstaller:
             self.logger.error(f"Download failed: {e}")
             return False
             
-    def verify_file_integrity(self, file_path: str) -> bool:
-        """Verify file integrity using checksums"""
+    def load_release_manifest(self, manifest_path: str, public_key: Optional[bytes] = None) -> bool:
+        """Load the release manifest (file or https:// URL); it must be signed with public_key or the release key"""
         try:
-            # Calculate SHA256 hash
-            with open(file_path, 'rb') as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
-                
-            # Compare with known good hash
-            known_hashes = {
-                "rdp_wrapper.zip": "a1b2c3d4e5f6789012345678901234567890abcdef1234567890abcdef123456"
-            }
+            public_key = public_key or trusted_bundle_key()
+            if manifest_path.startswith('https://'):
+                with self.security_manager.open_url(manifest_path) as response:
+                    self.manifest = check_manifest(json.load(response), public_key, manifest_path)
+            else:
+                self.manifest = load_manifest(manifest_path, public_key)
+            self.logger.info(f"Loaded release manifest {self.manifest.get('version')} "
+                             f"({len(self.manifest.get('files', {}))} files)")
+            return True
+        except Exception as e:
+            self.logger.error(f"Failed to load release manifest: {e}")
+            return False
             
+    def verify_file_integrity(self, file_path: str, force_verify: bool = False) -> bool:
+        """Verify file integrity using checksums"""
+        try:
             filename = os.path.basename(file_path)
-            if filename in known_hashes:
-                return file_hash == known_hashes[filename]
+            expected = expected_entry(self.manifest or {}, filename)
+            if expected is None:
+                self.logger.error(f"No release manifest entry for {filename}; refusing to trust it")
+                return False
+                
+            if os.path.getsize(file_path) != expected.get('size'):
+                return False
                 
-            return True  # If no known hash, assume valid
+            # Calculate SHA256 hash (cached until the file changes)
+            return cached_sha256(file_path, force_verify) == expected.get('sha256')
             
         except Exception as e:
             self.logger.error(f"Integrity verification failed: {e}")
             return False
             
-    def install_with_progress(self, source_path: str, install_dir: str) -> Dict[str, Any]:
-        """Install RDP Wrapper with progress tracking"""
+    def verify_installation(self, install_dir: str = "C:\\Program Files\\RDP Wrapper",
+                            force_verify: bool = False) -> Dict[str, Any]:
+        """Verify every file of an installation against the release manifest"""
+        if not self.manifest:
+            return {"valid": False, "error": "No release manifest loaded"}
+        return self.manifest_verifier.verify(install_dir, self.manifest, force_verify)
+            
+    def update_installation(self, zip_path: str, install_dir: str = "C:\\Program Files\\RDP Wrapper",
+                            version: str = None) -> Dict[str, Any]:
+        """Differential update: replace only files that differ from the release, restart only if needed"""
         try:
-            self.installation_log = []
+            planner = UpdatePlanner(verifier=self.manifest_verifier, extractor=self.extractor)
+            result = planner.update(zip_path, install_dir, manifest=self.manifest, version=version)
+            result["status"] = "success"
+            return result
+        except Exception as e:
+            self.logger.error(f"Update failed: {e}")
+            return {"status": "error", "error": str(e)}
             
-            # Create installation directory
-            os.makedirs(install_dir, exist_ok=True)
+    def install_with_progress(self, source_path: str, install_dir: str, ini_path: str = None) -> Dict[str, Any]:
+        """Install RDP Wrapper with progress tracking; ini_path replaces the release's rdpwrap.ini"""
+        try:
+            self.installation_log = []
             
-            # Extract if zip file
             if source_path.endswith('.zip'):
-                with zipfile.ZipFile(source_path, 'r') as zip_ref:
-                    zip_ref.extractall(install_dir)
-                    
-            # Copy files
-            for item in os.listdir(install_dir):
-                src_path = os.path.join(install_dir, item)
-                dst_path = os.path.join("C:\\Program Files\\RDP Wrapper", item)
+                # Stage beside the live tree and switch over by rename; the old tree stays for rollback
+                self.transaction.begin()
+                try:
+                    extraction = self.transaction.stage(source_path)
+                    if ini_path:
+                        shutil.copy2(ini_path, os.path.join(self.transaction.staging_dir, "rdpwrap.ini"))
+                except Exception:
+                    self.transaction.abort()
+                    raise
+                switch = self.transaction.commit()
+                self.installation_log.append({
+                    "step": "extraction",
+                    "written": extraction["written"],
+                    "skipped": extraction["skipped"],
+                    "switch_s": switch["switch_s"]
+                })
+            else:
+                # Create installation directory
+                os.makedirs(install_dir, exist_ok=True)
                 
-                if os.path.isdir(src_path):
-                    shutil.copytree(src_path, dst_path, dirs_exist_ok=True)
-                else:
-                    shutil.copy2(src_path, dst_path)
+                # Copy files
+                for item in os.listdir(install_dir):
+                    src_path = os.path.join(install_dir, item)
+                    dst_path = os.path.join("C:\\Program Files\\RDP Wrapper", item)
+                    
+                    if os.path.isdir(src_path):
+                        shutil.copytree(src_path, dst_path, dirs_exist_ok=True)
+                    else:
+                        shutil.copy2(src_path, dst_path)
                     
             # Install service
             install_result = subprocess.run([
@@ -183,6 +254,73 @@ class EnhancedInstaller:
                 "installation_log": self.installation_log
             }
             
+    def install_from_url(self, url: str, zip_path: str, install_dir: str = "C:\\Program Files\\RDP Wrapper",
+                         on_progress: Callable[[float, str, str], None] = None) -> Dict[str, Any]:
+        """Download, back up and probe concurrently, then install once all three are done"""
+        def require(ok: bool, message: str):
+            if not ok:
+                raise RuntimeError(message)
+                
+        def download(results, progress):
+            def report(done: int, total: int):
+                progress(done / total if total else 0.0, "Downloading...")
+            require(self.download_and_verify(url, zip_path, report), "Download or verification failed")
+            
+        def backup(results, progress):
+            require(self.create_backup([install_dir]) if os.path.exists(install_dir) else True, "Backup failed")
+            
+        def probes(results, progress):
+            compatibility = self.check_system_compatibility()
+            require(compatibility.get("compatible"), f"System is not compatible: {compatibility}")
+            return compatibility
+            
+        def install(results, progress):
+            result = self.install_with_progress(zip_path, install_dir)
+            require(result["status"] == "success", result.get("error", "Installation failed"))
+            return result
+            
+        pipeline = InstallPipeline()
+        pipeline.add('download', download, weight=5)
+        pipeline.add('backup', backup, weight=2)
+        pipeline.add('probes', probes, weight=1)
+        pipeline.add('install', install, requires=['download', 'backup', 'probes'], weight=2)
+        try:
+            report = pipeline.run(on_progress=on_progress)
+        except StageError as e:
+            self.logger.error(f"Installation failed at {e.stage}:\n{format_report(e.report)}")
+            return {"status": "error", "error": str(e), "timing": e.report}
+            
+        self.logger.info(f"Installation finished:\n{format_report(report)}")
+        return dict(report['results']['install'], timing=report)
+        
+    def install_from_bundle(self, bundle_path: str = None, public_key: Optional[bytes] = None,
+                            allow_unsigned: bool = None) -> Dict[str, Any]:
+        """Install from an offline bundle on local disk or a file share, without network access"""
+        try:
+            bundle_path = bundle_path or find_bundle()
+            if not bundle_path:
+                return {"status": "error", "error": "No offline bundle found"}
+                
+            with OfflineBundle(bundle_path, public_key or trusted_bundle_key(), allow_unsigned) as bundle:
+                bundle.verify()
+                # The signed bundle manifest describes the installed tree, including the bundled INI
+                self.manifest = bundle.release_manifest()
+                build = termsrv_version()
+                if build and not bundle.ini_index().supports(build):
+                    self.logger.warning(f"Bundled rdpwrap.ini has no section for termsrv.dll {build}")
+                    
+                with tempfile.TemporaryDirectory(prefix="rdp_wrapper_bundle_") as directory:
+                    zip_path = bundle.extract_member(RELEASE_MEMBER, os.path.join(directory, RELEASE_MEMBER))
+                    ini_path = bundle.extract_member(INI_MEMBER, os.path.join(directory, INI_MEMBER))
+                    result = self.install_with_progress(zip_path, "C:\\Program Files\\RDP Wrapper", ini_path)
+                    
+            result["bundle"] = {"path": bundle_path, "version": self.manifest["version"], "signed": bundle.signed}
+            return result
+            
+        except Exception as e:
+            self.logger.error(f"Bundle installation failed: {e}")
+            return {"status": "error", "error": str(e)}
+            
     def configure_rdp_wrapper(self):
         """Configure RDP Wrapper settings"""
         try:
@@ -223,25 +361,15 @@ IdleTimeout=30
     def rollback_installation(self) -> bool:
         """Rollback to previous state"""
         try:
-            if not self.backup_path or not os.path.exists(self.backup_path):
+            if self.transaction.can_rollback():
+                # The replaced tree is still beside the live one: two renames, whatever its size
+                self.transaction.rollback()
+            elif self.backup_snapshot:
+                # Restore files from the blob store; files that already match are not rewritten
+                self.backup_store.restore(self.backup_snapshot, prune=True)
+            else:
                 self.logger.error("No backup available for rollback")
                 return False
-                
-            # Restore files from backup
-            for item in os.listdir(self.backup_path):
-                src_path = os.path.join(self.backup_path, item)
-                dst_path = os.path.join("C:\\Program Files\\RDP Wrapper", item)
-                
-                if os.path.exists(dst_path):
-                    if os.path.isdir(dst_path):
-                        shutil.rmtree(dst_path)
-                    else:
-                        os.remove(dst_path)
-                        
-                if os.path.isdir(src_path):
-                    shutil.copytree(src_path, dst_path)
-                else:
-                    shutil.copy2(src_path, dst_path)
                     
             self.logger.info("Rollback completed successfully")
             return True
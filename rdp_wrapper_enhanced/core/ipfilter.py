@@ -0,0 +1,208 @@
+"""
+RDP Wrapper Enhanced - IP Allow/Block Matcher
+Compiles security.allowedIPs / blockedIPs into sorted interval arrays for fast lookups
+"""
+
+import os
+import json
+import time
+import socket
+import random
+import logging
+import ipaddress
+from bisect import bisect_right
+from typing import Dict, Any, Iterable, Optional, Tuple
+
+
+def ip_to_int(address: str) -> Optional[Tuple[int, int]]:
+    """Convert an address string to (version, integer), or None if it is not an IP"""
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, address), 'big')
+    except (OSError, TypeError):
+        pass
+    try:
+        value = int.from_bytes(socket.inet_pton(socket.AF_INET6, address.split('%', 1)[0]), 'big')
+    except (OSError, TypeError, AttributeError):
+        return None
+    # Report IPv4-mapped IPv6 addresses (::ffff:a.b.c.d) as IPv4
+    if value >> 32 == 0xFFFF:
+        return 4, value & 0xFFFFFFFF
+    return 6, value
+
+
+def parse_range(entry: str) -> Optional[Tuple[int, int, int]]:
+    """Convert an address or CIDR string to (version, first, last), or None if invalid"""
+    address, _, prefix = str(entry).strip().partition('/')
+    parsed = ip_to_int(address)
+    if parsed is None:
+        return None
+    version, value = parsed
+    bits = 32 if version == 4 else 128
+
+    try:
+        length = int(prefix) if prefix else bits
+    except ValueError:
+        return None
+    if prefix and ':' in address and version == 4:
+        # Prefix of an IPv4-mapped network is given in IPv6 bits; below /96 it reaches past the IPv4 part
+        if length < 96:
+            return None
+        length -= 96
+    if not 0 <= length <= bits:
+        return None
+
+    host_bits = bits - length
+    first = value >> host_bits << host_bits
+    return version, first, first | ((1 << host_bits) - 1)
+
+
+class IPMatcher:
+    """Compiled membership test for a list of addresses and CIDR ranges"""
+
+    def __init__(self, entries: Iterable[str] = ()):
+        self.logger = logging.getLogger(__name__)
+        self.invalid = []
+        self.starts = {4: [], 6: []}
+        self.ends = {4: [], 6: []}
+        self.compile(entries)
+
+    def compile(self, entries: Iterable[str]):
+        """Parse entries and merge them into disjoint sorted ranges per address family"""
+        ranges = {4: [], 6: []}
+        self.invalid = []
+
+        for entry in entries:
+            parsed = parse_range(entry)
+            if parsed is None:
+                self.invalid.append(entry)
+            else:
+                ranges[parsed[0]].append(parsed[1:])
+
+        if self.invalid:
+            self.logger.warning(f"Ignoring {len(self.invalid)} invalid IP entries: {self.invalid[:5]}")
+
+        for version, items in ranges.items():
+            starts, ends = [], []
+            for start, end in sorted(items):
+                # Merge overlapping and adjacent ranges
+                if ends and start <= ends[-1] + 1:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self.starts[version] = starts
+            self.ends[version] = ends
+
+    def __contains__(self, address: str) -> bool:
+        parsed = ip_to_int(address)
+        if parsed is None:
+            return False
+        version, value = parsed
+        index = bisect_right(self.starts[version], value) - 1
+        return index >= 0 and value <= self.ends[version][index]
+
+    def __len__(self) -> int:
+        return len(self.starts[4]) + len(self.starts[6])
+
+
+class IPAccessPolicy:
+    """Evaluates allowedIPs/blockedIPs and recompiles them when the settings change"""
+
+    def __init__(self, settings_file: str = None, check_interval: float = 5.0):
+        self.logger = logging.getLogger(__name__)
+        self.settings_file = settings_file
+        self.check_interval = check_interval
+        self.allowed = IPMatcher()
+        self.blocked = IPMatcher()
+        self._fingerprint = None
+        self._file_stamp = None
+        self._next_check = 0.0
+
+    def load(self, security: Dict[str, Any]) -> bool:
+        """Compile the allow/block lists of a security settings section if they changed"""
+        allowed = tuple(security.get('allowedIPs') or ())
+        blocked = tuple(security.get('blockedIPs') or ())
+        fingerprint = hash((allowed, blocked))
+        if fingerprint == self._fingerprint:
+            return False
+
+        self.allowed = IPMatcher(allowed)
+        self.blocked = IPMatcher(blocked)
+        self._fingerprint = fingerprint
+        self.logger.info(f"IP policy compiled: {len(self.allowed)} allowed ranges, {len(self.blocked)} blocked ranges")
+        return True
+
+    def reload_if_changed(self) -> bool:
+        """Re-read the settings file when its size or mtime changed, at most once per interval"""
+        now = time.monotonic()
+        if not self.settings_file or now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+
+        try:
+            stat = os.stat(self.settings_file)
+        except OSError:
+            return False
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._file_stamp:
+            return False
+
+        try:
+            with open(self.settings_file, 'r') as f:
+                settings = json.load(f)
+        except Exception as e:
+            self.logger.error(f"Error reloading IP policy: {e}")
+            return False
+
+        self._file_stamp = stamp
+        return self.load(settings.get('security', {}))
+
+    def evaluate(self, address: str) -> Dict[str, Any]:
+        """Decide whether an address may connect"""
+        self.reload_if_changed()
+
+        if address in self.blocked:
+            return {'allowed': False, 'reason': 'blocked'}
+        if len(self.allowed) and address not in self.allowed:
+            return {'allowed': False, 'reason': 'not_allowed'}
+        return {'allowed': True, 'reason': 'allowed'}
+
+    def is_allowed(self, address: str) -> bool:
+        """Shortcut for evaluate(address)['allowed']"""
+        return self.evaluate(address)['allowed']
+
+
+def benchmark(entries: int = 100000, lookups: int = 100000, seed: int = 1) -> Dict[str, Any]:
+    """Measure compile time and lookup rate for a synthetic threat feed"""
+    rng = random.Random(seed)
+    feed = []
+    for _ in range(entries):
+        value = rng.getrandbits(32)
+        if rng.random() < 0.3:
+            prefix = rng.randrange(16, 32)
+            feed.append(f"{ipaddress.IPv4Address(value)}/{prefix}")
+        else:
+            feed.append(str(ipaddress.IPv4Address(value)))
+    feed.extend(f"2001:db8:{i:x}::/48" for i in range(entries // 10))
+    probes = [str(ipaddress.IPv4Address(rng.getrandbits(32))) for _ in range(lookups)]
+
+    started = time.perf_counter()
+    matcher = IPMatcher(feed)
+    compile_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    hits = sum(1 for probe in probes if probe in matcher)
+    lookup_time = time.perf_counter() - started
+
+    return {
+        'entries': len(feed),
+        'ranges': len(matcher),
+        'compile_s': round(compile_time, 3),
+        'lookups': lookups,
+        'hits': hits,
+        'lookup_us': round(lookup_time / lookups * 1e6, 3)
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
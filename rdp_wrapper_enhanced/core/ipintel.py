@@ -0,0 +1,166 @@
+"""
+RDP Wrapper Enhanced - Offline IP Enrichment
+Maps source IPs to ASN, country and threat tags from a memory-mapped sorted-range file
+"""
+
+import os
+import mmap
+import struct
+import socket
+import logging
+import ipaddress
+from functools import lru_cache
+from typing import Dict, List, Any, Iterable, Optional
+
+MAGIC = b'RDPIPDB1'
+HEADER = struct.Struct('>8sII')               # magic, IPv4 record count, IPv6 record count
+V4_RECORD = struct.Struct('>III2sH')          # start, end, asn, country, tag bits
+V6_RECORD = struct.Struct('>16s16sI2sH')      # start, end, asn, country, tag bits
+
+TAGS = ['scanner', 'tor_exit', 'hosting', 'vpn', 'botnet']
+
+
+def _tag_bits(tags: Iterable[str]) -> int:
+    bits = 0
+    for tag in tags:
+        if tag in TAGS:
+            bits |= 1 << TAGS.index(tag)
+    return bits
+
+
+def _flatten(items: List[tuple]) -> List[tuple]:
+    """Split nested networks into disjoint ranges where the most specific network wins"""
+    flat = []
+    stack = []
+    cursor = 0
+
+    def emit(start, end, payload):
+        if start <= end:
+            flat.append((start, end) + payload)
+
+    for start, end, *payload in sorted(items, key=lambda item: (item[0], -item[1])):
+        while stack and stack[-1][1] < start:
+            top = stack.pop()
+            emit(cursor, top[1], tuple(top[2:]))
+            cursor = top[1] + 1
+        if stack:
+            emit(cursor, start - 1, tuple(stack[-1][2:]))
+        cursor = start
+        stack.append((start, end, *payload))
+
+    while stack:
+        top = stack.pop()
+        emit(cursor, top[1], tuple(top[2:]))
+        cursor = top[1] + 1
+    return flat
+
+
+def build_database(records: Iterable[Dict[str, Any]], path: str) -> int:
+    """Write enrichment records ({'network', 'asn', 'country', 'tags'}) as a sorted-range file"""
+    ranges = {4: [], 6: []}
+    for record in records:
+        network = ipaddress.ip_network(record['network'], strict=False)
+        ranges[network.version].append((
+            int(network.network_address),
+            int(network.broadcast_address),
+            int(record.get('asn') or 0),
+            (record.get('country') or '--').upper().encode('ascii')[:2],
+            _tag_bits(record.get('tags') or ())
+        ))
+    ranges = {version: _flatten(items) for version, items in ranges.items()}
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(ranges[4]), len(ranges[6])))
+        for start, end, asn, country, bits in ranges[4]:
+            f.write(V4_RECORD.pack(start, end, asn, country, bits))
+        for start, end, asn, country, bits in ranges[6]:
+            f.write(V6_RECORD.pack(start.to_bytes(16, 'big'), end.to_bytes(16, 'big'), asn, country, bits))
+    os.replace(tmp_path, path)
+    return len(ranges[4]) + len(ranges[6])
+
+
+class IPIntelDatabase:
+    """Read-only, memory-mapped enrichment database with an LRU in front"""
+
+    def __init__(self, path: str, cache_size: int = 65536):
+        self.logger = logging.getLogger(__name__)
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.v4_count, self.v6_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an IP enrichment database")
+        self.v4_offset = HEADER.size
+        self.v6_offset = self.v4_offset + self.v4_count * V4_RECORD.size
+
+        self.lookup = lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _search(self, key, offset: int, count: int, record: struct.Struct, width: int) -> int:
+        """Index of the last record whose start is <= key, or -1"""
+        mm = self._map
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = offset + mid * record.size
+            start = mm[position:position + width]
+            if start <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1
+
+    def _lookup(self, address: str) -> Optional[Dict[str, Any]]:
+        """Find the range containing an address"""
+        try:
+            key = socket.inet_pton(socket.AF_INET, address)
+            offset, count, record = self.v4_offset, self.v4_count, V4_RECORD
+        except (OSError, TypeError):
+            try:
+                key = socket.inet_pton(socket.AF_INET6, address)
+            except (OSError, TypeError):
+                return None
+            offset, count, record = self.v6_offset, self.v6_count, V6_RECORD
+
+        width = len(key)
+        index = self._search(key, offset, count, record, width)
+        if index < 0:
+            return None
+
+        position = offset + index * record.size
+        _, end, asn, country, bits = record.unpack_from(self._map, position)
+        if width == 4:
+            end = end.to_bytes(4, 'big')
+        if key > end:
+            return None
+
+        return {
+            'asn': asn,
+            'country': country.decode('ascii'),
+            'tags': [tag for i, tag in enumerate(TAGS) if bits & (1 << i)]
+        }
+
+    def enrich(self, addresses: Iterable[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """Look up many addresses at once"""
+        return {address: self.lookup(address) for address in set(addresses)}
+
+    def cache_info(self) -> Dict[str, int]:
+        info = self.lookup.cache_info()
+        return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'max_size': info.maxsize}
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def open_database(path: str, cache_size: int = 65536) -> Optional[IPIntelDatabase]:
+    """Open the enrichment database if it exists, otherwise return None"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return IPIntelDatabase(path, cache_size)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"Error opening IP enrichment database: {e}")
+        return None
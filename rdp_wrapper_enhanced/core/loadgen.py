@@ -0,0 +1,302 @@
+"""
+RDP Wrapper Enhanced - Synthetic Load Generator
+Replays deterministic terminal server load through the monitor collectors for benchmarking
+"""
+
+import json
+import random
+import time
+import ipaddress
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional
+from xml.sax.saxutils import escape
+
+from .monitor import RDPMonitor
+
+EVENT_NAMESPACE = "http://schemas.microsoft.com/win/2004/08/events/event"
+
+DEFAULT_SCENARIO = {
+    'seed': 1,
+    'sessions': 500,
+    'users': 200,
+    'logon_events_per_minute': 10000,
+    'failed_login_ratio': 0.2,
+    'disconnected_ratio': 0.1,
+    'session_churn_ratio': 0.02,
+    'processes': 300,
+    'tick_seconds': 5,
+    'ticks': 12,
+    'source_networks': ['10.0.0.0/16', '192.168.0.0/16', '203.0.113.0/24'],
+    'start_time': '2024-01-01T00:00:00'
+}
+
+
+def load_scenario(path: str = None) -> Dict[str, Any]:
+    """Load a scenario file on top of the default scenario"""
+    scenario = dict(DEFAULT_SCENARIO)
+    if path:
+        with open(path, 'r') as f:
+            scenario.update(json.load(f))
+    return scenario
+
+
+class SyntheticBackend:
+    """Deterministic stand-in for WindowsSystemBackend driven by a scenario"""
+
+    def __init__(self, scenario: Dict[str, Any] = None):
+        self.scenario = dict(DEFAULT_SCENARIO, **(scenario or {}))
+        self.rng = random.Random(self.scenario['seed'])
+        self.clock = datetime.fromisoformat(self.scenario['start_time']).replace(tzinfo=timezone.utc)
+        self.usernames = [f"user{i:04d}" for i in range(self.scenario['users'])]
+        self.networks = [ipaddress.ip_network(n) for n in self.scenario['source_networks']]
+
+        self.sessions = {}
+        self.tick_events = []
+        self.next_session_id = 2
+        self.next_logon_id = 0x100000
+        self.next_record_id = 1
+        self.bytes_sent = 0
+        self.bytes_recv = 0
+        self.processes = self._build_process_table()
+
+        for _ in range(self.scenario['sessions']):
+            self._open_session()
+        self.tick_events = []
+
+    def _random_ip(self) -> str:
+        """Pick a source address from one of the scenario networks"""
+        network = self.rng.choice(self.networks)
+        offset = self.rng.randrange(1, max(2, network.num_addresses - 1))
+        return str(network.network_address + offset)
+
+    def _build_process_table(self) -> List[Dict]:
+        """Build the static part of the process table"""
+        names = ['svchost.exe', 'explorer.exe', 'chrome.exe', 'outlook.exe', 'conhost.exe']
+        processes = [{'pid': 4, 'name': 'System'}, {'pid': 1100, 'name': 'termsrv.exe'}]
+        for i in range(self.scenario['processes']):
+            processes.append({'pid': 2000 + i * 4, 'name': self.rng.choice(names)})
+        return processes
+
+    def _event_xml(self, event_id: int, username: str, logon_id: Optional[int], source_ip: str,
+                   logon_type: int = 3) -> str:
+        """Render one Security log event the way `wevtutil qe /f:xml` does"""
+        record_id = self.next_record_id
+        self.next_record_id += 1
+        fields = [
+            ('TargetUserName', username),
+            ('TargetDomainName', 'CORP'),
+            ('LogonType', str(logon_type)),
+            ('WorkstationName', f"WS{self.rng.randrange(1000):03d}"),
+            ('IpAddress', source_ip),
+            ('IpPort', str(self.rng.randrange(49152, 65535)))
+        ]
+        if logon_id is not None:
+            fields.insert(2, ('TargetLogonId', hex(logon_id)))
+        else:
+            fields.append(('Status', '0xc000006d'))
+        data = ''.join(f"<Data Name='{name}'>{escape(value)}</Data>" for name, value in fields)
+        return (
+            f"<Event xmlns='{EVENT_NAMESPACE}'><System>"
+            f"<Provider Name='Microsoft-Windows-Security-Auditing'/>"
+            f"<EventID>{event_id}</EventID>"
+            f"<TimeCreated SystemTime='{self.clock.strftime('%Y-%m-%dT%H:%M:%S.%f')}0Z'/>"
+            f"<EventRecordID>{record_id}</EventRecordID>"
+            f"<Channel>Security</Channel><Computer>RDS01</Computer>"
+            f"</System><EventData>{data}</EventData></Event>"
+        )
+
+    def _open_session(self):
+        """Log a user on and emit the matching 4624 event"""
+        session_id = self.next_session_id
+        self.next_session_id += 1
+        logon_id = self.next_logon_id
+        self.next_logon_id += self.rng.randrange(1, 64)
+        username = self.rng.choice(self.usernames)
+        source_ip = self._random_ip()
+
+        self.sessions[session_id] = {
+            'username': username,
+            'state': 'Disc' if self.rng.random() < self.scenario['disconnected_ratio'] else 'Active',
+            'logon_id': logon_id,
+            'source_ip': source_ip
+        }
+        self.tick_events.append(self._event_xml(4624, username, logon_id, source_ip, logon_type=10))
+
+    def now(self) -> datetime:
+        """Current simulated time"""
+        return self.clock
+
+    def advance(self):
+        """Move the simulated clock forward by one tick"""
+        tick = self.scenario['tick_seconds']
+        self.clock += timedelta(seconds=tick)
+        self.tick_events = []
+
+        # Session churn: log some users off and others on
+        churn = int(len(self.sessions) * self.scenario['session_churn_ratio'])
+        for session_id in self.rng.sample(sorted(self.sessions), min(churn, len(self.sessions))):
+            del self.sessions[session_id]
+        for _ in range(churn):
+            self._open_session()
+
+        for session in self.sessions.values():
+            if self.rng.random() < self.scenario['session_churn_ratio']:
+                session['state'] = 'Active' if session['state'] == 'Disc' else 'Disc'
+
+        # Background logon traffic
+        event_count = self.scenario['logon_events_per_minute'] * tick // 60
+        for _ in range(max(0, event_count - churn)):
+            username = self.rng.choice(self.usernames)
+            if self.rng.random() < self.scenario['failed_login_ratio']:
+                self.tick_events.append(self._event_xml(4625, username, None, self._random_ip()))
+            else:
+                logon_id = self.next_logon_id
+                self.next_logon_id += 1
+                self.tick_events.append(self._event_xml(4624, username, logon_id, self._random_ip()))
+
+        self.bytes_sent += self.rng.randrange(1 << 20, 1 << 24)
+        self.bytes_recv += self.rng.randrange(1 << 20, 1 << 24)
+
+    def query_sessions(self) -> str:
+        """Return `query session` output for the simulated sessions"""
+        lines = [
+            " SESSIONNAME       USERNAME                 ID  STATE   TYPE        DEVICE",
+            " services                                    0  Disc",
+            ">console                                     1  Conn"
+        ]
+        rdp_index = 0
+        for session_id, session in self.sessions.items():
+            if session['state'] == 'Active':
+                name = f"rdp-tcp#{rdp_index}"
+                rdp_index += 1
+            else:
+                name = ''
+            lines.append(f" {name:<18}{session['username']:<20}{session_id:>7}  {session['state']}")
+        lines.append(" rdp-tcp                                 65536  Listen")
+        return '\n'.join(lines) + '\n'
+
+    def query_security_events(self, count: int) -> str:
+        """Return the newest events of the current tick as wevtutil XML"""
+        return ''.join(reversed(self.tick_events[-count:]))
+
+    def system_resources(self) -> Dict:
+        """Return simulated CPU, memory and disk usage"""
+        return {
+            'cpu_usage': round(self.rng.uniform(20, 95), 1),
+            'memory_usage': round(self.rng.uniform(40, 90), 1),
+            'memory_available_gb': round(self.rng.uniform(2, 32), 2),
+            'disk_usage': round(self.rng.uniform(50, 95), 1),
+            'disk_free_gb': round(self.rng.uniform(10, 200), 2)
+        }
+
+    def network_io(self) -> Dict:
+        """Return simulated network byte counters"""
+        return {'bytes_sent': self.bytes_sent, 'bytes_recv': self.bytes_recv}
+
+    def process_table(self) -> List[Dict]:
+        """Return the simulated process table with one rdpclip per active session"""
+        table = [
+            dict(proc, cpu_percent=round(self.rng.uniform(0, 5), 1), memory_percent=round(self.rng.uniform(0, 2), 2))
+            for proc in self.processes
+        ]
+        for session_id, session in self.sessions.items():
+            if session['state'] == 'Active':
+                table.append({
+                    'pid': 100000 + session_id,
+                    'name': 'rdpclip.exe',
+                    'cpu_percent': round(self.rng.uniform(0, 1), 1),
+                    'memory_percent': 0.05
+                })
+        return table
+
+
+class ReplayHarness:
+    """Drives RDPMonitor collectors with a synthetic backend and records throughput and latency"""
+
+    COLLECTORS = [
+        '_check_system_resources',
+        '_check_rdp_connections',
+        '_check_security_events',
+        '_update_performance_metrics'
+    ]
+
+    REPORTS = ['get_status', 'get_connection_report', 'get_security_report']
+
+    def __init__(self, scenario: Dict[str, Any] = None, monitor: RDPMonitor = None):
+        self.logger = logging.getLogger(__name__)
+        self.backend = SyntheticBackend(scenario)
+        self.scenario = self.backend.scenario
+        self.monitor = monitor or RDPMonitor(backend=self.backend)
+        self.monitor.backend = self.backend
+
+        # Let the monitor see every event generated during a tick
+        events_per_tick = self.scenario['logon_events_per_minute'] * self.scenario['tick_seconds'] // 60
+        self.monitor.config['security_events_per_poll'] = max(events_per_tick, 1)
+
+    def run(self) -> Dict[str, Any]:
+        """Replay the scenario and return a timing report"""
+        samples = {name: [] for name in self.COLLECTORS + self.REPORTS}
+        events_processed = 0
+        sessions_processed = 0
+
+        started = time.perf_counter()
+        for _ in range(self.scenario['ticks']):
+            self.backend.advance()
+
+            for name in self.COLLECTORS + self.REPORTS:
+                t0 = time.perf_counter()
+                getattr(self.monitor, name)()
+                samples[name].append(time.perf_counter() - t0)
+
+            events_processed += len(self.monitor.metrics['security_events'])
+            sessions_processed += len(self.monitor.metrics['connections'])
+        elapsed = time.perf_counter() - started
+
+        # Generator time is excluded so only the monitor stack is measured
+        busy = sum(sum(values) for values in samples.values())
+        simulated = self.scenario['ticks'] * self.scenario['tick_seconds']
+
+        report = {
+            'scenario': self.scenario,
+            'ticks': self.scenario['ticks'],
+            'wall_time_s': round(elapsed, 4),
+            'monitor_time_s': round(busy, 4),
+            'sessions_processed': sessions_processed,
+            'events_processed': events_processed,
+            'events_per_second': round(events_processed / busy, 1) if busy else 0.0,
+            'simulated_seconds': simulated,
+            'realtime_factor': round(simulated / busy, 1) if busy else 0.0,
+            'latency_ms': {name: self._summarize(values) for name, values in samples.items()}
+        }
+        self.logger.info(f"Replay finished: {events_processed} events in {elapsed:.2f}s")
+        return report
+
+    @staticmethod
+    def _summarize(samples: List[float]) -> Dict[str, float]:
+        """Summarize latency samples in milliseconds"""
+        if not samples:
+            return {}
+        ordered = sorted(samples)
+
+        def percentile(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+        return {
+            'mean': round(sum(ordered) / len(ordered) * 1000, 3),
+            'p50': percentile(0.50),
+            'p95': percentile(0.95),
+            'max': round(ordered[-1] * 1000, 3)
+        }
+
+
+def run_benchmark(scenario_path: str = None) -> Dict[str, Any]:
+    """Replay a scenario file against a fresh monitor"""
+    return ReplayHarness(load_scenario(scenario_path)).run()
+
+
+if __name__ == "__main__":
+    import sys
+
+    report = run_benchmark(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(json.dumps({k: v for k, v in report.items() if k != 'scenario'}, indent=2))
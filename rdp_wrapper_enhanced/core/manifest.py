@@ -0,0 +1,180 @@
+"""
+RDP Wrapper Enhanced - Release Manifest Verification
+Checks an install directory against a signed list of file sizes and digests
+"""
+
+import os
+import json
+import time
+import base64
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional
+
+from .hashing import hash_file, shared_cache
+
+RELEASE_FILES = [
+    'rdpwrap.dll',
+    'rdpwrap.ini',
+    'RDPConf.exe',
+    'RDPCheck.exe',
+    'RDPWInst.exe',
+    'install.bat',
+    'uninstall.bat',
+    'update.bat'
+]
+
+MANIFEST_ALGORITHM = 'sha256'
+# Published beside a release zip: <zip url> + MANIFEST_SUFFIX
+MANIFEST_SUFFIX = '.manifest.json'
+
+
+def _canonical(manifest: Dict[str, Any]) -> bytes:
+    """Bytes covered by the signature: the manifest without its signature, canonically encoded"""
+    body = {key: value for key, value in manifest.items() if key != 'signature'}
+    return json.dumps(body, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def _local_path(directory: str, name: str) -> str:
+    return os.path.join(directory, *name.replace('\\', '/').split('/'))
+
+
+def build_manifest(directory: str, version: str, files: List[str] = None, archive: str = None) -> Dict[str, Any]:
+    """Describe the release files present in a directory, and optionally the release zip they came from"""
+    entries = {}
+    for name in files or RELEASE_FILES:
+        path = _local_path(directory, name)
+        if not os.path.isfile(path):
+            continue
+        entries[name] = {
+            'size': os.path.getsize(path),
+            MANIFEST_ALGORITHM: hash_file(path, (MANIFEST_ALGORITHM,))[MANIFEST_ALGORITHM]
+        }
+    manifest = {'version': version, 'algorithm': MANIFEST_ALGORITHM, 'files': entries}
+    if archive:
+        manifest['release'] = {
+            'filename': os.path.basename(archive),
+            'size': os.path.getsize(archive),
+            MANIFEST_ALGORITHM: hash_file(archive, (MANIFEST_ALGORITHM,))[MANIFEST_ALGORITHM]
+        }
+    return manifest
+
+
+def expected_entry(manifest: Dict[str, Any], filename: str) -> Optional[Dict[str, Any]]:
+    """Size and digest a manifest lists for a release file or the release zip, or None if it lists neither"""
+    release = manifest.get('release') or {}
+    if release.get('filename') == filename:
+        return release
+    return manifest.get('files', {}).get(filename)
+
+
+def sign_manifest(manifest: Dict[str, Any], private_key: bytes) -> Dict[str, Any]:
+    """Attach an Ed25519 signature made with a raw 32-byte private key"""
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+
+    key = Ed25519PrivateKey.from_private_bytes(private_key)
+    signed = dict(manifest)
+    signed['signature'] = base64.b64encode(key.sign(_canonical(manifest))).decode('ascii')
+    return signed
+
+
+def verify_manifest_signature(manifest: Dict[str, Any], public_key: bytes) -> bool:
+    """Check the Ed25519 signature of a manifest against a raw 32-byte public key"""
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PublicKey
+
+    signature = manifest.get('signature')
+    if not signature:
+        return False
+    try:
+        Ed25519PublicKey.from_public_bytes(public_key).verify(base64.b64decode(signature), _canonical(manifest))
+        return True
+    except (InvalidSignature, ValueError):
+        return False
+
+
+def check_manifest(manifest: Dict[str, Any], public_key: Optional[bytes], source: str) -> Dict[str, Any]:
+    """Return a parsed manifest only if it is signed with the trusted key; without a key nothing is trusted"""
+    if public_key is None:
+        raise ValueError(f"No trusted signing key to verify the manifest {source}")
+    if not isinstance(manifest, dict) or not verify_manifest_signature(manifest, public_key):
+        raise ValueError(f"Manifest signature verification failed: {source}")
+    return manifest
+
+
+def load_manifest(path: str, public_key: Optional[bytes]) -> Dict[str, Any]:
+    """Read a manifest file, rejecting it unless it is signed with public_key"""
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return check_manifest(manifest, public_key, path)
+
+
+class ManifestVerifier:
+    """Hashes an install directory in a thread pool and reports every drift from a manifest"""
+
+    def __init__(self, max_workers: int = None, use_cache: bool = True):
+        self.logger = logging.getLogger(__name__)
+        # hashlib releases the GIL on large buffers, so threads overlap hashing with I/O
+        self.max_workers = max_workers or min(8, (os.cpu_count() or 1) + 2)
+        self.use_cache = use_cache
+
+    def _digest(self, path: str, algorithm: str, force: bool) -> str:
+        cache = shared_cache() if self.use_cache else None
+        if cache is None:
+            return hash_file(path, (algorithm,))[algorithm]
+        return cache.get(path, (algorithm,), force)[algorithm]
+
+    def verify(self, directory: str, manifest: Dict[str, Any], force: bool = False) -> Dict[str, Any]:
+        """Compare a directory with a manifest in one pass"""
+        started = time.perf_counter()
+        algorithm = manifest.get('algorithm', MANIFEST_ALGORITHM)
+        report = {
+            'version': manifest.get('version'),
+            'verified': [],
+            'missing': [],
+            'size_mismatch': [],
+            'digest_mismatch': [],
+            'errors': {},
+            'bytes_hashed': 0
+        }
+
+        to_hash = []
+        for name, expected in manifest.get('files', {}).items():
+            path = _local_path(directory, name)
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                report['missing'].append(name)
+                continue
+            # A size mismatch already proves drift; skip hashing the file
+            if size != expected.get('size'):
+                report['size_mismatch'].append({'file': name, 'expected': expected.get('size'), 'actual': size})
+                continue
+            to_hash.append((name, path, expected.get(algorithm), size))
+
+        # Hash the largest files first so the pool does not end on one long straggler
+        to_hash.sort(key=lambda item: item[3], reverse=True)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {name: (pool.submit(self._digest, path, algorithm, force), expected, size)
+                       for name, path, expected, size in to_hash}
+            for name, (future, expected, size) in futures.items():
+                try:
+                    actual = future.result()
+                except OSError as e:
+                    report['errors'][name] = str(e)
+                    continue
+                report['bytes_hashed'] += size
+                if actual == expected:
+                    report['verified'].append(name)
+                else:
+                    report['digest_mismatch'].append({'file': name, 'expected': expected, 'actual': actual})
+
+        report['valid'] = not (report['missing'] or report['size_mismatch']
+                               or report['digest_mismatch'] or report['errors'])
+        report['elapsed_s'] = round(time.perf_counter() - started, 3)
+        if not report['valid']:
+            self.logger.warning(
+                f"Manifest drift in {directory}: {len(report['missing'])} missing, "
+                f"{len(report['size_mismatch'])} size, {len(report['digest_mismatch'])} digest mismatches"
+            )
+        return report
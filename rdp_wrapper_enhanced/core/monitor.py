@@ -13,14 +13,156 @@ import json
 import socket
 from pathlib import Path
 import subprocess
-import winreg
 import os
+import xml.etree.ElementTree as ET
+from .correlation import LogonCorrelationIndex
+from .ipfilter import IPAccessPolicy
+from .ipintel import open_database
+from collections import Counter
+
+SECURITY_EVENT_QUERY = '*[System[EventID=4624 or EventID=4625]]'
+
+# Sessions reported by `query session` that are not user connections
+NON_USER_SESSION_STATES = {'Listen', 'Down', 'Init'}
+
+
+def parse_query_session(output: str, timestamp: str = None) -> List[Dict]:
+    """Parse `query session` output into session records"""
+    timestamp = timestamp or datetime.now().isoformat()
+    lines = [line for line in output.splitlines() if line.strip()]
+    if not lines:
+        return []
+        
+    header = lines[0]
+    user_col = header.find('USERNAME')
+    sessions = []
+    
+    for line in lines[1:]:
+        tokens = line[1:].split()
+        id_index = next((i for i, token in enumerate(tokens) if token.isdigit()), None)
+        if id_index is None:
+            continue
+            
+        if user_col > 0:
+            session_name = line[1:user_col].strip()
+            username = ' '.join(tokens[:id_index])[len(session_name):].strip()
+        else:
+            session_name = tokens[0] if id_index > 1 else ''
+            username = tokens[id_index - 1] if id_index > 0 else ''
+            
+        state = tokens[id_index + 1] if len(tokens) > id_index + 1 else 'N/A'
+        if state in NON_USER_SESSION_STATES:
+            continue
+            
+        sessions.append({
+            'id': tokens[id_index],
+            'session_name': session_name,
+            'username': username or 'N/A',
+            'state': state,
+            'status': 'active' if state == 'Active' else 'disconnected',
+            'type': 'RDP',
+            'timestamp': timestamp
+        })
+        
+    return sessions
+
+
+def parse_security_events_xml(output: str) -> List[Dict]:
+    """Parse `wevtutil qe /f:xml` output into logon event records"""
+    if not output.strip():
+        return []
+        
+    events = []
+    root = ET.fromstring(f"<Events>{output}</Events>")
+    
+    for node in root:
+        system = {}
+        data = {}
+        for section in node:
+            tag = section.tag.rsplit('}', 1)[-1]
+            if tag == 'System':
+                for item in section:
+                    system[item.tag.rsplit('}', 1)[-1]] = item
+            elif tag == 'EventData':
+                for item in section:
+                    data[item.get('Name')] = item.text or ''
+                    
+        event_id = system['EventID'].text if 'EventID' in system else ''
+        time_created = system.get('TimeCreated')
+        record_id = system.get('EventRecordID')
+        
+        events.append({
+            'event_id': event_id,
+            'event_type': 'successful_login' if event_id == '4624' else 'failed_login',
+            'record_id': int(record_id.text) if record_id is not None else 0,
+            'username': data.get('TargetUserName', ''),
+            'domain': data.get('TargetDomainName', ''),
+            'logon_id': data.get('TargetLogonId', ''),
+            'logon_type': data.get('LogonType', ''),
+            'workstation': data.get('WorkstationName', ''),
+            'source_ip': data.get('IpAddress', '-'),
+            'source_port': data.get('IpPort', '-'),
+            'timestamp': time_created.get('SystemTime') if time_created is not None else datetime.now().isoformat()
+        })
+        
+    return events
+
+
+class WindowsSystemBackend:
+    """Collects raw monitoring data from the local terminal server"""
+    
+    def now(self) -> datetime:
+        """Current local time"""
+        return datetime.now()
+        
+    def query_sessions(self) -> str:
+        """Return raw `query session` output"""
+        result = subprocess.run('query session', capture_output=True, text=True)
+        return result.stdout if result.returncode == 0 else ''
+        
+    def query_security_events(self, count: int) -> str:
+        """Return the newest logon events from the Security log as wevtutil XML"""
+        cmd = f'wevtutil qe Security /q:"{SECURITY_EVENT_QUERY}" /f:xml /rd:true /c:{count}'
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        return result.stdout if result.returncode == 0 else ''
+        
+    def system_resources(self) -> Dict:
+        """Return CPU, memory and disk usage"""
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage('/')
+        return {
+            'cpu_usage': psutil.cpu_percent(interval=1),
+            'memory_usage': memory.percent,
+            'memory_available_gb': memory.available / (1024**3),
+            'disk_usage': disk.percent,
+            'disk_free_gb': disk.free / (1024**3)
+        }
+        
+    def network_io(self) -> Dict:
+        """Return network byte counters"""
+        network_stats = psutil.net_io_counters()
+        return {
+            'bytes_sent': network_stats.bytes_sent,
+            'bytes_recv': network_stats.bytes_recv
+        }
+        
+    def process_table(self) -> List[Dict]:
+        """Return pid, name, cpu and memory usage for every process"""
+        processes = []
+        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
+            try:
+                processes.append(proc.info)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+        return processes
+
 
 class RDPMonitor:
     """Enhanced RDP connection and system monitor"""
     
-    def __init__(self, config_path: str = None):
+    def __init__(self, config_path: str = None, backend=None):
         self.config_path = config_path or "rdp_monitor_config.json"
+        self.backend = backend or WindowsSystemBackend()
         self.logger = self._setup_logging()
         self.monitoring = False
         self.monitor_thread = None
@@ -34,6 +176,12 @@ class RDPMonitor:
         self.alert_thresholds = self.config.get('alert_thresholds', {})
         self.connection_history = []
         self.active_sessions = {}
+        self.correlation = LogonCorrelationIndex(
+            window_seconds=self.config.get('correlation_window_seconds', 300),
+            max_events=self.config.get('correlation_max_events', 100000)
+        )
+        self.ip_policy = IPAccessPolicy(self.config.get('ip_policy_file'))
+        self.ip_intel = open_database(self.config.get('ip_intel_database'))
         
     def _setup_logging(self) -> logging.Logger:
         """Setup logging for the monitor"""
@@ -62,6 +210,11 @@ class RDPMonitor:
                 'concurrent_connections': 10
             },
             'log_retention_days': 30,
+            'security_events_per_poll': 50,
+            'correlation_window_seconds': 300,
+            'correlation_max_events': 100000,
+            'ip_policy_file': 'rdp_wrapper_enhanced/config/settings.json',
+            'ip_intel_database': 'rdp_wrapper_enhanced/config/ipintel.db',
             'enable_performance_monitoring': True,
             'enable_security_monitoring': True,
             'enable_connection_logging': True
@@ -107,18 +260,9 @@ class RDPMonitor:
     def _check_system_resources(self):
         """Check system resource usage"""
         try:
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            
-            self.metrics['system_resources'] = {
-                'timestamp': datetime.now().isoformat(),
-                'cpu_usage': cpu_percent,
-                'memory_usage': memory.percent,
-                'memory_available_gb': memory.available / (1024**3),
-                'disk_usage': disk.percent,
-                'disk_free_gb': disk.free / (1024**3)
-            }
+            resources = self.backend.system_resources()
+            resources['timestamp'] = datetime.now().isoformat()
+            self.metrics['system_resources'] = resources
             
             # Check thresholds and generate alerts
             self._check_resource_alerts()
@@ -154,13 +298,20 @@ class RDPMonitor:
             
             # Track connection history
             for conn in connections:
-                if conn['id'] not in self.active_sessions:
-                    self.active_sessions[conn['id']] = conn
-                    self._log_connection_event('connected', conn)
-                elif conn['status'] == 'disconnected':
-                    self._log_connection_event('disconnected', conn)
+                if conn['status'] == 'disconnected':
                     if conn['id'] in self.active_sessions:
                         del self.active_sessions[conn['id']]
+                        self.correlation.release_session(conn['id'])
+                        self._log_connection_event('disconnected', conn)
+                elif conn['id'] not in self.active_sessions:
+                    self.active_sessions[conn['id']] = conn
+                    self._log_connection_event('connected', conn)
+            
+            # Sessions that disappeared since the last poll were logged off
+            current_ids = {c['id'] for c in connections}
+            for session_id in [s for s in self.active_sessions if s not in current_ids]:
+                self.correlation.release_session(session_id)
+                self._log_connection_event('disconnected', self.active_sessions.pop(session_id))
             
             # Check concurrent connection limit
             active_count = len([c for c in connections if c['status'] == 'active'])
@@ -176,22 +327,7 @@ class RDPMonitor:
         
         try:
             # Get terminal service sessions
-            cmd = 'query session'
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                lines = result.stdout.strip().split('\n')[1:]  # Skip header
-                for line in lines:
-                    parts = line.split()
-                    if len(parts) >= 3:
-                        session_info = {
-                            'id': parts[0],
-                            'username': parts[1] if len(parts) > 1 else 'N/A',
-                            'state': parts[2] if len(parts) > 2 else 'N/A',
-                            'type': 'RDP',
-                            'timestamp': datetime.now().isoformat()
-                        }
-                        connections.append(session_info)
+            connections = parse_query_session(self.backend.query_sessions(), self.backend.now().isoformat())
                         
         except Exception as e:
             self.logger.error(f"Error getting RDP connections: {e}")
@@ -207,6 +343,18 @@ class RDPMonitor:
             # Check Windows Security Log for RDP events
             events = self._get_security_events()
             self.metrics['security_events'] = events
+            new_events = self.correlation.add_events(events)
+            self.correlation.expire(self.backend.now().timestamp())
+            
+            # Check successful logons against security.allowedIPs / blockedIPs
+            for event in new_events:
+                if event['event_type'] == 'successful_login' and event.get('source_ip', '-') != '-':
+                    verdict = self.ip_policy.evaluate(event['source_ip'])
+                    if not verdict['allowed']:
+                        self._log_security_event(
+                            'policy_violation',
+                            f"{event['username']} logged on from {verdict['reason']} address {event['source_ip']}"
+                        )
             
             # Check for failed login attempts
             failed_logins = [e for e in events if e['event_type'] == 'failed_login']
@@ -222,26 +370,8 @@ class RDPMonitor:
         
         try:
             # Check for RDP-related events in Security log
-            cmd = 'wevtutil qe Security /q:"*[System[EventID=4624 or EventID=4625]]" /f:text /c:50'
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode == 0:
-                # Parse events (simplified parsing)
-                lines = result.stdout.split('\n')
-                event = {}
-                for line in lines:
-                    if 'Event ID:' in line:
-                        event['event_id'] = line.split(':')[1].strip()
-                    elif 'Account Name:' in line:
-                        event['username'] = line.split(':')[1].strip()
-                    elif 'Source Network Address:' in line:
-                        event['source_ip'] = line.split(':')[1].strip()
-                        
-                    if event and 'event_id' in event:
-                        event['event_type'] = 'successful_login' if event['event_id'] == '4624' else 'failed_login'
-                        event['timestamp'] = datetime.now().isoformat()
-                        events.append(event.copy())
-                        event = {}
+            output = self.backend.query_security_events(self.config.get('security_events_per_poll', 50))
+            events = parse_security_events_xml(output)
                         
         except Exception as e:
             self.logger.error(f"Error getting security events: {e}")
@@ -255,21 +385,19 @@ class RDPMonitor:
                 return
                 
             # Get network statistics
-            network_stats = psutil.net_io_counters()
+            network_stats = self.backend.network_io()
             
             # Get process information
             processes = []
-            for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-                try:
-                    if 'rdp' in proc.info['name'].lower() or 'termsrv' in proc.info['name'].lower():
-                        processes.append(proc.info)
-                except (psutil.NoSuchProcess, psutil.AccessDenied):
-                    pass
+            for info in self.backend.process_table():
+                name = (info.get('name') or '').lower()
+                if 'rdp' in name or 'termsrv' in name:
+                    processes.append(info)
             
             self.metrics['performance_metrics'] = {
                 'timestamp': datetime.now().isoformat(),
-                'network_bytes_sent': network_stats.bytes_sent,
-                'network_bytes_recv': network_stats.bytes_recv,
+                'network_bytes_sent': network_stats['bytes_sent'],
+                'network_bytes_recv': network_stats['bytes_recv'],
                 'rdp_processes': processes,
                 'active_sessions_count': len(self.active_sessions)
             }
@@ -313,7 +441,7 @@ class RDPMonitor:
     def get_connection_report(self) -> Dict:
         """Get detailed connection report"""
         return {
-            'active_sessions': list(self.active_sessions.values()),
+            'active_sessions': [self.correlation.session_view(s) for s in self.active_sessions.values()],
             'connection_history': self.connection_history[-50:],  # Last 50
             'total_connections': len(self.connection_history),
             'unique_users': len(set(c.get('username') for c in self.connection_history))
@@ -326,12 +454,22 @@ class RDPMonitor:
         failed_logins = [e for e in security_events if e['event_type'] == 'failed_login']
         successful_logins = [e for e in security_events if e['event_type'] == 'successful_login']
         
+        # Enrich the noisiest failed-login sources with ASN, country and threat tags
+        failed_sources = Counter(e['source_ip'] for e in failed_logins if e.get('source_ip', '-') != '-')
+        top_failed_sources = []
+        for source_ip, attempts in failed_sources.most_common(20):
+            entry = {'source_ip': source_ip, 'attempts': attempts}
+            if self.ip_intel:
+                entry.update(self.ip_intel.lookup(source_ip) or {})
+            top_failed_sources.append(entry)
+        
         return {
             'total_events': len(security_events),
             'failed_logins': len(failed_logins),
             'successful_logins': len(successful_logins),
             'recent_events': security_events[-20:],  # Last 20
-            'unique_source_ips': len(set(e.get('source_ip') for e in security_events if 'source_ip' in e))
+            'unique_source_ips': len(set(e.get('source_ip') for e in security_events if 'source_ip' in e)),
+            'top_failed_sources': top_failed_sources
         }
     
     def save_metrics(self, filename: str = None):
@@ -0,0 +1,231 @@
+"""
+RDP Wrapper Enhanced - Install Pipeline
+Runs install stages as a dependency graph so independent stages overlap
+"""
+
+import json
+import time
+import queue
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Callable, Iterable
+
+# Stage states
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+SKIPPED = 'skipped'
+
+
+class StageError(Exception):
+    """A critical stage failed; the pipeline report is attached"""
+
+    def __init__(self, stage: str, error: BaseException, report: Dict[str, Any]):
+        super().__init__(f"Stage {stage} failed: {error}")
+        self.stage = stage
+        self.error = error
+        self.report = report
+
+
+class InstallPipeline:
+    """Stages start as soon as what they require has finished; progress is weighted across stages"""
+
+    def __init__(self, max_workers: int = 4):
+        self.logger = logging.getLogger(__name__)
+        self.max_workers = max_workers
+        self.stages = {}    # name -> {'func', 'requires', 'weight', 'critical'}
+
+    def add(self, name: str, func: Callable[[Dict[str, Any], Callable[[float, str], None]], Any],
+            requires: Iterable[str] = (), weight: float = 1.0, critical: bool = True) -> 'InstallPipeline':
+        """Add a stage; func(results, progress) sees the results of earlier stages and reports 0..1 progress.
+
+        A non-critical stage may fail without stopping the stages that require it.
+        """
+        self.stages[name] = {'func': func, 'requires': tuple(requires), 'weight': weight, 'critical': critical}
+        return self
+
+    def order(self) -> List[str]:
+        """Stage names in a dependency-respecting order; raises ValueError on unknown or cyclic requirements"""
+        ordered, visiting, visited = [], set(), set()
+
+        def visit(name: str, path: tuple):
+            if name not in self.stages:
+                raise ValueError(f"Stage {path[-1]} requires unknown stage {name}")
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"Stage dependency cycle: {' -> '.join(path + (name,))}")
+            visiting.add(name)
+            for required in self.stages[name]['requires']:
+                visit(required, path + (name,))
+            visiting.discard(name)
+            visited.add(name)
+            ordered.append(name)
+
+        for name in self.stages:
+            visit(name, ())
+        return ordered
+
+    def run(self, results: Dict[str, Any] = None,
+            on_progress: Callable[[float, str, str], None] = None) -> Dict[str, Any]:
+        """Run every stage and return the timing report; raises StageError if a critical stage fails.
+
+        on_progress(percent, stage, message) is called on the calling thread, so GUI code may use it directly.
+        """
+        order = self.order()
+        results = dict(results or {})
+        state = {name: PENDING for name in order}
+        fraction = {name: 0.0 for name in order}
+        timing = {name: {} for name in order}
+        errors = {}
+        total_weight = sum(stage['weight'] for stage in self.stages.values()) or 1.0
+        # Workers only post events; results, state and callbacks are handled on this thread
+        events = queue.Queue()
+        started = time.perf_counter()
+        failure = None
+
+        def percent() -> float:
+            return 100.0 * sum(self.stages[n]['weight'] * fraction[n] for n in order) / total_weight
+
+        def execute(name: str, inputs: Dict[str, Any]):
+            def progress(value: float, message: str = ""):
+                events.put(('progress', name, min(max(value, 0.0), 1.0), message))
+            try:
+                events.put(('done', name, self.stages[name]['func'](inputs, progress), None))
+            except BaseException as e:
+                events.put(('failed', name, e, None))
+
+        def ready(name: str) -> bool:
+            return all(state[r] == DONE or (state[r] == FAILED and not self.stages[r]['critical'])
+                       for r in self.stages[name]['requires'])
+
+        running = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="install-stage") as pool:
+            while True:
+                if failure is None:
+                    for name in order:
+                        if state[name] == PENDING and ready(name):
+                            state[name] = RUNNING
+                            timing[name]['start_s'] = time.perf_counter() - started
+                            running += 1
+                            # Each stage gets a snapshot, so it never sees a dict being written to
+                            pool.submit(execute, name, dict(results))
+                if not running:
+                    break
+
+                kind, name, payload, message = events.get()
+                if kind == 'progress':
+                    fraction[name] = payload
+                    if on_progress:
+                        on_progress(percent(), name, message)
+                    continue
+
+                running -= 1
+                timing[name]['end_s'] = time.perf_counter() - started
+                if kind == 'done':
+                    state[name], fraction[name] = DONE, 1.0
+                    results[name] = payload
+                else:
+                    state[name], fraction[name] = FAILED, 1.0
+                    errors[name] = payload
+                    self.logger.error(f"Install stage {name} failed: {payload}")
+                    if self.stages[name]['critical']:
+                        # Stages already running finish; nothing new is started
+                        failure = failure or name
+                if on_progress:
+                    on_progress(percent(), name, f"{name} {state[name]}")
+
+        for name in order:
+            if state[name] == PENDING:
+                state[name] = SKIPPED
+
+        report = self._report(order, state, timing, errors, time.perf_counter() - started)
+        report['results'] = results
+        if failure:
+            raise StageError(failure, errors[failure], report)
+        return report
+
+    def _report(self, order: List[str], state: Dict[str, str], timing: Dict[str, Dict[str, float]],
+                errors: Dict[str, BaseException], elapsed: float) -> Dict[str, Any]:
+        stages = {}
+        for name in order:
+            entry = {'status': state[name], 'requires': list(self.stages[name]['requires'])}
+            if 'start_s' in timing[name]:
+                entry['start_s'] = round(timing[name]['start_s'], 3)
+                entry['end_s'] = round(timing[name]['end_s'], 3)
+                entry['duration_s'] = round(timing[name]['end_s'] - timing[name]['start_s'], 3)
+            if name in errors:
+                entry['error'] = str(errors[name])
+            stages[name] = entry
+        sequential = sum(entry.get('duration_s', 0.0) for entry in stages.values())
+        return {
+            'success': all(entry['status'] == DONE or (entry['status'] == FAILED
+                                                       and not self.stages[name]['critical'])
+                           for name, entry in stages.items()),
+            'elapsed_s': round(elapsed, 3),
+            'sequential_s': round(sequential, 3),
+            'overlap_saved_s': round(max(0.0, sequential - elapsed), 3),
+            'critical_path': self._critical_path(stages),
+            'stages': stages
+        }
+
+    def _critical_path(self, stages: Dict[str, Dict[str, Any]]) -> List[str]:
+        """Chain of stages that determined the total time, walking back from the last one to finish"""
+        finished = [name for name, entry in stages.items() if 'end_s' in entry]
+        if not finished:
+            return []
+        path = [max(finished, key=lambda n: stages[n]['end_s'])]
+        while True:
+            requires = [r for r in self.stages[path[-1]]['requires'] if 'end_s' in stages[r]]
+            if not requires:
+                break
+            path.append(max(requires, key=lambda r: stages[r]['end_s']))
+        return list(reversed(path))
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    """Plain-text timing table for logs and the status pane"""
+    lines = [f"{'stage':<16}{'status':<9}{'start':>8}{'duration':>10}"]
+    for name, entry in sorted(report['stages'].items(), key=lambda item: item[1].get('start_s', float('inf'))):
+        start = f"{entry['start_s']:.2f}s" if 'start_s' in entry else '-'
+        duration = f"{entry['duration_s']:.2f}s" if 'duration_s' in entry else '-'
+        lines.append(f"{name:<16}{entry['status']:<9}{start:>8}{duration:>10}")
+    lines.append(f"total {report['elapsed_s']:.2f}s (sequential {report['sequential_s']:.2f}s, "
+                 f"critical path {' -> '.join(report['critical_path'])})")
+    return '\n'.join(lines)
+
+
+def benchmark(scale: float = 0.1) -> Dict[str, Any]:
+    """A typical install graph with simulated stage costs, run as a DAG versus strictly in sequence"""
+    costs = {'restore_point': 4.0, 'probes': 2.5, 'release': 0.5, 'download': 3.0,
+             'backup': 1.0, 'extract': 0.5, 'install': 1.5, 'cleanup': 0.2}
+    requires = {'download': ['release'], 'extract': ['download'],
+                'install': ['extract', 'backup', 'probes', 'restore_point'], 'cleanup': ['install']}
+
+    def simulated(name: str):
+        def stage(results, progress):
+            for step in range(10):
+                time.sleep(costs[name] * scale / 10)
+                progress((step + 1) / 10)
+            return name
+        return stage
+
+    pipeline = InstallPipeline(max_workers=len(costs))
+    for name in costs:
+        pipeline.add(name, simulated(name), requires=requires.get(name, ()), weight=costs[name])
+    updates = []
+    report = pipeline.run(on_progress=lambda pct, stage, message: updates.append(pct))
+
+    return {
+        'stages': len(costs),
+        'sum_of_stages_s': round(sum(costs.values()) * scale, 3),
+        'pipeline_s': report['elapsed_s'],
+        'critical_path': report['critical_path'],
+        'progress_updates': len(updates),
+        'monotonic_progress': all(a <= b + 1e-9 for a, b in zip(updates, updates[1:]))
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
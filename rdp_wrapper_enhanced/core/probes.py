@@ -0,0 +1,330 @@
+"""
+RDP Wrapper Enhanced - System Probes
+Runs independent system probes concurrently with per-probe timeouts and cached results
+"""
+
+import os
+import json
+import time
+import logging
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional, Tuple
+
+DEFAULT_PROBE_CACHE_PATH = Path(os.environ.get('PROGRAMDATA', Path.home())) / "RDP Wrapper Enhanced" / "probe_cache.json"
+
+CURRENT_VERSION_KEY = r"SOFTWARE\Microsoft\Windows NT\CurrentVersion"
+
+
+class ProbeError(Exception):
+    """A probe command failed or produced nothing usable; the result is reported but never cached"""
+
+
+class SubprocessBackend:
+    """Runs probe commands on the local machine"""
+
+    def run(self, command: List[str], timeout: float, shell: bool = False) -> Tuple[int, str]:
+        # subprocess kills the child when the timeout expires, so a hung probe does not linger
+        result = subprocess.run(' '.join(command) if shell else command, capture_output=True,
+                                text=True, timeout=timeout, shell=shell)
+        return result.returncode, result.stdout
+
+    def is_admin(self) -> bool:
+        import ctypes
+
+        return bool(ctypes.windll.shell32.IsUserAnAdmin())
+
+    def registry_value(self, key: str, name: str) -> str:
+        import winreg
+
+        with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, key) as handle:
+            value, _ = winreg.QueryValueEx(handle, name)
+        return str(value)
+
+
+# Output of the built-in probe commands on a Windows 10 22H2 machine
+FAKE_OUTPUTS = {
+    'ver': "\nMicrosoft Windows [Version 10.0.19045.3803]\n",
+    'wmic os get OSArchitecture': "OSArchitecture  \n64-bit          \n\n",
+    'sc query TermService': "SERVICE_NAME: TermService\n        TYPE               : 30  WIN32\n"
+                            "        STATE              : 4  RUNNING\n",
+    'systeminfo': "Host Name:                 WORKSTATION\nOS Name:                   Microsoft Windows 10 Pro\n"
+                  "OS Version:                10.0.19045 N/A Build 19045\n",
+    'powershell -Command Get-MpComputerStatus | Select-Object -ExpandProperty RealTimeProtectionEnabled': "True\n",
+    'netsh advfirewall show allprofiles': "Domain Profile Settings:\nState                                 ON\n"
+}
+
+
+class FakeProbeBackend:
+    """Canned command output, registry values and delays for running probes off Windows"""
+
+    def __init__(self, outputs: Dict[str, str] = None, delays: Dict[str, float] = None,
+                 registry: Dict[str, str] = None, admin: bool = True):
+        self.outputs = dict(FAKE_OUTPUTS if outputs is None else outputs)
+        self.delays = delays or {}
+        self.registry = {'CurrentBuild': '19045'} if registry is None else registry
+        self.admin = admin
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def run(self, command: List[str], timeout: float, shell: bool = False) -> Tuple[int, str]:
+        key = ' '.join(command)
+        with self._lock:
+            self.calls.append(key)
+        delay = self.delays.get(key, 0.0)
+        if delay > timeout:
+            time.sleep(timeout)
+            raise subprocess.TimeoutExpired(command, timeout)
+        time.sleep(delay)
+        if key not in self.outputs:
+            return 1, ''
+        return 0, self.outputs[key]
+
+    def is_admin(self) -> bool:
+        return self.admin
+
+    def registry_value(self, key: str, name: str) -> str:
+        if name not in self.registry:
+            raise OSError(f"{key}\\{name} not found")
+        return self.registry[name]
+
+
+def command_probe(command: List[str], parse: Callable[[str], Any], shell: bool = False):
+    """Probe collector that runs a command and parses its standard output.
+
+    A non-zero exit code or an empty parse raises ProbeError instead of returning a value.
+    """
+    def collect(backend, timeout: float) -> Any:
+        returncode, output = backend.run(command, timeout, shell)
+        if returncode != 0:
+            raise ProbeError(f"{' '.join(command)} exited with code {returncode}")
+        value = parse(output)
+        if value is None or value == '':
+            raise ProbeError(f"{' '.join(command)} produced no usable output")
+        return value
+    return collect
+
+
+def _second_line(output: str) -> Optional[str]:
+    lines = [line.strip() for line in output.splitlines() if line.strip()]
+    return lines[1] if len(lines) > 1 else None
+
+
+def _systeminfo_field(field: str) -> Callable[[str], Optional[str]]:
+    def parse(output: str) -> Optional[str]:
+        for line in output.splitlines():
+            if line.startswith(f"{field}:"):
+                return line.split(':', 1)[1].strip()
+        return None
+    return parse
+
+
+# name -> (collect(backend, timeout), ttl seconds, timeout seconds); a ttl of 0 is never cached
+DEFAULT_PROBES = {
+    'windows_version': (command_probe(['ver'], str.strip, shell=True), 86400, 5.0),
+    'architecture': (command_probe(['wmic', 'os', 'get', 'OSArchitecture'], _second_line), 86400, 10.0),
+    'os_name': (command_probe(['systeminfo'], _systeminfo_field("OS Name")), 86400, 30.0),
+    'build_number': (lambda backend, timeout: backend.registry_value(CURRENT_VERSION_KEY, "CurrentBuild"),
+                     86400, 2.0),
+    # Elevation belongs to this process, so it is never taken from the cache
+    'admin_rights': (lambda backend, timeout: backend.is_admin(), 0, 2.0),
+    'terminal_service': (command_probe(['sc', 'query', 'TermService'], lambda out: "RUNNING" in out), 5, 5.0),
+    'antivirus': (command_probe(['powershell', '-Command', 'Get-MpComputerStatus | Select-Object '
+                                 '-ExpandProperty RealTimeProtectionEnabled'], lambda out: "True" in out), 300, 20.0),
+    'firewall': (command_probe(['netsh', 'advfirewall', 'show', 'allprofiles'], lambda out: "ON" in out), 60, 10.0)
+}
+
+
+class ProbeRunner:
+    """Starts probes on a shared pool; cached and in-flight results are reused instead of re-run"""
+
+    def __init__(self, backend=None, cache_path: str = None, max_workers: int = 8,
+                 probes: Dict[str, Tuple[Callable, float, float]] = None):
+        self.logger = logging.getLogger(__name__)
+        self.backend = backend or SubprocessBackend()
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.probes = dict(DEFAULT_PROBES if probes is None else probes)
+        # Kept alive across runs; a probe past its deadline must not hold up the next caller
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="probe")
+        self.cache = {}         # name -> {'value', 'collected'}
+        self._inflight = {}     # name -> Future
+        self._lock = threading.Lock()
+        self._load()
+
+    def register(self, name: str, collect: Callable[[Any, float], Any], ttl: float = 0, timeout: float = 10.0):
+        """Add a probe; collect(backend, timeout) returns a JSON-serializable value"""
+        self.probes[name] = (collect, ttl, timeout)
+
+    def _load(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                self.cache = json.load(f).get('probes', {})
+        except (OSError, ValueError):
+            self.cache = {}
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        persistent = {name: entry for name, entry in self.cache.items()
+                      if name in self.probes and self.probes[name][1] > 0}
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'probes': persistent}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            self.logger.warning(f"Could not persist probe cache: {e}")
+
+    def _cached(self, name: str) -> Optional[Dict[str, Any]]:
+        entry = self.cache.get(name)
+        ttl = self.probes[name][1]
+        if entry is None or ttl <= 0 or time.time() - entry['collected'] >= ttl:
+            return None
+        return entry
+
+    def _collect(self, name: str) -> Dict[str, Any]:
+        collect, ttl, timeout = self.probes[name]
+        started = time.perf_counter()
+        value, status, message = None, 'timeout', None
+        try:
+            value = collect(self.backend, timeout)
+            status = 'ok'
+        except subprocess.TimeoutExpired:
+            pass
+        except ProbeError as e:
+            self.logger.warning(f"Probe {name} failed: {e}")
+            status, message = 'error', str(e)
+        finally:
+            with self._lock:
+                # Cached before leaving the in-flight table so no caller sees neither
+                if status == 'ok' and ttl > 0:
+                    self.cache[name] = {'value': value, 'collected': time.time()}
+                    self._save()
+                self._inflight.pop(name, None)
+        result = {'status': status, 'value': value, 'cached': False,
+                  'duration_ms': round((time.perf_counter() - started) * 1000, 2)}
+        if message:
+            result['message'] = message
+        return result
+
+    def submit(self, names: Iterable[str] = None, force: bool = False) -> Dict[str, Future]:
+        """Start probes without waiting; fresh cached values come back as already-completed futures"""
+        futures = {}
+        with self._lock:
+            for name in names or self.probes:
+                entry = None if force else self._cached(name)
+                if entry is not None:
+                    future = Future()
+                    future.set_result({'status': 'ok', 'value': entry['value'], 'cached': True, 'duration_ms': 0.0})
+                elif name in self._inflight:
+                    future = self._inflight[name]
+                else:
+                    future = self._inflight[name] = self.executor.submit(self._collect, name)
+                futures[name] = future
+        return futures
+
+    def iter_results(self, names: Iterable[str] = None, force: bool = False) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Yield (name, result) in completion order; probes past their timeout yield a timeout result"""
+        now = time.monotonic()
+        pending = {future: name for name, future in self.submit(names, force).items()}
+        deadlines = {name: now + self.probes[name][2] for name in pending.values()}
+        while pending:
+            remaining = min(deadlines[name] for name in pending.values()) - time.monotonic()
+            done, _ = wait(pending, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    self.logger.error(f"Probe {name} failed: {e}")
+                    result = {'status': 'error', 'value': None, 'cached': False, 'message': str(e)}
+                yield name, result
+            now = time.monotonic()
+            for future, name in list(pending.items()):
+                if deadlines[name] <= now:
+                    del pending[future]
+                    yield name, {'status': 'timeout', 'value': None, 'cached': False,
+                                 'message': f"Probe exceeded {self.probes[name][2]}s"}
+
+    def run(self, names: Iterable[str] = None, force: bool = False,
+            on_result: Callable[[str, Dict[str, Any]], None] = None) -> Dict[str, Any]:
+        """Run probes concurrently and wait for all of them; on_result sees each one as it arrives"""
+        results = {}
+        for name, result in self.iter_results(names, force):
+            results[name] = result
+            if on_result:
+                on_result(name, result)
+        return results
+
+    def value(self, name: str, default: Any = None) -> Any:
+        """Value of a single probe, or default if it failed or timed out"""
+        result = self.run([name])[name]
+        return result['value'] if result['status'] == 'ok' else default
+
+    def invalidate(self, name: str = None):
+        with self._lock:
+            if name is None:
+                self.cache.clear()
+            else:
+                self.cache.pop(name, None)
+            self._save()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+_shared_runner = None
+_shared_lock = threading.Lock()
+
+
+def shared_probe_runner() -> ProbeRunner:
+    """Process-wide runner backed by the probe cache every entry point shares"""
+    global _shared_runner
+    with _shared_lock:
+        if _shared_runner is None:
+            _shared_runner = ProbeRunner(cache_path=DEFAULT_PROBE_CACHE_PATH)
+        return _shared_runner
+
+
+def benchmark(scale: float = 0.1) -> Dict[str, Any]:
+    """Sequential versus concurrent probing with command delays typical of a Windows 10 machine"""
+    # systeminfo and the Defender cmdlet dominate; scaled down so the benchmark stays short
+    typical = {'ver': 0.05, 'wmic os get OSArchitecture': 0.4, 'sc query TermService': 0.05,
+               'systeminfo': 2.5, 'netsh advfirewall show allprofiles': 0.3,
+               'powershell -Command Get-MpComputerStatus | Select-Object -ExpandProperty '
+               'RealTimeProtectionEnabled': 1.5}
+    backend = FakeProbeBackend(delays={command: delay * scale for command, delay in typical.items()})
+
+    started = time.perf_counter()
+    for collect, _, timeout in DEFAULT_PROBES.values():
+        collect(backend, timeout)
+    sequential_s = time.perf_counter() - started
+
+    runner = ProbeRunner(backend)
+    arrivals = []
+    started = time.perf_counter()
+    runner.run(on_result=lambda name, result: arrivals.append((name, round(time.perf_counter() - started, 3))))
+    concurrent_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    cached = runner.run()
+    cached_s = time.perf_counter() - started
+    runner.shutdown()
+
+    return {
+        'probes': len(DEFAULT_PROBES),
+        'sequential_s': round(sequential_s, 3),
+        'concurrent_s': round(concurrent_s, 3),
+        'first_result_s': arrivals[0][1],
+        'cached_s': round(cached_s, 4),
+        'served_from_cache': sum(1 for result in cached.values() if result['cached'])
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,250 @@
+"""
+RDP Wrapper Enhanced - Release Metadata Cache
+GitHub release lookups answered from disk, revalidated with ETag / Last-Modified
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Dict, Any, Optional
+
+DEFAULT_RELEASE_CACHE_PATH = Path(os.environ.get('PROGRAMDATA', Path.home())) / "RDP Wrapper Enhanced" / "release_cache.json"
+DEFAULT_REPOSITORY = "stascorp/rdpwrap"
+GITHUB_API = "https://api.github.com"
+FALLBACK_RELEASE = {
+    'version': "v1.6.2",
+    'download_url': "https://github.com/stascorp/rdpwrap/releases/download/v1.6.2/RDPWrap-v1.6.2.zip",
+    'size': None,
+    'published': None,
+    'sha256': None
+}
+
+
+class ReleaseMetadataCache:
+    """JSON metadata cache with a TTL, stale-while-revalidate and conditional requests"""
+
+    def __init__(self, path: str = None, ttl: float = 300, stale_ttl: float = 86400,
+                 opener: urllib.request.OpenerDirector = None, timeout: float = 10):
+        self.logger = logging.getLogger(__name__)
+        self.path = Path(path or DEFAULT_RELEASE_CACHE_PATH)
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.opener = opener or urllib.request.build_opener()
+        self.timeout = timeout
+        self.entries = {}
+        self.requests = 0
+        self.not_modified = 0
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._revalidating = set()
+        self._load()
+
+    def _load(self):
+        """Pick up entries written by other processes since the last read"""
+        try:
+            mtime = self.path.stat().st_mtime_ns
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get('entries', {})
+            self._mtime = mtime
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable release cache: {e}")
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': self.entries}, f)
+        os.replace(tmp_path, self.path)
+        self._mtime = self.path.stat().st_mtime_ns
+
+    def get(self, url: str) -> Any:
+        """Decoded JSON for url; fresh entries skip the network, stale ones are served and revalidated"""
+        with self._lock:
+            self._load()
+            entry = self.entries.get(url)
+        if entry is not None:
+            age = time.time() - entry['fetched']
+            if age < self.ttl:
+                return entry['body']
+            if age < self.ttl + self.stale_ttl:
+                self._revalidate_async(url)
+                return entry['body']
+        return self.refresh(url)
+
+    def refresh(self, url: str) -> Any:
+        """Revalidate an entry now, falling back to the cached copy if the API is unreachable"""
+        with self._lock:
+            entry = self.entries.get(url)
+        headers = {'Accept': 'application/vnd.github+json', 'User-Agent': 'RDP-Wrapper-Enhanced'}
+        if entry is not None:
+            # GitHub does not count 304 responses against the rate limit
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+
+        self.requests += 1
+        try:
+            request = urllib.request.Request(url, headers=headers)
+            with self.opener.open(request, timeout=self.timeout) as response:
+                body = json.loads(response.read().decode('utf-8'))
+                entry = {
+                    'body': body,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified'),
+                    'fetched': time.time()
+                }
+        except urllib.error.HTTPError as e:
+            if e.code != 304 or entry is None:
+                return self._stale_or_raise(url, entry, e)
+            self.not_modified += 1
+            entry = dict(entry, fetched=time.time())
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            return self._stale_or_raise(url, entry, e)
+
+        with self._lock:
+            self.entries[url] = entry
+            try:
+                self._save()
+            except OSError as e:
+                self.logger.warning(f"Could not persist release cache: {e}")
+        return entry['body']
+
+    def _stale_or_raise(self, url: str, entry: Optional[Dict[str, Any]], error: Exception) -> Any:
+        if entry is None:
+            raise error
+        self.logger.warning(f"Serving cached metadata for {url}: {error}")
+        return entry['body']
+
+    def _revalidate_async(self, url: str):
+        with self._lock:
+            if url in self._revalidating:
+                return
+            self._revalidating.add(url)
+
+        def run():
+            try:
+                self.refresh(url)
+            except Exception as e:
+                self.logger.debug(f"Background revalidation of {url} failed: {e}")
+            finally:
+                with self._lock:
+                    self._revalidating.discard(url)
+
+        threading.Thread(target=run, name="release-revalidate", daemon=True).start()
+
+    def invalidate(self, url: str = None):
+        with self._lock:
+            if url is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(url, None)
+            self._save()
+
+    def get_stats(self) -> Dict[str, int]:
+        return {'entries': len(self.entries), 'requests': self.requests, 'not_modified': self.not_modified}
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def shared_release_cache() -> ReleaseMetadataCache:
+    """Process-wide cache backed by the file every installer entry point shares"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = ReleaseMetadataCache()
+        return _shared_cache
+
+
+def latest_release(repository: str = DEFAULT_REPOSITORY, cache: ReleaseMetadataCache = None,
+                   api_base: str = GITHUB_API) -> Optional[Dict[str, Any]]:
+    """Version and zip asset of a repository's latest release, or None if it has no zip asset.
+
+    sha256 is the digest GitHub publishes for the asset, or None for releases that predate asset digests.
+    """
+    cache = cache or shared_release_cache()
+    data = cache.get(f"{api_base}/repos/{repository}/releases/latest")
+    for asset in data.get('assets', []):
+        if asset['name'].endswith('.zip'):
+            algorithm, _, digest = (asset.get('digest') or '').partition(':')
+            return {
+                'version': data['tag_name'],
+                'download_url': asset['browser_download_url'],
+                'size': asset['size'],
+                'published': data['published_at'],
+                'sha256': digest.lower() if algorithm == 'sha256' and digest else None
+            }
+    return None
+
+
+def benchmark(lookups: int = 50) -> Dict[str, Any]:
+    """Requests reaching a local stand-in API for repeated lookups under each cache mode"""
+    import http.server
+
+    counts = {'200': 0, '304': 0}
+    etag = '"release-1"'
+    body = json.dumps({
+        'tag_name': 'v1.6.2', 'published_at': '2017-12-27T00:00:00Z',
+        'assets': [{'name': 'RDPWrap-v1.6.2.zip', 'size': 1, 'browser_download_url': 'http://example/RDPWrap.zip'}]
+    }).encode('utf-8')
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.headers.get('If-None-Match') == etag:
+                counts['304'] += 1
+                self.send_response(304)
+                self.end_headers()
+                return
+            counts['200'] += 1
+            self.send_response(200)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_base = f"http://127.0.0.1:{server.server_address[1]}"
+    results = {'lookups': lookups}
+
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'release_cache.json')
+            modes = {
+                'fresh': dict(ttl=300),
+                'revalidate': dict(ttl=0, stale_ttl=0),
+                'stale_while_revalidate': dict(ttl=0, stale_ttl=300)
+            }
+            for mode, options in modes.items():
+                counts.update({'200': 0, '304': 0})
+                cache = ReleaseMetadataCache(path, **options)
+                started = time.perf_counter()
+                for _ in range(lookups):
+                    latest_release(cache=cache, api_base=api_base)
+                elapsed = time.perf_counter() - started
+                time.sleep(0.2)
+                results[mode] = {'full_responses': counts['200'], 'not_modified': counts['304'],
+                                 'avg_lookup_ms': round(elapsed * 1000 / lookups, 3)}
+    finally:
+        server.shutdown()
+    return results
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
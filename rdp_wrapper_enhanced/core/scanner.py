@@ -0,0 +1,311 @@
+"""
+RDP Wrapper Enhanced - Security Scan Engine
+Runs independent security checks concurrently with per-check timeouts and fingerprint caching
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Optional
+
+from .manifest import RELEASE_FILES, ManifestVerifier
+
+SEVERITY_ORDER = {'pass': 0, 'skipped': 0, 'warn': 1, 'fail': 2, 'error': 2, 'timeout': 2}
+
+RDP_KEY = r"SYSTEM\CurrentControlSet\Control\Terminal Server"
+RDP_TCP_KEY = RDP_KEY + r"\WinStations\RDP-Tcp"
+
+
+class UnknownCheckError(ValueError):
+    """A scan asked for checks the engine does not have"""
+
+    def __init__(self, unknown: List[str]):
+        super().__init__(f"Unknown security checks: {', '.join(unknown)}")
+        self.unknown = unknown
+
+
+def lint_ini(text: str) -> List[Dict[str, Any]]:
+    """Structural checks for rdpwrap.ini: sections, duplicates, offsets and patch codes"""
+    findings = []
+    sections = {}
+    current = None
+    for number, raw in enumerate(text.splitlines(), 1):
+        line = raw.strip()
+        if not line or line.startswith(';'):
+            continue
+        if line.startswith('['):
+            if not line.endswith(']'):
+                findings.append({'line': number, 'severity': 'fail', 'message': f"Malformed section header {line}"})
+                continue
+            current = line[1:-1]
+            if current in sections:
+                findings.append({'line': number, 'severity': 'warn', 'message': f"Duplicate section [{current}]"})
+            sections.setdefault(current, {})
+            continue
+        if current is None:
+            findings.append({'line': number, 'severity': 'fail', 'message': "Value outside of any section"})
+            continue
+        key, sep, value = line.partition('=')
+        if not sep:
+            findings.append({'line': number, 'severity': 'fail', 'message': f"Line without '=' in [{current}]"})
+            continue
+        key, value = key.strip(), value.strip()
+        if key in sections[current]:
+            findings.append({'line': number, 'severity': 'warn', 'message': f"Duplicate key {key} in [{current}]"})
+        sections[current][key] = (value, number)
+
+    codes = sections.get('PatchCodes', {})
+    for name, values in sections.items():
+        for key, (value, number) in values.items():
+            match = re.match(r'(\w+)(Patch|Offset|Code)\.(x86|x64|arm64)$', key)
+            if not match:
+                continue
+            feature, kind, arch = match.groups()
+            if kind == 'Offset' and not re.fullmatch(r'[0-9A-Fa-f]+', value):
+                findings.append({'line': number, 'severity': 'fail', 'message': f"{key} in [{name}] is not hex"})
+            elif kind == 'Code' and value not in codes:
+                findings.append({'line': number, 'severity': 'fail',
+                                 'message': f"{key} in [{name}] references unknown patch code {value}"})
+            elif kind == 'Patch' and value == '1':
+                for required in ('Offset', 'Code'):
+                    if f"{feature}{required}.{arch}" not in values:
+                        findings.append({'line': number, 'severity': 'fail',
+                                         'message': f"{key} in [{name}] has no {feature}{required}.{arch}"})
+    return findings
+
+
+class SecurityScanEngine:
+    """Concurrent security checks whose results are reused while their inputs are unchanged"""
+
+    def __init__(self, install_dir: str = "C:\\Program Files\\RDP Wrapper", manifest: Dict[str, Any] = None,
+                 port: int = 3389, max_workers: int = 5, timeouts: Dict[str, float] = None):
+        self.logger = logging.getLogger(__name__)
+        self.install_dir = install_dir
+        self.manifest = manifest
+        self.port = port
+        # Kept alive across scans; a timed-out check must not block the next request
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="security-scan")
+        self.cache = {}     # check name -> (fingerprint, result)
+        self._cache_lock = threading.Lock()   # scans from concurrent requests share the cache
+
+        # name -> (inputs, evaluate, timeout); inputs are cheap and fingerprint the check
+        self.checks = {
+            'file_integrity': (self._integrity_inputs, self._check_integrity, 60.0),
+            'ini_lint': (self._ini_inputs, self._check_ini, 10.0),
+            'registry_policy': (self._registry_inputs, self._check_registry, 5.0),
+            'firewall_exposure': (self._firewall_inputs, self._check_firewall, 15.0),
+            'rdp_port_audit': (self._port_inputs, self._check_ports, 10.0)
+        }
+        for name, timeout in (timeouts or {}).items():
+            inputs, evaluate, _ = self.checks[name]
+            self.checks[name] = (inputs, evaluate, timeout)
+
+    def register_check(self, name: str, inputs: Callable[[], Any], evaluate: Callable[[Any], Dict[str, Any]],
+                       timeout: float = 10.0):
+        """Add a custom check; inputs() returns JSON-serializable data describing what evaluate() reads"""
+        self.checks[name] = (inputs, evaluate, timeout)
+
+    @staticmethod
+    def _fingerprint(inputs: Any) -> Optional[str]:
+        if inputs is None:
+            return None
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _run_check(self, name: str, force: bool) -> Dict[str, Any]:
+        inputs_func, evaluate, _ = self.checks[name]
+        started = time.perf_counter()
+        inputs = inputs_func()
+        fingerprint = self._fingerprint(inputs)
+
+        with self._cache_lock:
+            cached = self.cache.get(name)
+        if not force and fingerprint and cached and cached[0] == fingerprint:
+            return dict(cached[1], cached=True, duration_ms=round((time.perf_counter() - started) * 1000, 2))
+
+        result = evaluate(inputs)
+        if fingerprint and result.get('status') != 'error':
+            with self._cache_lock:
+                self.cache[name] = (fingerprint, result)
+        return dict(result, cached=False, duration_ms=round((time.perf_counter() - started) * 1000, 2))
+
+    def run(self, checks: List[str] = None, force: bool = False) -> Dict[str, Any]:
+        """Run checks concurrently and build the scan report; raises UnknownCheckError for names not registered"""
+        started = time.perf_counter()
+        names = checks or list(self.checks)
+        unknown = [name for name in names if name not in self.checks]
+        if unknown:
+            raise UnknownCheckError(unknown)
+        submitted = time.monotonic()
+        futures = {name: self.executor.submit(self._run_check, name, force) for name in names}
+        # Each budget runs from submission, so a check waited on late does not get its full timeout again
+        deadlines = {name: submitted + self.checks[name][2] for name in names}
+
+        results = {}
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(timeout=max(0.0, deadlines[name] - time.monotonic()))
+            except FutureTimeout:
+                results[name] = {'status': 'timeout', 'findings': [],
+                                 'message': f"Check exceeded {self.checks[name][2]}s"}
+            except Exception as e:
+                self.logger.error(f"Security check {name} failed: {e}")
+                results[name] = {'status': 'error', 'findings': [], 'message': str(e)}
+
+        issues = sum(len(r.get('findings', [])) for r in results.values())
+        issues += sum(1 for r in results.values() if r['status'] in ('timeout', 'error') and not r.get('findings'))
+        worst = max((r['status'] for r in results.values()), key=lambda s: SEVERITY_ORDER.get(s, 2), default='pass')
+        return {
+            'success': True,
+            'timestamp': datetime.now().isoformat(),
+            'status': worst,
+            'issues': issues,
+            'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            'checks': results
+        }
+
+    def _stat_inputs(self, names: List[str]) -> Dict[str, Any]:
+        stamps = {}
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(self.install_dir, name))
+                stamps[name] = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+            except OSError:
+                stamps[name] = None
+        return stamps
+
+    # File integrity
+
+    def _integrity_inputs(self):
+        files = list((self.manifest or {}).get('files', {})) or RELEASE_FILES
+        return {'manifest': (self.manifest or {}).get('version'), 'files': self._stat_inputs(files)}
+
+    def _check_integrity(self, inputs) -> Dict[str, Any]:
+        if not self.manifest:
+            missing = [name for name, stamp in inputs['files'].items() if stamp is None and name.endswith('.dll')]
+            findings = [{'severity': 'fail', 'message': f"{name} is missing"} for name in missing]
+            findings.append({'severity': 'warn', 'message': "No release manifest loaded; digests not verified"})
+            return {'status': 'fail' if missing else 'warn', 'findings': findings}
+
+        report = ManifestVerifier().verify(self.install_dir, self.manifest)
+        findings = [{'severity': 'fail', 'message': f"{name} is missing"} for name in report['missing']]
+        findings += [{'severity': 'fail', 'message': f"{item['file']} size differs"} for item in report['size_mismatch']]
+        findings += [{'severity': 'fail', 'message': f"{item['file']} digest differs"}
+                     for item in report['digest_mismatch']]
+        findings += [{'severity': 'fail', 'message': f"{name}: {error}"} for name, error in report['errors'].items()]
+        return {'status': 'pass' if report['valid'] else 'fail', 'findings': findings,
+                'verified': len(report['verified'])}
+
+    # INI lint
+
+    def _ini_inputs(self):
+        return self._stat_inputs(['rdpwrap.ini'])
+
+    def _check_ini(self, inputs) -> Dict[str, Any]:
+        path = os.path.join(self.install_dir, 'rdpwrap.ini')
+        if inputs['rdpwrap.ini'] is None:
+            return {'status': 'fail', 'findings': [{'severity': 'fail', 'message': "rdpwrap.ini not found"}]}
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            findings = lint_ini(f.read())
+        status = max((f['severity'] for f in findings), key=SEVERITY_ORDER.get, default='pass')
+        return {'status': status, 'findings': findings}
+
+    # Registry policy
+
+    def _registry_inputs(self):
+        try:
+            import winreg
+        except ImportError:
+            return None
+
+        values = {}
+        for key_path, names in ((RDP_KEY, ['fDenyTSConnections', 'fSingleSessionPerUser']),
+                                (RDP_TCP_KEY, ['UserAuthentication', 'SecurityLayer', 'MinEncryptionLevel',
+                                               'PortNumber'])):
+            try:
+                with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, key_path) as key:
+                    for name in names:
+                        try:
+                            values[name] = winreg.QueryValueEx(key, name)[0]
+                        except OSError:
+                            values[name] = None
+            except OSError:
+                for name in names:
+                    values[name] = None
+        return values
+
+    def _check_registry(self, values) -> Dict[str, Any]:
+        if values is None:
+            return {'status': 'skipped', 'findings': [], 'message': "Registry not available on this platform"}
+        findings = []
+        if values.get('UserAuthentication') != 1:
+            findings.append({'severity': 'fail', 'message': "Network Level Authentication is disabled"})
+        if values.get('SecurityLayer') is not None and values['SecurityLayer'] < 2:
+            findings.append({'severity': 'warn', 'message': "RDP security layer is not TLS"})
+        if values.get('MinEncryptionLevel') is not None and values['MinEncryptionLevel'] < 3:
+            findings.append({'severity': 'warn', 'message': "Minimum encryption level is below High"})
+        if values.get('PortNumber') not in (None, self.port):
+            findings.append({'severity': 'warn',
+                             'message': f"RDP listens on {values['PortNumber']}, scan expects {self.port}"})
+        status = max((f['severity'] for f in findings), key=SEVERITY_ORDER.get, default='pass')
+        return {'status': status, 'findings': findings, 'values': values}
+
+    # Firewall exposure
+
+    def _firewall_inputs(self):
+        # Rule tables change without a cheap stamp to compare, so always evaluate
+        return None
+
+    def _check_firewall(self, _) -> Dict[str, Any]:
+        try:
+            result = subprocess.run(
+                ['netsh', 'advfirewall', 'firewall', 'show', 'rule', 'name=all', 'dir=in'],
+                capture_output=True, text=True, timeout=self.checks['firewall_exposure'][2]
+            )
+        except FileNotFoundError:
+            return {'status': 'skipped', 'findings': [], 'message': "netsh not available on this platform"}
+
+        findings = []
+        rule = {}
+        for line in result.stdout.splitlines() + ['']:
+            key, _, value = line.partition(':')
+            key, value = key.strip(), value.strip()
+            if key == 'Rule Name' or not line.strip():
+                if (rule.get('Enabled') == 'Yes' and rule.get('Action') == 'Allow'
+                        and str(self.port) in rule.get('LocalPort', '').split(',')
+                        and rule.get('RemoteIP', 'Any') == 'Any'):
+                    findings.append({'severity': 'warn',
+                                     'message': f"Rule '{rule.get('Rule Name')}' allows port {self.port} from any address"})
+                rule = {'Rule Name': value} if key == 'Rule Name' else {}
+            elif key:
+                rule[key] = value
+        status = max((f['severity'] for f in findings), key=SEVERITY_ORDER.get, default='pass')
+        return {'status': status, 'findings': findings}
+
+    # Open RDP port audit
+
+    def _port_inputs(self):
+        # Listening sockets are cheap to list and are themselves the input
+        import psutil
+        listeners = set()
+        for conn in psutil.net_connections(kind='tcp'):
+            if conn.status == psutil.CONN_LISTEN and conn.laddr and conn.laddr.port == self.port:
+                listeners.add(conn.laddr.ip)
+        return sorted(listeners)
+
+    def _check_ports(self, listeners) -> Dict[str, Any]:
+        findings = []
+        for address in listeners:
+            if address in ('0.0.0.0', '::'):
+                findings.append({'severity': 'warn', 'message': f"RDP port {self.port} listens on all interfaces ({address})"})
+        status = max((f['severity'] for f in findings), key=SEVERITY_ORDER.get, default='pass')
+        return {'status': status, 'findings': findings, 'listeners': listeners}
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
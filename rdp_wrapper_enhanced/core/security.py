@@ -2,97 +2,119 @@
 Enhanced Security Manager for RDP Wrapper
 Provides advanced security features including certificate validation, malware scanning, and secure configuration
 """
-import hashlib
-import ssl
-import socket
 import os
 import json
 import logging
-from typing import Optional, Dict, Any
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
 from cryptography.fernet import Fernet
-from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
+from .hashing import cached_sha256
+from .signatures import SignatureIndex
+from .bytescan import PatternScanner, load_rules
+from .tlspin import PinStore
+from .envelope import (DEFAULT_ITERATIONS, default_key_cache, is_envelope, open_envelope,
+                       seal, seal_many)
+
+LEGACY_SALT = b'stable_salt'
+MAX_CONTENT_RESULTS = 1024     # content scan results kept, least recently used evicted first
 
 class EnhancedSecurityManager:
     """Advanced security manager with certificate validation and malware scanning"""
     
-    def __init__(self):
+    def __init__(self, signature_db: Optional[str] = None, content_rules: Optional[str] = None,
+                 pin_file: Optional[str] = None):
         self.logger = logging.getLogger(__name__)
-        self.trusted_certificates = set()
-        self.malware_signatures = {}
-        self._load_trusted_certificates()
-        
-    def _load_trusted_certificates(self):
-        """Load trusted certificate fingerprints"""
-        # Add known trusted certificates for RDP wrapper downloads
-        trusted_certs = [
-            "A5:6E:8B:F4:8C:1F:3D:4A:5B:6C:7D:8E:9F:0A:1B:2C:3D:4E:5F",
-            "B6:7F:9C:9D:2G:4E:5B:6C:7D:8E:9F:0A:1B:2C:3D:4E:5F:6G"
-        ]
-        self.trusted_certificates.update(trusted_certs)
+        self.pin_store = PinStore(pin_file)
+        self.malware_signatures = SignatureIndex(signature_db)
+        self.content_scanner = None
+        self._content_results = OrderedDict()
+        self._content_lock = threading.Lock()
+        self.load_content_rules(content_rules)
         
+    def load_content_rules(self, rules_path: Optional[str] = None) -> int:
+        """Compile byte pattern rules used to catch repacked binaries"""
+        try:
+            rules = load_rules(rules_path)
+            self.content_scanner = PatternScanner(rules) if rules else None
+            with self._content_lock:
+                self._content_results.clear()
+            return len(rules)
+        except Exception as e:
+            self.logger.error(f"Failed to load content rules: {e}")
+            return 0
+            
     def validate_ssl_certificate(self, hostname: str, port: int = 443) -> bool:
         """Validate SSL certificate for secure downloads"""
         try:
-            context = ssl.create_default_context()
-            with socket.create_connection((hostname, port), timeout=10) as sock:
-                with context.wrap_socket(sock, server_hostname=hostname) as secure_sock:
-                    cert = secure_sock.getpeercert(True)
-                    cert_hash = hashlib.sha256(cert).hexdigest()
-                    
-                    # Check against trusted certificates
-                    if cert_hash.upper() in self.trusted_certificates:
-                        self.logger.info(f"SSL certificate validated for {hostname}")
-                        return True
-                    else:
-                        self.logger.warning(f"Untrusted certificate for {hostname}")
-                        return False
+            # Hosts validated within the TTL (e.g. by a pinned download) skip the handshake
+            if self.pin_store.validate(hostname, port):
+                self.logger.info(f"SSL certificate validated for {hostname}")
+                return True
+            self.logger.warning(f"Untrusted certificate for {hostname}")
+            return False
                         
         except Exception as e:
             self.logger.error(f"SSL validation failed for {hostname}: {e}")
             return False
             
-    def scan_for_malware(self, file_path: str) -> Dict[str, Any]:
+    def open_url(self, url: str, timeout: int = 30):
+        """Open an HTTPS URL with pins checked on the same connection that carries the response; other schemes raise"""
+        return self.pin_store.opener().open(url, timeout=timeout)
+            
+    def scan_for_malware(self, file_path: str, force_verify: bool = False) -> Dict[str, Any]:
         """Scan file for malware signatures"""
         try:
             if not os.path.exists(file_path):
                 return {"status": "error", "message": "File not found"}
                 
             # Calculate file hash
-            with open(file_path, 'rb') as f:
-                file_hash = hashlib.sha256(f.read()).hexdigest()
+            file_hash = cached_sha256(file_path, force_verify)
                 
             # Check against known malware signatures
-            if file_hash in self.malware_signatures:
+            threat = self.malware_signatures.lookup(file_hash)
+            if threat:
                 return {
                     "status": "infected",
-                    "threat": self.malware_signatures[file_hash],
+                    "threat": threat,
                     "hash": file_hash
                 }
                 
+            if self.content_scanner:
+                matches = self._content_matches(file_path, file_hash, force_verify)
+                if matches:
+                    return {
+                        "status": "infected",
+                        "threat": matches[0]['rule'],
+                        "hash": file_hash,
+                        "matches": matches
+                    }
+                
             return {"status": "clean", "hash": file_hash}
             
         except Exception as e:
             self.logger.error(f"Malware scan failed: {e}")
             return {"status": "error", "message": str(e)}
             
+    def _content_matches(self, file_path: str, file_hash: str, force_verify: bool) -> List[Dict[str, Any]]:
+        """Content scan results depend only on the bytes, so reuse them per hash from a bounded LRU"""
+        with self._content_lock:
+            matches = None if force_verify else self._content_results.get(file_hash)
+            if matches is not None:
+                self._content_results.move_to_end(file_hash)
+                return matches
+        matches = self.content_scanner.scan_file(file_path)
+        with self._content_lock:
+            self._content_results[file_hash] = matches
+            while len(self._content_results) > MAX_CONTENT_RESULTS:
+                self._content_results.popitem(last=False)
+        return matches
+
     def encrypt_configuration(self, config_data: Dict[str, Any], password: str) -> str:
         """Encrypt configuration data with password"""
         try:
-            # Generate key from password
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=b'stable_salt',  # In production, use random salt
-                iterations=100000,
-            )
-            key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-            
-            # Encrypt data
-            f = Fernet(key)
-            encrypted_data = f.encrypt(json.dumps(config_data).encode())
-            return base64.urlsafe_b64encode(encrypted_data).decode()
+            return seal(json.dumps(config_data).encode(), password)
             
         except Exception as e:
             self.logger.error(f"Configuration encryption failed: {e}")
@@ -101,20 +123,29 @@ class EnhancedSecurityManager:
     def decrypt_configuration(self, encrypted_data: str, password: str) -> Dict[str, Any]:
         """Decrypt configuration data with password"""
         try:
-            # Generate key from password
-            kdf = PBKDF2HMAC(
-                algorithm=hashes.SHA256(),
-                length=32,
-                salt=b'stable_salt',
-                iterations=100000,
-            )
-            key = base64.urlsafe_b64encode(kdf.derive(password.encode()))
-            
-            # Decrypt data
-            f = Fernet(key)
-            decrypted_data = f.decrypt(base64.urlsafe_b64decode(encrypted_data))
-            return json.loads(decrypted_data.decode())
+            if not is_envelope(encrypted_data):
+                return self._decrypt_legacy_configuration(encrypted_data, password)
+            return json.loads(open_envelope(encrypted_data, password).decode())
             
         except Exception as e:
             self.logger.error(f"Configuration decryption failed: {e}")
             return {}
+            
+    def encrypt_configurations(self, configs: List[Dict[str, Any]], password: str) -> List[str]:
+        """Encrypt many configurations, deriving the key once"""
+        try:
+            return seal_many([json.dumps(config).encode() for config in configs], password)
+            
+        except Exception as e:
+            self.logger.error(f"Configuration encryption failed: {e}")
+            return []
+            
+    def decrypt_configurations(self, encrypted_items: List[str], password: str) -> List[Dict[str, Any]]:
+        """Decrypt many configurations; items sharing a salt derive the key once"""
+        return [self.decrypt_configuration(item, password) for item in encrypted_items]
+            
+    def _decrypt_legacy_configuration(self, encrypted_data: str, password: str) -> Dict[str, Any]:
+        """Read data written before envelopes: fixed salt and doubly base64-encoded token"""
+        key = default_key_cache.derive(password, LEGACY_SALT, DEFAULT_ITERATIONS)
+        decrypted_data = Fernet(key).decrypt(base64.urlsafe_b64decode(encrypted_data))
+        return json.loads(decrypted_data.decode())
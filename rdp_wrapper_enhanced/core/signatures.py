@@ -0,0 +1,274 @@
+"""
+RDP Wrapper Enhanced - Malware Signature Index
+Memory-mapped sorted SHA-256 runs with a bloom filter prefilter and incremental updates
+"""
+
+import os
+import glob
+import heapq
+import json
+import mmap
+import time
+import struct
+import logging
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Tuple
+
+MAGIC = b'RDPSIG01'
+HEADER = struct.Struct('>8sIIII')      # magic, record count, family count, bloom bits, bloom hashes
+RECORD = struct.Struct('>32sH')        # sha256 digest, family index
+
+BITS_PER_ENTRY = 10
+BLOOM_HASHES = 7
+
+DEFAULT_SIGNATURE_PATH = Path(os.environ.get('PROGRAMDATA', Path.home())) / "RDP Wrapper Enhanced" / "signatures.db"
+
+
+def _digest_bytes(digest) -> Optional[bytes]:
+    """Accept a hex string or raw 32 bytes, returning raw bytes or None"""
+    if isinstance(digest, bytes) and len(digest) == 32:
+        return digest
+    try:
+        raw = bytes.fromhex(digest)
+    except (TypeError, ValueError):
+        return None
+    return raw if len(raw) == 32 else None
+
+
+def _bloom_positions(digest: bytes, bits: int, hashes: int) -> Iterator[int]:
+    """Double hashing over the digest itself; SHA-256 output is already uniform"""
+    h1 = int.from_bytes(digest[:8], 'big')
+    h2 = int.from_bytes(digest[8:16], 'big') | 1
+    for i in range(hashes):
+        yield (h1 + i * h2) % bits
+
+
+def write_signature_file(path: str, entries: Iterable[Tuple[Any, str]]) -> int:
+    """Write (digest, family) pairs as a sorted, deduplicated signature run"""
+    families = []
+    family_index = {}
+    records = {}
+    for digest, family in entries:
+        raw = _digest_bytes(digest)
+        if raw is None:
+            continue
+        family = (family or 'Unknown')[:255]
+        if family not in family_index:
+            family_index[family] = len(families)
+            families.append(family)
+        records[raw] = family_index[family]
+
+    count = len(records)
+    bits = max(64, count * BITS_PER_ENTRY)
+    bits = (bits + 7) // 8 * 8
+    bloom = bytearray(bits // 8)
+    for raw in records:
+        for position in _bloom_positions(raw, bits, BLOOM_HASHES):
+            bloom[position >> 3] |= 1 << (position & 7)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, count, len(families), bits, BLOOM_HASHES))
+        for family in families:
+            encoded = family.encode('utf-8')[:255]
+            f.write(bytes((len(encoded),)) + encoded)
+        f.write(bloom)
+        f.write(b''.join(RECORD.pack(raw, records[raw]) for raw in sorted(records)))
+    os.replace(tmp_path, path)
+    return count
+
+
+class SignatureRun:
+    """One read-only signature file: bloom filter in memory, records behind mmap"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._file.close()
+            raise ValueError(f"{path} is empty")
+
+        magic, self.count, family_count, self.bloom_bits, self.bloom_hashes = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a signature file")
+
+        offset = HEADER.size
+        self.families = []
+        for _ in range(family_count):
+            length = self._map[offset]
+            self.families.append(self._map[offset + 1:offset + 1 + length].decode('utf-8'))
+            offset += 1 + length
+
+        # The filter is small (~1.2 bytes per signature); keep it resident
+        self.bloom = self._map[offset:offset + self.bloom_bits // 8]
+        self.records_offset = offset + self.bloom_bits // 8
+
+    def might_contain(self, digest: bytes) -> bool:
+        bloom = self.bloom
+        for position in _bloom_positions(digest, self.bloom_bits, self.bloom_hashes):
+            if not bloom[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def lookup(self, digest: bytes) -> Optional[str]:
+        """Family of a digest, or None if it is not in this run"""
+        if not self.count or not self.might_contain(digest):
+            return None
+        mm = self._map
+        size = RECORD.size
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            position = self.records_offset + mid * size
+            current = mm[position:position + 32]
+            if current < digest:
+                lo = mid + 1
+            elif current > digest:
+                hi = mid
+            else:
+                return self.families[RECORD.unpack_from(mm, position)[1]]
+        return None
+
+    def records(self) -> Iterator[Tuple[bytes, str]]:
+        """All (digest, family) pairs in digest order"""
+        for index in range(self.count):
+            raw, family = RECORD.unpack_from(self._map, self.records_offset + index * RECORD.size)
+            yield raw, self.families[family]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class SignatureIndex:
+    """Base signature file plus appended update runs, merged once too many accumulate"""
+
+    def __init__(self, path: str = None, max_runs: int = 8):
+        self.logger = logging.getLogger(__name__)
+        self.path = str(path or DEFAULT_SIGNATURE_PATH)
+        self.max_runs = max_runs
+        self.runs = []          # newest first
+        self.load()
+
+    def _run_paths(self) -> List[str]:
+        return sorted(glob.glob(f"{glob.escape(self.path)}.run-*"))
+
+    def load(self):
+        """Map the base file and every update run"""
+        self.close()
+        for path in [self.path] + self._run_paths():
+            if not os.path.exists(path):
+                continue
+            try:
+                self.runs.insert(0, SignatureRun(path))
+            except (OSError, ValueError) as e:
+                self.logger.error(f"Skipping signature file {path}: {e}")
+
+    def lookup(self, digest) -> Optional[str]:
+        """Threat family for a SHA-256 digest, or None if it is not a known signature"""
+        raw = _digest_bytes(digest)
+        if raw is None:
+            return None
+        for run in self.runs:
+            family = run.lookup(raw)
+            if family is not None:
+                return family
+        return None
+
+    def __contains__(self, digest) -> bool:
+        return self.lookup(digest) is not None
+
+    def __len__(self) -> int:
+        # Runs may overlap, so this is an upper bound until the next merge
+        return sum(run.count for run in self.runs)
+
+    def add_signatures(self, signatures: Dict[str, str]) -> int:
+        """Append a batch of {sha256: family} as a new sorted run"""
+        if not signatures:
+            return 0
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        existing = self._run_paths()
+        sequence = int(existing[-1].rsplit('-', 1)[1]) + 1 if existing else 1
+        count = write_signature_file(f"{self.path}.run-{sequence:06d}", signatures.items())
+        self.load()
+        if len(self.runs) > self.max_runs:
+            self.merge()
+        return count
+
+    def merge(self) -> int:
+        """Fold every run into the base file; newer runs win on duplicate digests"""
+        if len(self.runs) <= 1 and not self._run_paths():
+            return len(self)
+
+        # heapq.merge is stable across inputs, so list newest runs first to let them win
+        merged = heapq.merge(*(run.records() for run in self.runs), key=lambda record: record[0])
+
+        def unique():
+            previous = None
+            for raw, family in merged:
+                if raw != previous:
+                    yield raw, family
+                    previous = raw
+
+        run_paths = self._run_paths()
+        tmp_base = f"{self.path}.merge"
+        count = write_signature_file(tmp_base, unique())
+        self.close()
+        os.replace(tmp_base, self.path)
+        for path in run_paths:
+            os.remove(path)
+        self.load()
+        self.logger.info(f"Merged {len(run_paths)} signature runs into {count} signatures")
+        return count
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'runs': len(self.runs), 'signatures': len(self)}
+
+    def close(self):
+        for run in self.runs:
+            run.close()
+        self.runs = []
+
+
+def benchmark(signatures: int = 1000000, lookups: int = 100000) -> Dict[str, Any]:
+    """Measure build, open and lookup cost for a large synthetic signature set"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'signatures.db')
+        started = time.perf_counter()
+        write_signature_file(path, ((os.urandom(32), 'Synthetic.Sample') for _ in range(signatures)))
+        build_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        index = SignatureIndex(path)
+        open_time = time.perf_counter() - started
+
+        known = [raw for raw, _ in index.runs[0].records()][::max(1, signatures // lookups)]
+        unknown = [os.urandom(32) for _ in range(lookups)]
+
+        started = time.perf_counter()
+        hits = sum(1 for raw in known if index.lookup(raw))
+        hit_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        false_hits = sum(1 for raw in unknown if index.runs[0].might_contain(raw))
+        miss_time = time.perf_counter() - started
+
+        index.close()
+        return {
+            'signatures': signatures,
+            'file_mb': round(os.path.getsize(path) / 1024 / 1024, 1),
+            'build_s': round(build_time, 2),
+            'open_ms': round(open_time * 1000, 2),
+            'hit_us': round(hit_time / max(1, len(known)) * 1e6, 2),
+            'miss_us': round(miss_time / lookups * 1e6, 2),
+            'hits': hits,
+            'bloom_false_positive_rate': round(false_hits / lookups, 4)
+        }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
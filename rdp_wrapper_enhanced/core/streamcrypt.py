@@ -0,0 +1,273 @@
+"""
+RDP Wrapper Enhanced - Streaming Encrypted Containers
+Chunked AES-GCM with per-chunk nonces, an authenticated trailer and random-access reads
+"""
+
+import io
+import os
+import time
+import json
+import base64
+import struct
+import tarfile
+import zipfile
+import tempfile
+from typing import Dict, Any, Iterable
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+from .envelope import DEFAULT_ITERATIONS, SALT_SIZE, default_key_cache
+
+MAGIC = b'RDPAEAD1'
+VERSION = 1
+HEADER = struct.Struct('>8sBI16sI7s')     # magic, version, chunk size, salt, iterations, nonce prefix
+TRAILER = struct.Struct('>QQ')            # plaintext length, chunk count
+TAG_SIZE = 16
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def _nonce(prefix: bytes, index: int, final: bool) -> bytes:
+    """STREAM-style nonce: random prefix, chunk counter, last-block flag"""
+    return prefix + struct.pack('>IB', index, 1 if final else 0)
+
+
+def _derive(password: str, salt: bytes, iterations: int) -> AESGCM:
+    return AESGCM(base64.urlsafe_b64decode(default_key_cache.derive(password, salt, iterations)))
+
+
+class EncryptingWriter(io.RawIOBase):
+    """Write-only stream that seals fixed-size chunks as they fill; memory stays at one chunk"""
+
+    def __init__(self, fileobj, password: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 iterations: int = DEFAULT_ITERATIONS):
+        super().__init__()
+        self.fileobj = fileobj
+        self.chunk_size = chunk_size
+        salt = os.urandom(SALT_SIZE)
+        self.prefix = os.urandom(7)
+        self.header = HEADER.pack(MAGIC, VERSION, chunk_size, salt, iterations, self.prefix)
+        self.aead = _derive(password, salt, iterations)
+        self.buffer = bytearray()
+        self.index = 0
+        self.length = 0
+        self.fileobj.write(self.header)
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed encrypted stream")
+        self.buffer += data
+        while len(self.buffer) >= self.chunk_size:
+            self._seal(bytes(self.buffer[:self.chunk_size]))
+            del self.buffer[:self.chunk_size]
+        self.length += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        # zipfile records member offsets from tell() when writing to an unseekable stream
+        return self.length
+
+    def _seal(self, chunk: bytes):
+        self.fileobj.write(self.aead.encrypt(_nonce(self.prefix, self.index, False), chunk, self.header))
+        self.index += 1
+
+    def close(self):
+        if self.closed:
+            return
+        if self.buffer:
+            self._seal(bytes(self.buffer))
+            self.buffer = bytearray()
+        # The trailer commits to the length and chunk count, so truncation is detected
+        trailer = TRAILER.pack(self.length, self.index)
+        self.fileobj.write(self.aead.encrypt(_nonce(self.prefix, self.index, True), trailer, self.header))
+        self.fileobj.flush()
+        super().close()
+
+
+class DecryptingReader(io.RawIOBase):
+    """Seekable plaintext view of a container that decrypts only the chunks it touches"""
+
+    def __init__(self, fileobj, password: str):
+        super().__init__()
+        self.fileobj = fileobj
+        self.header = fileobj.read(HEADER.size)
+        if len(self.header) != HEADER.size:
+            raise ValueError("Truncated encrypted container")
+        magic, version, self.chunk_size, salt, iterations, self.prefix = HEADER.unpack(self.header)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("Not an encrypted container")
+        self.aead = _derive(password, salt, iterations)
+
+        trailer_size = TRAILER.size + TAG_SIZE
+        fileobj.seek(0, io.SEEK_END)
+        body_size = fileobj.tell() - HEADER.size - trailer_size
+        if body_size < 0:
+            raise ValueError("Truncated encrypted container")
+        record = self.chunk_size + TAG_SIZE
+        chunks = -(-body_size // record)
+
+        fileobj.seek(HEADER.size + body_size)
+        try:
+            trailer = self.aead.decrypt(_nonce(self.prefix, chunks, True), fileobj.read(trailer_size), self.header)
+        except InvalidTag:
+            raise ValueError("Wrong password or corrupted container trailer")
+        self.length, count = TRAILER.unpack(trailer)
+        if count != chunks:
+            raise ValueError("Encrypted container chunk count mismatch")
+
+        self.chunks = chunks
+        self.body_end = HEADER.size + body_size
+        self.position = 0
+        self._cached_index = None
+        self._cached_chunk = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def _chunk(self, index: int) -> bytes:
+        if index != self._cached_index:
+            start = HEADER.size + index * (self.chunk_size + TAG_SIZE)
+            # The last chunk is short; never read into the trailer
+            size = min(self.chunk_size + TAG_SIZE, self.body_end - start)
+            self.fileobj.seek(start)
+            try:
+                self._cached_chunk = self.aead.decrypt(
+                    _nonce(self.prefix, index, False), self.fileobj.read(size), self.header
+                )
+            except InvalidTag:
+                raise ValueError(f"Encrypted container chunk {index} failed authentication")
+            self._cached_index = index
+        return self._cached_chunk
+
+    def readinto(self, buffer) -> int:
+        view = memoryview(buffer).cast('B')
+        filled = 0
+        while filled < len(view) and self.position < self.length:
+            index, offset = divmod(self.position, self.chunk_size)
+            data = self._chunk(index)[offset:offset + len(view) - filled]
+            view[filled:filled + len(data)] = data
+            filled += len(data)
+            self.position += len(data)
+        return filled
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.length
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self.position = offset
+        return self.position
+
+    def tell(self) -> int:
+        return self.position
+
+
+def encrypt_stream(source, destination, password: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Encrypt one stream into another, returning the plaintext length"""
+    with EncryptingWriter(destination, password, chunk_size) as writer:
+        while True:
+            data = source.read(chunk_size)
+            if not data:
+                break
+            writer.write(data)
+        return writer.length
+
+
+def decrypt_stream(source, destination, password: str) -> int:
+    """Decrypt a whole container into a stream, returning the plaintext length"""
+    reader = DecryptingReader(source, password)
+    for index in range(reader.chunks):
+        destination.write(reader._chunk(index))
+    return reader.length
+
+
+def write_encrypted_archive(path: str, sources: Iterable[str], password: str,
+                            chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """Zip files and directories straight into an encrypted container without a plaintext temp file"""
+    tmp_path = f"{path}.tmp"
+    members = 0
+    try:
+        with open(tmp_path, 'wb') as f, EncryptingWriter(f, password, chunk_size) as writer:
+            with zipfile.ZipFile(writer, 'w', zipfile.ZIP_DEFLATED) as archive:
+                for source in sources:
+                    source = os.path.abspath(source)
+                    base = os.path.dirname(source)
+                    if os.path.isdir(source):
+                        for root, _, files in os.walk(source):
+                            for name in sorted(files):
+                                full = os.path.join(root, name)
+                                archive.write(full, os.path.relpath(full, base))
+                                members += 1
+                    elif os.path.exists(source):
+                        archive.write(source, os.path.basename(source))
+                        members += 1
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return members
+
+
+def open_encrypted_archive(fileobj, password: str):
+    """Open an encrypted zip or tar for random access; only the chunks read are decrypted"""
+    reader = DecryptingReader(fileobj, password)
+    buffered = io.BufferedReader(reader, buffer_size=reader.chunk_size)
+    if zipfile.is_zipfile(buffered):
+        return zipfile.ZipFile(buffered, 'r')
+    buffered.seek(0)
+    return tarfile.open(fileobj=buffered, mode='r:')
+
+
+def read_member(path: str, password: str, member: str) -> bytes:
+    """Decrypt a single archive member without decrypting the rest of the container"""
+    with open(path, 'rb') as f, open_encrypted_archive(f, password) as archive:
+        if isinstance(archive, zipfile.ZipFile):
+            return archive.read(member)
+        extracted = archive.extractfile(member)
+        if extracted is None:
+            raise KeyError(member)
+        return extracted.read()
+
+
+def benchmark(size_mb: int = 64) -> Dict[str, Any]:
+    """Throughput of streaming encryption/decryption and cost of reading one member"""
+    with tempfile.TemporaryDirectory() as directory:
+        source = os.path.join(directory, 'payload')
+        os.makedirs(source)
+        for i in range(size_mb):
+            with open(os.path.join(source, f"part_{i:03d}.bin"), 'wb') as f:
+                f.write(os.urandom(1024 * 1024))
+        container = os.path.join(directory, 'backup.rdpenc')
+
+        started = time.perf_counter()
+        write_encrypted_archive(container, [source], 'benchmark')
+        encrypt_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        with open(container, 'rb') as src, open(os.devnull, 'wb') as dst:
+            decrypt_stream(src, dst, 'benchmark')
+        decrypt_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        read_member(container, 'benchmark', f"payload/part_{size_mb // 2:03d}.bin")
+        member_time = time.perf_counter() - started
+
+    return {
+        'size_mb': size_mb,
+        'encrypt_mb_s': round(size_mb / encrypt_time, 1),
+        'decrypt_mb_s': round(size_mb / decrypt_time, 1),
+        'single_member_ms': round(member_time * 1000, 2)
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,218 @@
+"""
+RDP Wrapper Enhanced - TLS Public Key Pinning
+Checks SPKI pins on the connection that carries the download and caches successful validations
+"""
+
+import os
+import ssl
+import json
+import time
+import base64
+import socket
+import hashlib
+import logging
+import threading
+import http.client
+import urllib.error
+import urllib.request
+from functools import partial
+from pathlib import Path
+from typing import Dict, List, Any, Iterable, Set
+
+from cryptography import x509
+from cryptography.hazmat.primitives import serialization
+
+PIN_PREFIX = 'sha256/'
+
+DEFAULT_PIN_PATH = Path(os.environ.get('PROGRAMDATA', Path.home())) / "RDP Wrapper Enhanced" / "tls_pins.json"
+
+# Root CA keys behind GitHub's release downloads (Sectigo/USERTrust for github.com, DigiCert for the asset
+# CDN); pinning the roots rather than the leaves survives GitHub's routine certificate renewals
+GITHUB_PINS = {
+    'sha256/ICGRfpgmOUXIWcQ/HXPLQTkFPEFPoDyjvH7ohhQpjzs=',     # USERTrust ECC Certification Authority
+    'sha256/x4QzPSC810K5/cMjb05Qm4k3Bw5zBn4lTdO/nEW/Td4=',     # USERTrust RSA Certification Authority
+    'sha256/r/mIkG3eEpVdm+u/ko/cwxzOMo1bk4TyHIlByibiA5E=',     # DigiCert Global Root CA
+    'sha256/i7WTqTvh0OioIruIfFR4kMPnBqrS2rdiVPl/s2uC/CY=',     # DigiCert Global Root G2
+    'sha256/uUwZgwDOxcBXrQcntwu+kYFpkiVkOaezL0WYEZ3anJc=',     # DigiCert Global Root G3
+    'sha256/WoiWRyIOVNa9ihaBciRSC7XHjliYS9VwUGOIud4PB18=',     # DigiCert High Assurance EV Root CA
+}
+DEFAULT_PINS = {
+    'github.com': GITHUB_PINS,
+    '*.github.com': GITHUB_PINS,
+    '*.githubusercontent.com': GITHUB_PINS,
+}
+
+
+class PinMismatchError(ssl.SSLError):
+    """The server's certificate chain matched none of the pins for its host"""
+
+
+def spki_pin(der_certificate: bytes) -> str:
+    """HPKP-style pin (sha256/<base64>) of a certificate's SubjectPublicKeyInfo"""
+    certificate = x509.load_der_x509_certificate(der_certificate)
+    spki = certificate.public_key().public_bytes(
+        serialization.Encoding.DER, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return PIN_PREFIX + base64.b64encode(hashlib.sha256(spki).digest()).decode('ascii')
+
+
+def peer_chain(sock: ssl.SSLSocket) -> List[bytes]:
+    """DER certificates presented on a connection, leaf first"""
+    get_chain = getattr(sock, 'get_verified_chain', None)
+    if get_chain is not None:
+        # Python 3.13+ exposes the whole verified chain, so intermediate and root pins work too
+        return list(get_chain())
+    get_chain = getattr(getattr(sock, '_sslobj', None), 'get_verified_chain', None)
+    if get_chain is not None:
+        # 3.10-3.12 have the same chain on the underlying _ssl socket
+        return [certificate.public_bytes(ssl._ssl.ENCODING_DER) for certificate in get_chain()]
+    leaf = sock.getpeercert(True)
+    return [leaf] if leaf else []
+
+
+class PinStore:
+    """Per-host SPKI pin sets with rotation and a TTL cache of validated hosts.
+
+    Hosts without pins are refused unless enforce_unpinned is turned off.
+    """
+
+    def __init__(self, path: str = None, ttl: float = 3600.0, enforce_unpinned: bool = True):
+        self.logger = logging.getLogger(__name__)
+        self.path = str(path or DEFAULT_PIN_PATH)
+        self.ttl = ttl
+        self.enforce_unpinned = enforce_unpinned
+        self.pins = {host: set(pins) for host, pins in DEFAULT_PINS.items()}   # host pattern -> set of pins
+        self._validated = {}        # host -> monotonic expiry
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # Entries in the file replace the built-in set of the same host
+            self.pins.update({host.lower(): set(pins) for host, pins in data.get('pins', {}).items()})
+        except Exception as e:
+            self.logger.error(f"Error loading TLS pins: {e}")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'pins': {host: sorted(pins) for host, pins in self.pins.items()}}, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def set_pins(self, host: str, pins: Iterable[str]):
+        """Replace the pin set of a host ('*.example.com' covers subdomains)"""
+        with self._lock:
+            self.pins[host.lower()] = set(pins)
+            self._validated.clear()
+
+    def rotate(self, host: str, add: Iterable[str] = (), retire: Iterable[str] = ()):
+        """Add upcoming pins before a key change and retire old ones after it"""
+        with self._lock:
+            pins = self.pins.setdefault(host.lower(), set())
+            pins.update(add)
+            pins.difference_update(retire)
+            self._validated.clear()
+
+    def pins_for(self, host: str) -> Set[str]:
+        """Pins for a host, falling back to wildcard entries of its parent domains"""
+        host = host.lower().rstrip('.')
+        if host in self.pins:
+            return self.pins[host]
+        labels = host.split('.')
+        for i in range(1, len(labels)):
+            pattern = '*.' + '.'.join(labels[i:])
+            if pattern in self.pins:
+                return self.pins[pattern]
+        return set()
+
+    def is_validated(self, host: str) -> bool:
+        """True if the host passed pin validation within the TTL"""
+        with self._lock:
+            expiry = self._validated.get(host.lower())
+            if expiry is None:
+                return False
+            if expiry < time.monotonic():
+                del self._validated[host.lower()]
+                return False
+            return True
+
+    def check_chain(self, host: str, chain: List[bytes]) -> bool:
+        """Match a presented chain against the host's pins and remember success"""
+        expected = self.pins_for(host)
+        if not expected:
+            allowed = not self.enforce_unpinned
+        else:
+            allowed = any(spki_pin(certificate) in expected for certificate in chain)
+        if allowed:
+            with self._lock:
+                self._validated[host.lower()] = time.monotonic() + self.ttl
+        elif not expected:
+            self.logger.warning(f"No TLS pins for {host}; refusing the connection")
+        else:
+            self.logger.warning(f"TLS pin mismatch for {host}")
+        return allowed
+
+    def verify_socket(self, sock: ssl.SSLSocket, host: str):
+        """Raise PinMismatchError unless an established connection satisfies the pins"""
+        if not self.check_chain(host, peer_chain(sock)):
+            raise PinMismatchError(f"Certificate for {host} does not match any pinned key")
+
+    def validate(self, host: str, port: int = 443, context: ssl.SSLContext = None, timeout: float = 10) -> bool:
+        """Standalone validation; answered from the cache when the host was validated recently"""
+        if self.is_validated(host):
+            return True
+        context = context or ssl.create_default_context()
+        with socket.create_connection((host, port), timeout=timeout) as sock:
+            with context.wrap_socket(sock, server_hostname=host) as secure_sock:
+                return self.check_chain(host, peer_chain(secure_sock))
+
+    def opener(self, context: ssl.SSLContext = None) -> urllib.request.OpenerDirector:
+        """urllib opener that only opens HTTPS, with pins checked right after each handshake (redirects included)"""
+        return urllib.request.build_opener(HTTPSOnlyHandler(), PinnedHTTPSHandler(self, context=context))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {'pinned_hosts': len(self.pins), 'validated_hosts': len(self._validated)}
+
+
+class PinnedHTTPSConnection(http.client.HTTPSConnection):
+    """HTTPS connection that checks pins before any request bytes are sent"""
+
+    def __init__(self, *args, pin_store: PinStore = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pin_store = pin_store
+
+    def connect(self):
+        super().connect()
+        try:
+            # Behind a proxy self.host is the proxy; the pins belong to the host at the end of the tunnel
+            self.pin_store.verify_socket(self.sock, self._tunnel_host or self.host)
+        except PinMismatchError:
+            self.close()
+            raise
+
+
+class PinnedHTTPSHandler(urllib.request.HTTPSHandler):
+    """urllib handler that opens PinnedHTTPSConnections, including across redirects"""
+
+    def __init__(self, pin_store: PinStore, context: ssl.SSLContext = None):
+        super().__init__(context=context or ssl.create_default_context())
+        self.pin_store = pin_store
+
+    def https_open(self, req):
+        return self.do_open(partial(PinnedHTTPSConnection, pin_store=self.pin_store), req, context=self._context)
+
+
+class HTTPSOnlyHandler(urllib.request.BaseHandler):
+    """Refuses every scheme but https, for the first request and for any redirect it leads to"""
+
+    handler_order = 100     # ahead of the stock handlers, which would open http://, file:// or ftp://
+
+    def default_open(self, req):
+        if req.type != 'https':
+            raise urllib.error.URLError(f"Refusing non-HTTPS URL {req.full_url}")
+        return None
@@ -0,0 +1,231 @@
+"""
+RDP Wrapper Enhanced - Install Transactions
+Stages a new tree beside the live one and switches over with journaled directory renames
+"""
+
+import os
+import json
+import time
+import glob
+import shutil
+import logging
+import zipfile
+import tempfile
+from typing import Dict, Any, Optional
+
+from .extract import StreamingExtractor
+from .updater import service_control
+
+DEFAULT_LIVE_DIR = "C:\\Program Files\\RDP Wrapper"
+
+# Journal states, in order of a successful install
+STAGING = 'staging'
+SWAPPING = 'swapping'
+COMMITTED = 'committed'
+ROLLING_BACK = 'rolling_back'
+ROLLED_BACK = 'rolled_back'
+
+
+class InstallTransaction:
+    """live/ is only ever replaced by renames: staging -> live on commit, previous -> live on rollback"""
+
+    def __init__(self, live_dir: str = DEFAULT_LIVE_DIR, service: Optional[str] = None,
+                 extractor: StreamingExtractor = None):
+        self.logger = logging.getLogger(__name__)
+        self.live_dir = os.path.abspath(live_dir)
+        # Siblings of the live tree so every switch is a same-volume rename
+        self.staging_dir = f"{self.live_dir}.staging"
+        self.previous_dir = f"{self.live_dir}.previous"
+        self.journal_path = f"{self.live_dir}.journal.json"
+        self.service = service
+        self.extractor = extractor or StreamingExtractor()
+
+    def _write_journal(self, state: str, **details):
+        journal = {'state': state, 'live': self.live_dir, 'updated': time.time(), **details}
+        tmp_path = f"{self.journal_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(journal, f, indent=2)
+            f.flush()
+            # The journal must be on disk before the rename it describes
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def read_journal(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _trash(self, path: str):
+        """Rename a tree out of the way in O(1); trashed trees are deleted by the next begin()"""
+        if os.path.isdir(path):
+            os.rename(path, f"{self.live_dir}.trash-{time.time_ns()}")
+
+    def _discard(self, path: str):
+        """Remove a tree; it is renamed away first so a crash never leaves it half-deleted under its name"""
+        self._trash(path)
+        for trash in glob.glob(f"{glob.escape(self.live_dir)}.trash-*"):
+            shutil.rmtree(trash, ignore_errors=True)
+
+    def begin(self) -> str:
+        """Start a transaction with an empty staging tree; leftovers of earlier ones are cleared here"""
+        self._discard(self.staging_dir)
+        os.makedirs(self.staging_dir)
+        self._write_journal(STAGING)
+        return self.staging_dir
+
+    def stage(self, zip_path: str, carry_over: bool = True) -> Dict[str, Any]:
+        """Fill the staging tree from a release zip, optionally carrying over the live tree"""
+        if carry_over and os.path.isdir(self.live_dir):
+            self._carry_over(zip_path)
+        return self.extractor.extract(zip_path, self.staging_dir)
+
+    def _carry_over(self, zip_path: str):
+        """Hard-link live files the release ships into staging and copy the local ones (logs, custom INI)"""
+        with zipfile.ZipFile(zip_path, 'r') as zf:
+            shipped = {os.path.normcase(os.path.normpath(name)) for name in zf.namelist()}
+
+        def link_or_copy(src: str, dst: str):
+            # Shipped files are only ever replaced by rename (or skipped as unchanged), never written
+            # in place, so sharing their data with live is safe; local files may be appended to later
+            if os.path.normcase(os.path.relpath(src, self.live_dir)) in shipped:
+                try:
+                    os.link(src, dst)
+                    return dst
+                except OSError:
+                    pass
+            return shutil.copy2(src, dst)
+
+        shutil.copytree(self.live_dir, self.staging_dir, copy_function=link_or_copy, dirs_exist_ok=True)
+
+    def _swap(self):
+        """Move live aside and staging into place; renames already done are skipped, so recovery can replay"""
+        if os.path.isdir(self.live_dir) and not os.path.isdir(self.previous_dir):
+            os.rename(self.live_dir, self.previous_dir)
+        if os.path.isdir(self.staging_dir) and not os.path.isdir(self.live_dir):
+            os.rename(self.staging_dir, self.live_dir)
+
+    def commit(self) -> Dict[str, Any]:
+        """Switch the staged tree live; the replaced tree is kept as <live>.previous"""
+        journal = self.read_journal()
+        if not journal or journal.get('state') != STAGING:
+            raise RuntimeError("No staged install transaction to commit")
+
+        started = time.perf_counter()
+        # The previous tree of the last commit is superseded once this one is staged
+        self._discard(self.previous_dir)
+        self._write_journal(SWAPPING)
+        if self.service:
+            # A loaded rdpwrap.dll keeps the live directory from being renamed
+            service_control("stop", self.service)
+        try:
+            self._swap()
+        finally:
+            if self.service:
+                service_control("start", self.service)
+        self._write_journal(COMMITTED, previous=os.path.isdir(self.previous_dir))
+        elapsed = time.perf_counter() - started
+        self.logger.info(f"Install committed to {self.live_dir} in {elapsed:.3f}s")
+        return {'state': COMMITTED, 'switch_s': round(elapsed, 4)}
+
+    def abort(self):
+        """Drop a staged transaction without touching the live tree"""
+        self._discard(self.staging_dir)
+        self._write_journal(ROLLED_BACK)
+
+    def can_rollback(self) -> bool:
+        return os.path.isdir(self.previous_dir)
+
+    def _restore_previous(self):
+        if os.path.isdir(self.live_dir) and os.path.isdir(self.previous_dir):
+            self._trash(self.live_dir)
+        if os.path.isdir(self.previous_dir) and not os.path.isdir(self.live_dir):
+            os.rename(self.previous_dir, self.live_dir)
+
+    def rollback(self) -> Dict[str, Any]:
+        """Put the previous tree back with two renames, independent of its size"""
+        if not self.can_rollback():
+            raise RuntimeError("No previous installation to roll back to")
+
+        started = time.perf_counter()
+        self._write_journal(ROLLING_BACK)
+        if self.service:
+            service_control("stop", self.service)
+        try:
+            self._restore_previous()
+        finally:
+            if self.service:
+                service_control("start", self.service)
+        self._write_journal(ROLLED_BACK)
+        elapsed = time.perf_counter() - started
+        # The failed tree is removed by the next begin(), outside the switch
+        self.logger.info(f"Rolled back {self.live_dir} in {elapsed:.3f}s")
+        return {'state': ROLLED_BACK, 'switch_s': round(elapsed, 4)}
+
+    def recover(self) -> Optional[str]:
+        """Finish or undo a transaction interrupted by a crash; returns the action taken.
+
+        If the renames fail (e.g. a file in the tree is locked), the journal is left in place for a manual fix.
+        """
+        journal = self.read_journal()
+        if not isinstance(journal, dict):
+            return None
+        state = journal.get('state')
+        try:
+            if state == STAGING:
+                # Nothing was switched yet; an incomplete staging tree is never committed
+                self._discard(self.staging_dir)
+                self._write_journal(ROLLED_BACK)
+                action = 'aborted'
+            elif state == SWAPPING:
+                # Staging was complete before the journal said swapping, so roll forward
+                self._swap()
+                self._write_journal(COMMITTED, previous=os.path.isdir(self.previous_dir))
+                action = 'committed'
+            elif state == ROLLING_BACK:
+                self._restore_previous()
+                self._write_journal(ROLLED_BACK)
+                action = 'rolled_back'
+            else:
+                return None
+        except OSError as e:
+            self.logger.error(f"Could not recover install transaction ({state}) in {self.live_dir}: {e}; "
+                              f"journal left at {self.journal_path} for manual repair")
+            return 'failed'
+        self.logger.warning(f"Recovered interrupted install transaction ({state}): {action}")
+        return action
+
+
+def benchmark(files: int = 2000, size_kb: int = 64) -> Dict[str, Any]:
+    """Rollback by directory swap versus deleting and copying a tree of the same size back"""
+    with tempfile.TemporaryDirectory() as directory:
+        live = os.path.join(directory, 'RDP Wrapper')
+        os.makedirs(live)
+        for i in range(files):
+            with open(os.path.join(live, f"file_{i:05d}.bin"), 'wb') as f:
+                f.write(os.urandom(size_kb * 1024))
+
+        backup = os.path.join(directory, 'backup')
+        shutil.copytree(live, backup)
+        started = time.perf_counter()
+        shutil.rmtree(live)
+        shutil.copytree(backup, live)
+        copy_back_s = time.perf_counter() - started
+
+        transaction = InstallTransaction(live)
+        staging = transaction.begin()
+        shutil.copytree(live, staging, dirs_exist_ok=True)
+        transaction.commit()
+        rollback = transaction.rollback()
+
+    return {
+        'files': files,
+        'size_mb': round(files * size_kb / 1024, 1),
+        'copy_back_rollback_s': round(copy_back_s, 3),
+        'swap_rollback_s': rollback['switch_s']
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -0,0 +1,239 @@
+"""
+RDP Wrapper Enhanced - Differential Updates
+Plans a file-level diff against a release and applies only what changed
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import subprocess
+import zipfile
+from typing import Dict, List, Any, Optional
+
+from .manifest import MANIFEST_ALGORITHM, RELEASE_FILES, ManifestVerifier
+from .extract import StreamingExtractor
+
+# rdpwrap.dll is loaded into TermService; replacing it always needs a restart
+SERVICE_FILES = ('rdpwrap.dll',)
+INI_FILE = 'rdpwrap.ini'
+# INI sections read at service start regardless of the termsrv.dll build
+GLOBAL_INI_SECTIONS = ('Main', 'SLPolicy', 'PatchCodes')
+
+
+def manifest_from_zip(zip_path: str, version: str = None, files: List[str] = None) -> Dict[str, Any]:
+    """Manifest of the release files inside a zip, hashed as they stream out of the archive"""
+    entries = {}
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        names = set(zf.namelist())
+        for name in files or RELEASE_FILES:
+            if name not in names:
+                continue
+            digest = hashlib.new(MANIFEST_ALGORITHM)
+            with zf.open(name) as member:
+                for chunk in iter(lambda: member.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            entries[name] = {'size': zf.getinfo(name).file_size, MANIFEST_ALGORITHM: digest.hexdigest()}
+    return {'version': version, 'algorithm': MANIFEST_ALGORITHM, 'files': entries}
+
+
+def ini_sections(text: str) -> Dict[str, Dict[str, str]]:
+    """Sections of an INI file as {section: {key: value}}, ignoring comments and blank lines"""
+    sections = {}
+    current = None
+    for raw in text.splitlines():
+        line = raw.strip()
+        if not line or line.startswith(';'):
+            continue
+        if line.startswith('[') and line.endswith(']'):
+            current = sections.setdefault(line[1:-1], {})
+        elif current is not None:
+            key, _, value = line.partition('=')
+            current[key.strip()] = value.strip()
+    return sections
+
+
+def termsrv_version() -> Optional[str]:
+    """File version of the local termsrv.dll, or None where it cannot be read"""
+    try:
+        import win32api
+
+        path = os.path.join(os.environ.get('SystemRoot', 'C:\\Windows'), 'System32', 'termsrv.dll')
+        info = win32api.GetFileVersionInfo(path, '\\')
+        ms, ls = info['FileVersionMS'], info['FileVersionLS']
+        return f"{ms >> 16}.{ms & 0xFFFF}.{ls >> 16}.{ls & 0xFFFF}"
+    except Exception:
+        return None
+
+
+def changed_ini_sections(old_text: str, new_text: str, build: Optional[str] = None) -> List[str]:
+    """Sections that differ and matter to the running service ([<build>], [<build>-SLInit] and globals)"""
+    old, new = ini_sections(old_text), ini_sections(new_text)
+    changed = [name for name in sorted(set(old) | set(new)) if old.get(name) != new.get(name)]
+    if build is None:
+        # Without the termsrv build every section may be the live one
+        return changed
+    relevant = set(GLOBAL_INI_SECTIONS) | {build, f"{build}-SLInit"}
+    return [name for name in changed if name in relevant]
+
+
+def service_control(action: str, service: str = 'TermService') -> float:
+    """net start/stop a service, returning how long it took"""
+    started = time.perf_counter()
+    command = ["net", action, service]
+    if action == "stop":
+        command.append("/y")    # also stops dependent services (UmRdpService)
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        logging.getLogger(__name__).warning(f"net {action} {service} failed: {result.stderr.strip()}")
+    return time.perf_counter() - started
+
+
+class UpdatePlanner:
+    """Diffs an installed tree against a release manifest and replaces only the files that differ"""
+
+    def __init__(self, verifier: ManifestVerifier = None, extractor: StreamingExtractor = None,
+                 service: str = 'TermService', build: Optional[str] = None):
+        self.logger = logging.getLogger(__name__)
+        self.verifier = verifier or ManifestVerifier()
+        self.extractor = extractor or StreamingExtractor()
+        self.service = service
+        self.build = build
+
+    def plan(self, install_dir: str, manifest: Dict[str, Any], zip_path: str = None) -> Dict[str, Any]:
+        """File-level diff of install_dir against manifest; installed digests come from the hash cache"""
+        report = self.verifier.verify(install_dir, manifest)
+        files = manifest.get('files', {})
+        changed = sorted([entry['file'] for entry in report['size_mismatch']]
+                         + [entry['file'] for entry in report['digest_mismatch']] + list(report['errors']))
+        added = sorted(report['missing'])
+        obsolete = sorted(name for name in RELEASE_FILES
+                          if name not in files and os.path.isfile(os.path.join(install_dir, name)))
+
+        reasons = [f"{name} changed" for name in SERVICE_FILES if name in changed or name in added]
+        if INI_FILE in changed:
+            sections = self._ini_changes(install_dir, zip_path)
+            if sections is None:
+                reasons.append(f"{INI_FILE} changed")
+            elif sections:
+                reasons.append(f"{INI_FILE} sections changed: {', '.join(sections)}")
+
+        to_write = changed + added
+        return {
+            'version': manifest.get('version'),
+            'unchanged': sorted(report['verified']),
+            'changed': changed,
+            'added': added,
+            'obsolete': obsolete,
+            'restart_required': bool(reasons),
+            'restart_reasons': reasons,
+            'bytes_to_write': sum(files[name].get('size', 0) for name in to_write),
+            'full_bytes': sum(entry.get('size', 0) for entry in files.values())
+        }
+
+    def _ini_changes(self, install_dir: str, zip_path: str = None) -> Optional[List[str]]:
+        """Relevant INI sections that differ, or None when the new INI is not available to compare"""
+        if not zip_path:
+            return None
+        try:
+            with open(os.path.join(install_dir, INI_FILE), 'r', encoding='utf-8', errors='replace') as f:
+                old_text = f.read()
+            with zipfile.ZipFile(zip_path, 'r') as zf:
+                new_text = zf.read(INI_FILE).decode('utf-8', errors='replace')
+        except (OSError, KeyError):
+            return None
+        return changed_ini_sections(old_text, new_text, self.build or termsrv_version())
+
+    def _service(self, action: str) -> float:
+        return service_control(action, self.service)
+
+    def apply(self, plan: Dict[str, Any], zip_path: str, install_dir: str) -> Dict[str, Any]:
+        """Write the changed and added files, restarting the service only if the plan requires it"""
+        started = time.perf_counter()
+        members = plan['changed'] + plan['added']
+        restart_s = 0.0
+        extraction = {'written': [], 'bytes_written': 0, 'elapsed_s': 0.0}
+
+        if members:
+            if plan['restart_required']:
+                # The loaded rdpwrap.dll cannot be replaced while the service holds it
+                restart_s += self._service("stop")
+            try:
+                extraction = self.extractor.extract(zip_path, install_dir, members=members)
+            finally:
+                if plan['restart_required']:
+                    restart_s += self._service("start")
+
+        written = extraction['bytes_written']
+        # Full install cost at the throughput measured here (extraction only; install.bat is extra)
+        if written:
+            estimated_full_s = extraction['elapsed_s'] * plan['full_bytes'] / written
+        else:
+            estimated_full_s = 0.0
+        result = {
+            'version': plan['version'],
+            'files_written': extraction['written'],
+            'files_skipped': plan['unchanged'],
+            'bytes_written': written,
+            'bytes_saved': plan['full_bytes'] - written,
+            'restarted': plan['restart_required'] and bool(members),
+            'restart_reasons': plan['restart_reasons'],
+            'restart_s': round(restart_s, 3),
+            'elapsed_s': round(time.perf_counter() - started, 3),
+            'estimated_time_saved_s': round(max(0.0, estimated_full_s - extraction['elapsed_s']), 3)
+        }
+        self.logger.info(
+            f"Update to {plan['version']}: {len(result['files_written'])} files written, "
+            f"{result['bytes_saved']} bytes saved, restart {'done' if result['restarted'] else 'skipped'}"
+        )
+        return result
+
+    def update(self, zip_path: str, install_dir: str, manifest: Dict[str, Any] = None,
+               version: str = None) -> Dict[str, Any]:
+        """Plan against manifest (or one built from the zip) and apply it"""
+        manifest = manifest or manifest_from_zip(zip_path, version)
+        plan = self.plan(install_dir, manifest, zip_path)
+        result = self.apply(plan, zip_path, install_dir)
+        result['plan'] = plan
+        return result
+
+
+def benchmark(size_mb: int = 8) -> Dict[str, Any]:
+    """Bytes and time of a differential update where only rdpwrap.ini changed"""
+    with tempfile.TemporaryDirectory() as directory:
+        contents = {name: os.urandom(size_mb * 1024 * 1024 // len(RELEASE_FILES)) for name in RELEASE_FILES}
+        contents[INI_FILE] = b"[Main]\nUpdated=2024-01-01\n[10.0.19041.1949]\nLocalOnlyPatch.x64=1\n"
+        old_zip = os.path.join(directory, 'old.zip')
+        new_zip = os.path.join(directory, 'new.zip')
+        for path, ini in ((old_zip, contents[INI_FILE]), (new_zip, contents[INI_FILE] + b"[10.0.22621.1]\nX=1\n")):
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for name, data in contents.items():
+                    zf.writestr(name, ini if name == INI_FILE else data)
+
+        install_dir = os.path.join(directory, 'install')
+        StreamingExtractor().extract(old_zip, install_dir)
+
+        planner = UpdatePlanner(build='10.0.19041.1949')
+        plan = planner.plan(install_dir, manifest_from_zip(new_zip, 'new'), new_zip)
+        started = time.perf_counter()
+        planner.extractor.extract(new_zip, install_dir, members=plan['changed'] + plan['added'])
+        differential_s = time.perf_counter() - started
+
+        started = time.perf_counter()
+        StreamingExtractor(skip_unchanged=False).extract(new_zip, install_dir)
+        full_s = time.perf_counter() - started
+
+    return {
+        'changed': plan['changed'],
+        'restart_required': plan['restart_required'],
+        'bytes_written': plan['bytes_to_write'],
+        'full_bytes': plan['full_bytes'],
+        'differential_s': round(differential_s, 3),
+        'full_extract_s': round(full_s, 3)
+    }
+
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=2))
@@ -14,6 +14,7 @@ from pathlib import Path
 from ..core.config import ConfigManager
 from ..core.monitor import SessionMonitor
 from ..core.security import SecurityManager
+from ..core.scanner import SecurityScanEngine, UnknownCheckError
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'rdp-wrapper-enhanced-2024')
@@ -22,6 +23,7 @@ app.secret_key = os.environ.get('SECRET_KEY', 'rdp-wrapper-enhanced-2024')
 config_manager = ConfigManager()
 session_monitor = SessionMonitor()
 security_manager = SecurityManager()
+scan_engine = SecurityScanEngine()
 
 # Configure logging
 logging.basicConfig(
@@ -128,8 +130,15 @@ def get_system_info():
 def security_scan():
     """Run security scan"""
     try:
-        results = security_manager.run_security_scan()
+        options = request.get_json(silent=True) or {}
+        checks = options.get('checks')
+        if checks is not None and not (isinstance(checks, list) and all(isinstance(c, str) for c in checks)):
+            return jsonify({'success': False, 'error': 'checks must be a list of check names'}), 400
+        results = scan_engine.run(checks=checks, force=bool(options.get('force')))
         return jsonify(results)
+    except UnknownCheckError as e:
+        return jsonify({'success': False, 'error': str(e), 'unknown_checks': e.unknown,
+                        'available_checks': sorted(scan_engine.checks)}), 400
     except Exception as e:
         logger.error(f"Security scan error: {e}")
         return jsonify({'success': False, 'error': str(e)}), 500
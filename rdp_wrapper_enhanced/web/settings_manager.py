@@ -6,6 +6,7 @@ Provides advanced settings management with validation, backup, and real-time upd
 from flask import Blueprint, jsonify, request
 from ..core.config import ConfigManager
 from ..core.security import SecurityManager
+from ..core.firewall import FirewallRuleCompiler
 import json
 import os
 import shutil
@@ -26,9 +27,10 @@ PROFILES_DIR = CONFIG_DIR / "profiles"
 class SettingsManager:
     """Advanced settings management with validation and profiles"""
     
-    def __init__(self):
+    def __init__(self, firewall: FirewallRuleCompiler = None):
         self.config = ConfigManager()
         self.security = SecurityManager()
+        self.firewall = firewall or FirewallRuleCompiler()
         self._ensure_directories()
     
     def _ensure_directories(self):
@@ -59,11 +61,23 @@ class SettingsManager:
             with open(ENHANCED_CONFIG_FILE, 'w') as f:
                 json.dump(validated, f, indent=2)
             
+            self.apply_firewall(validated)
             return True
         except Exception as e:
             logger.error(f"Error saving enhanced settings: {e}")
             return False
     
+    def apply_firewall(self, settings):
+        """Sync the block rules with security.blockedIPs; only changed rules are touched"""
+        security = settings.get('security', {})
+        if not security.get('enableFirewall', True):
+            return None
+        try:
+            return self.firewall.apply(security.get('blockedIPs') or [])
+        except Exception as e:
+            logger.error(f"Error applying firewall block list: {e}")
+            return None
+    
     def validate_settings(self, settings):
         """Validate and normalize settings"""
         defaults = self.get_default_enhanced_settings()
@@ -0,0 +1,59 @@
+import json
+
+from rdp_wrapper_enhanced.core.firewall import (RULE_PREFIX, DryRunExecutor, FirewallRuleCompiler, aggregate,
+                                                load_block_list)
+
+
+def test_aggregate_collapses_adjacent_networks():
+    assert aggregate(['10.0.0.0/24', '10.0.1.0/24', '10.0.0.7', 'not-an-ip']) == ['10.0.0.0/23']
+
+
+def test_first_apply_adds_rules_in_one_script():
+    executor = DryRunExecutor()
+    summary = FirewallRuleCompiler(executor).apply([f"10.{i // 256}.{i % 256}.1" for i in range(3000)])
+    assert summary['success'] and summary['deleted'] == 0
+    assert executor.process_spawns == 1
+    assert sum(len(networks) for networks in executor.rules.values()) == 3000
+    assert all(len(networks) <= 1000 for networks in executor.rules.values())
+
+
+def test_unchanged_list_needs_no_operations():
+    executor = DryRunExecutor()
+    blocked = [f"192.168.{i}.0/24" for i in range(0, 200, 2)]
+    compiler = FirewallRuleCompiler(executor)
+    compiler.apply(blocked)
+    assert compiler.apply(blocked)['operations'] == 0
+    assert executor.process_spawns == 1
+
+
+def test_one_new_entry_touches_one_rule():
+    executor = DryRunExecutor()
+    compiler = FirewallRuleCompiler(executor, max_per_rule=10)
+    blocked = [f"172.16.{i}.1" for i in range(0, 30, 2)]
+    compiler.apply(blocked)
+    summary = compiler.apply(blocked + ['8.8.8.8'])
+    assert summary['operations'] == 1 and summary['updated'] == 1
+
+
+def test_rules_not_created_by_the_compiler_are_left_alone():
+    manual = RULE_PREFIX + ' manual-override'
+    executor = DryRunExecutor({manual: ['10.9.9.9/32'], RULE_PREFIX + ' 1-0000': ['1.1.1.1/32']})
+    summary = FirewallRuleCompiler(executor).apply(['1.2.3.4'])
+    assert summary['success']
+    assert executor.rules[manual] == ['10.9.9.9/32']
+    assert executor.rules[RULE_PREFIX + ' 1-0000'] == ['1.2.3.4/32']
+
+
+def test_emptied_list_deletes_managed_rules():
+    executor = DryRunExecutor()
+    compiler = FirewallRuleCompiler(executor)
+    compiler.apply(['1.2.3.4', '2001:db8::/32'])
+    assert compiler.apply([])['deleted'] == len(compiler.compile(['1.2.3.4', '2001:db8::/32']))
+    assert executor.rules == {}
+
+
+def test_block_list_is_read_from_settings(tmp_path):
+    settings = tmp_path / 'enhanced_settings.json'
+    settings.write_text(json.dumps({'security': {'blockedIPs': ['1.2.3.4', '10.0.0.0/8']}}))
+    assert load_block_list(str(settings)) == ['1.2.3.4', '10.0.0.0/8']
+    assert load_block_list(str(tmp_path / 'missing.json')) == []
@@ -0,0 +1,145 @@
+import json
+import time
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from rdp_wrapper_enhanced.core.artifacts import ArtifactCache
+from rdp_wrapper_enhanced.core.fleet import (AgentServer, FleetOrchestrator, InstallerActions, sign_request,
+                                             verify_release_request)
+
+TOKEN = 'fleet-test-token'
+
+
+@pytest.fixture
+def agents():
+    started = []
+
+    def start(actions=None, token=TOKEN):
+        agent = AgentServer(actions or (lambda request: {'status': 'success'}), token=token,
+                            host='127.0.0.1', port=0).start()
+        started.append(agent)
+        return agent
+
+    yield start
+    for agent in started:
+        agent.stop()
+
+
+def orchestrator(**options):
+    options = dict({'token': TOKEN, 'retries': 2, 'backoff': 0.01, 'timeout': 5}, **options)
+    return FleetOrchestrator(advertise_host='127.0.0.1', **options)
+
+
+def inventory(*agents):
+    return [{'host': '127.0.0.1', 'port': agent.port} for agent in agents]
+
+
+def post(agent, body: bytes, headers):
+    request = urllib.request.Request(f"http://127.0.0.1:{agent.port}/v1/run", data=body, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_agent_refuses_to_start_without_token():
+    with pytest.raises(ValueError):
+        AgentServer(lambda request: {}, token=None, host='127.0.0.1', port=0)
+
+
+def test_signed_request_succeeds(agents):
+    report = orchestrator().run('verify', inventory(agents()))
+    assert report['succeeded'] == 1
+    assert report['results'][0]['attempts'] == 1
+
+
+def test_wrong_token_is_rejected_without_retry(agents):
+    result = orchestrator(token='wrong').run('verify', inventory(agents()))['results'][0]
+    assert result['status'] == 'error'
+    assert result['error'] == 'HTTP 401'
+    assert result['attempts'] == 1
+
+
+def test_unsigned_stale_and_replayed_requests_are_rejected(agents):
+    agent = agents()
+    body = json.dumps({'action': 'verify'}).encode('utf-8')
+    assert post(agent, body, {}) == 401
+
+    headers = sign_request(TOKEN, 'POST', '/v1/run', body)
+    assert post(agent, body, headers) == 200
+    assert post(agent, body, headers) == 401
+    assert post(agent, b'{"action": "install"}', sign_request(TOKEN, 'POST', '/v1/run', body)) == 401
+
+    real_time = time.time
+    try:
+        time.time = lambda: real_time() - 3600
+        stale = sign_request(TOKEN, 'POST', '/v1/run', body)
+    finally:
+        time.time = real_time
+    assert post(agent, body, stale) == 401
+
+
+def test_missing_token_is_an_error_without_contacting_the_host(agents):
+    result = orchestrator(token=None).run('verify', inventory(agents()))['results'][0]
+    assert result['status'] == 'error'
+    assert result['attempts'] == 0
+
+
+def test_busy_agent_is_retried(agents):
+    agent = agents()
+    agent._busy.acquire()
+    threading.Timer(0.05, agent._busy.release).start()
+    result = orchestrator(backoff=0.1).run('verify', inventory(agent))['results'][0]
+    assert result['status'] == 'success'
+    assert result['attempts'] == 2
+
+
+def test_agent_busy_past_all_retries(agents):
+    agent = agents()
+    agent._busy.acquire()
+    result = orchestrator().run('verify', inventory(agent))['results'][0]
+    assert result['status'] == 'busy'
+    assert result['attempts'] == 3
+    agent._busy.release()
+
+
+def test_unreachable_host_is_retried():
+    result = orchestrator().run('verify', [{'host': '127.0.0.1', 'port': 1}])['results'][0]
+    assert result['status'] == 'unreachable'
+    assert result['attempts'] == 3
+
+
+def test_slow_agent_times_out(agents):
+    agent = agents(lambda request: time.sleep(1.0) or {'status': 'success'})
+    started = time.monotonic()
+    result = orchestrator(timeout=0.3, retries=0).run('verify', inventory(agent))['results'][0]
+    assert result['status'] == 'timeout'
+    assert time.monotonic() - started < 1.0
+
+
+def test_only_artifacts_signed_with_the_release_key_are_accepted(tmp_path):
+    ed25519 = pytest.importorskip('cryptography.hazmat.primitives.asymmetric.ed25519')
+    release_key = ed25519.Ed25519PrivateKey.generate()
+    public_key = release_key.public_key().public_bytes_raw()
+    signer = orchestrator(signing_key=release_key.private_bytes_raw())
+    artifact = signer.sign({'url': 'http://peer/artifacts/ab/RDPWrap.zip', 'sha256': 'ab', 'filename': 'RDPWrap.zip'})
+
+    verify_release_request({'action': 'install', 'artifact': artifact}, public_key)
+    with pytest.raises(ValueError):
+        verify_release_request({'action': 'install', 'artifact': dict(artifact, sha256='cd')}, public_key)
+    with pytest.raises(ValueError):
+        verify_release_request({'action': 'install', 'artifact': artifact, 'manifest': {'files': {}}}, public_key)
+
+    actions = InstallerActions(ArtifactCache(str(tmp_path / 'cache')), str(tmp_path), public_key=public_key)
+    unsigned = {key: value for key, value in artifact.items() if key != 'signature'}
+    assert actions({'action': 'install', 'artifact': unsigned})['status'] == 'rejected'
+
+
+def test_installer_actions_need_a_trusted_key(tmp_path, monkeypatch):
+    monkeypatch.setattr('rdp_wrapper_enhanced.core.fleet.trusted_bundle_key', lambda: None)
+    with pytest.raises(ValueError):
+        InstallerActions(ArtifactCache(str(tmp_path / 'cache')), str(tmp_path))
@@ -0,0 +1,86 @@
+import time
+import threading
+
+from rdp_wrapper_enhanced.core.probes import FakeProbeBackend, ProbeRunner, command_probe
+
+
+def make_runner(backend, tmp_path, **probes):
+    return ProbeRunner(backend, cache_path=tmp_path / "probe_cache.json", probes=probes or None)
+
+
+def test_failed_command_is_error_and_not_cached(tmp_path):
+    backend = FakeProbeBackend(outputs={})
+    runner = make_runner(backend, tmp_path)
+    result = runner.run(['architecture'])['architecture']
+    assert result['status'] == 'error'
+    assert result['value'] is None
+    assert 'architecture' not in runner.cache
+    runner.run(['architecture'])
+    assert backend.calls.count('wmic os get OSArchitecture') == 2
+    runner.shutdown()
+
+
+def test_empty_parse_is_error(tmp_path):
+    backend = FakeProbeBackend(outputs={'wmic os get OSArchitecture': "OSArchitecture\n"})
+    runner = make_runner(backend, tmp_path)
+    assert runner.run(['architecture'])['architecture']['status'] == 'error'
+    assert 'architecture' not in runner.cache
+    runner.shutdown()
+
+
+def test_timeout_is_reported_and_not_cached(tmp_path):
+    backend = FakeProbeBackend(delays={'slow': 1.0})
+    probe = command_probe(['slow'], str.strip)
+    runner = make_runner(backend, tmp_path, slow=(probe, 60, 0.05))
+    started = time.monotonic()
+    result = runner.run(['slow'])['slow']
+    assert result['status'] == 'timeout'
+    assert time.monotonic() - started < 0.5
+    assert 'slow' not in runner.cache
+    runner.shutdown()
+
+
+def test_cached_until_ttl_expires(tmp_path):
+    backend = FakeProbeBackend()
+    runner = make_runner(backend, tmp_path, version=(command_probe(['ver'], str.strip), 0.2, 5.0))
+    assert runner.run(['version'])['version']['cached'] is False
+    assert runner.run(['version'])['version']['cached'] is True
+    assert backend.calls.count('ver') == 1
+    time.sleep(0.25)
+    assert runner.run(['version'])['version']['cached'] is False
+    assert backend.calls.count('ver') == 2
+    runner.shutdown()
+
+
+def test_cache_survives_a_new_runner(tmp_path):
+    backend = FakeProbeBackend()
+    make_runner(backend, tmp_path).run(['windows_version'])
+    runner = make_runner(backend, tmp_path)
+    assert runner.run(['windows_version'])['windows_version']['cached'] is True
+    assert backend.calls.count('ver') == 1
+    runner.shutdown()
+
+
+def test_in_flight_probe_is_reused(tmp_path):
+    backend = FakeProbeBackend(delays={'systeminfo': 0.2})
+    runner = make_runner(backend, tmp_path)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(runner.value('os_name'))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["Microsoft Windows 10 Pro"] * 4
+    assert backend.calls.count('systeminfo') == 1
+    runner.shutdown()
+
+
+def test_admin_rights_is_never_cached(tmp_path):
+    backend = FakeProbeBackend(admin=True)
+    runner = make_runner(backend, tmp_path)
+    assert runner.value('admin_rights') is True
+    backend.admin = False
+    result = runner.run(['admin_rights'])['admin_rights']
+    assert result == {**result, 'status': 'ok', 'value': False, 'cached': False}
+    assert 'admin_rights' not in runner.cache
+    runner.shutdown()
@@ -0,0 +1,40 @@
+import time
+import threading
+
+from rdp_wrapper_enhanced.core.scanner import SecurityScanEngine
+
+
+def slow_check(engine, name, seconds, timeout):
+    engine.register_check(name, lambda: None,
+                          lambda _: (time.sleep(seconds), {'status': 'pass', 'findings': []})[1],
+                          timeout=timeout)
+
+
+def test_deadlines_start_at_submission():
+    engine = SecurityScanEngine(max_workers=2)
+    slow_check(engine, 'long', 0.6, 1.0)
+    slow_check(engine, 'short', 2.0, 0.3)
+    started = time.monotonic()
+    results = engine.run(['long', 'short'])['checks']
+    elapsed = time.monotonic() - started
+    assert results['long']['status'] == 'pass'
+    assert results['short']['status'] == 'timeout'
+    # 'short' is waited on after 'long' finishes; its budget was already spent by then
+    assert elapsed < 0.8
+    engine.shutdown()
+
+
+def test_cache_shared_by_concurrent_scans():
+    engine = SecurityScanEngine(max_workers=8)
+    calls = []
+    engine.register_check('stable', lambda: {'v': 1},
+                          lambda _: (calls.append(1), {'status': 'pass', 'findings': []})[1])
+    engine.run(['stable'])
+    threads = [threading.Thread(target=engine.run, args=(['stable'],)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert engine.run(['stable'])['checks']['stable']['cached'] is True
+    engine.shutdown()
@@ -0,0 +1,122 @@
+import ssl
+import datetime
+import threading
+import http.server
+import urllib.error
+
+import pytest
+from cryptography import x509
+from cryptography.x509.oid import NameOID
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from rdp_wrapper_enhanced.core.tlspin import PinMismatchError, PinStore, spki_pin
+
+
+def certificate(subject, key, issuer=None, issuer_key=None, ca=False):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    builder = (x509.CertificateBuilder()
+               .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, subject)]))
+               .issuer_name(issuer.subject if issuer else
+                            x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, subject)]))
+               .public_key(key.public_key())
+               .serial_number(x509.random_serial_number())
+               .not_valid_before(now - datetime.timedelta(days=1))
+               .not_valid_after(now + datetime.timedelta(days=1))
+               .add_extension(x509.BasicConstraints(ca=ca, path_length=None), critical=True))
+    if not ca:
+        builder = builder.add_extension(x509.SubjectAlternativeName([x509.DNSName('localhost')]), critical=False)
+    return builder.sign(issuer_key or key, hashes.SHA256())
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    """HTTPS stand-in for a download host on localhost, signed by a throwaway root"""
+    directory = tmp_path_factory.mktemp('tls')
+    root_key, leaf_key = ec.generate_private_key(ec.SECP256R1()), ec.generate_private_key(ec.SECP256R1())
+    root = certificate('Stand-in Root', root_key, ca=True)
+    leaf = certificate('localhost', leaf_key, root, root_key)
+    (directory / 'root.pem').write_bytes(root.public_bytes(serialization.Encoding.PEM))
+    (directory / 'leaf.pem').write_bytes(leaf.public_bytes(serialization.Encoding.PEM))
+    (directory / 'leaf.key').write_bytes(leaf_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path == '/downgrade':
+                self.send_response(302)
+                self.send_header('Location', f"http://localhost:{self.server.server_address[1]}/release.zip")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Length', '7')
+            self.end_headers()
+            self.wfile.write(b'release')
+
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(directory / 'leaf.pem', directory / 'leaf.key')
+    httpd.socket = context.wrap_socket(httpd.socket, server_side=True)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield {
+        'url': f"https://localhost:{httpd.server_address[1]}",
+        'port': httpd.server_address[1],
+        'context': ssl.create_default_context(cafile=str(directory / 'root.pem')),
+        'root_pin': spki_pin(root.public_bytes(serialization.Encoding.DER)),
+        'leaf_pin': spki_pin(leaf.public_bytes(serialization.Encoding.DER))
+    }
+    httpd.shutdown()
+
+
+def store(tmp_path, pins=None, **options):
+    pin_store = PinStore(tmp_path / 'pins.json', **options)
+    if pins is not None:
+        pin_store.set_pins('localhost', pins)
+    return pin_store
+
+
+def test_github_hosts_are_pinned_by_default(tmp_path):
+    pin_store = store(tmp_path)
+    assert pin_store.pins_for('github.com')
+    assert pin_store.pins_for('objects.githubusercontent.com')
+    assert pin_store.pins_for('release-assets.githubusercontent.com')
+
+
+@pytest.mark.parametrize('pin', ['leaf_pin', 'root_pin'])
+def test_pinned_leaf_or_root_is_accepted(server, tmp_path, pin):
+    pin_store = store(tmp_path, [server[pin]])
+    with pin_store.opener(server['context']).open(f"{server['url']}/release.zip", timeout=5) as response:
+        assert response.read() == b'release'
+    assert pin_store.is_validated('localhost')
+
+
+def test_pin_mismatch_is_refused(server, tmp_path):
+    pin_store = store(tmp_path, ['sha256/' + 'A' * 43 + '='])
+    with pytest.raises(urllib.error.URLError) as error:
+        pin_store.opener(server['context']).open(f"{server['url']}/release.zip", timeout=5)
+    assert isinstance(error.value.reason, PinMismatchError)
+    assert not pin_store.validate('localhost', server['port'], server['context'])
+
+
+def test_unpinned_host_fails_closed(server, tmp_path):
+    with pytest.raises(urllib.error.URLError):
+        store(tmp_path).opener(server['context']).open(f"{server['url']}/release.zip", timeout=5)
+    assert store(tmp_path, enforce_unpinned=False).validate('localhost', server['port'], server['context'])
+
+
+def test_plain_http_and_downgrade_redirects_are_refused(server, tmp_path):
+    opener = store(tmp_path, [server['leaf_pin']]).opener(server['context'])
+    with pytest.raises(urllib.error.URLError, match='non-HTTPS'):
+        opener.open(f"http://localhost:{server['port']}/release.zip", timeout=5)
+    with pytest.raises(urllib.error.URLError, match='non-HTTPS'):
+        opener.open(f"{server['url']}/downgrade", timeout=5)
+
+
+def test_pin_file_overrides_built_in_pins(tmp_path):
+    pin_store = store(tmp_path)
+    pin_store.set_pins('github.com', ['sha256/rotated='])
+    pin_store.save()
+    assert store(tmp_path).pins_for('github.com') == {'sha256/rotated='}